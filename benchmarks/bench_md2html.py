@@ -0,0 +1,180 @@
+"""End to end benchmarks for md2html on a synthetic site.
+
+Times each stage of a build on its own, then a full build, and writes the
+timings as JSON so runs can be compared. The HTML of the full build is
+hashed and checked against the golden hash for the same site shape, so a
+change that makes the build faster can't also change its output unnoticed.
+
+Run from the root of the repo: `python -m benchmarks.bench_md2html`
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import md2html
+from benchmarks.site_generator import DEFAULT_SHAPE, generate_site, get_folders
+from site_tree.site_tree import scan_site
+from split_fm_md import split_fm_md
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden.json')
+
+
+def get_shape_key(shape: dict) -> str:
+    return ','.join(f'{key}={shape[key]}' for key in sorted(shape))
+
+
+def hash_tree(output_dir: str) -> str:
+    """Hash the path and contents of every file in a build, leaving out the
+    files md2html keeps for itself (e.g. the manifest).
+    """
+    tree_hash = hashlib.sha256()
+    for root, folders, files in os.walk(output_dir):
+        folders.sort()
+        for file in sorted(files):
+            if file.startswith('.md2html'):
+                continue
+            path = os.path.join(root, file)
+            tree_hash.update(os.path.relpath(path, output_dir).replace(os.sep, '/').encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                tree_hash.update(f.read() + b'\0')
+    return tree_hash.hexdigest()
+
+
+def time_runs(function, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            function()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+
+
+def bench_site(site_dir: str, output_dir: str, shape: dict, repeat: int) -> dict:
+    """Time each stage of building the site, and a full build of it.
+
+    :return: The results, with the hash of the HTML of the full build
+    """
+    # A first full build loads the templates that the stages use, and gives
+    # the HTML to check against the golden build
+    site_build = md2html.SiteBuild()
+    with redirect_stdout(StringIO()):
+        site_build.build(site_dir, output_dir, full=True)
+    output_hash = hash_tree(output_dir)
+
+    pages_dir = os.path.join(site_dir, '_pages')
+    pages = []
+    for folder in get_folders(shape['folders'], shape['depth']):
+        for page in sorted(os.listdir(os.path.join(pages_dir, folder))):
+            if page.endswith('.md'):
+                with open(os.path.join(pages_dir, folder, page), 'r') as f:
+                    pages.append((folder, page.rsplit('.', 1)[0], f.read()))
+    split_pages = [(folder, name, *split_fm_md.split_page(source)) for folder, name, source in pages]
+    file_depths = {folder: folder.count(os.sep) + 1 if folder else 0 for folder, _, _ in pages}
+    parsed_pages = [(front_matter, site_build.page_parser.parse(markdown, file_depths[folder]))
+                    for folder, _, front_matter, markdown in split_pages]
+    folder_pages = dict()
+    for folder, name, front_matter, _ in split_pages:
+        folder_pages.setdefault(folder, dict())[name] = front_matter
+
+    def split():
+        for _, _, source in pages:
+            split_fm_md.split_page(source)
+
+    def parse():
+        for folder, _, _, markdown in split_pages:
+            site_build.page_parser.parse(markdown, file_depths[folder])
+
+    def fill():
+        for front_matter, html in parsed_pages:
+            site_build.templates.fill_structure(front_matter['structure'], {'page': {**front_matter, '_html': html}})
+
+    pages_tree = scan_site(pages_dir)
+
+    def index():
+        for folder, front_matters in folder_pages.items():
+            site_build.create_index(folder, pages_tree.get_folder(folder), os.path.join(output_dir, folder),
+                                    front_matters)
+
+    def build():
+        md2html.main(site_dir, output_dir, full=True)
+
+    markdown_bytes = sum(len(source.encode('utf-8')) for _, _, source in pages)
+    return {
+        'shape': shape,
+        'pages': len(pages),
+        'markdown_bytes': markdown_bytes,
+        'python': platform.python_version(),
+        'timings': {
+            'split_fm_md.split_page': time_runs(split, repeat),
+            'MarkdownParser.parse': time_runs(parse, repeat),
+            'Templater.fill_structure': time_runs(fill, repeat),
+            'create_index': time_runs(index, repeat),
+            'main': time_runs(build, repeat),
+        },
+        'output_hash': output_hash,
+    }
+
+
+def check_golden(shape: dict, output_hash: str, update: bool = False) -> str:
+    """Compare the hash of a build with the golden hash for its shape.
+
+    :param update: make this hash the golden one
+    :return: 'match', 'mismatch', 'missing', or 'updated'
+    """
+    golden = dict()
+    if os.path.isfile(GOLDEN_FILE):
+        with open(GOLDEN_FILE, 'r') as f:
+            golden = json.load(f)
+    key = get_shape_key(shape)
+    if update:
+        golden[key] = output_hash
+        with open(GOLDEN_FILE, 'w') as f:
+            json.dump(golden, f, indent=1, sort_keys=True)
+            f.write('\n')
+        return 'updated'
+    if key not in golden:
+        return 'missing'
+    return 'match' if golden[key] == output_hash else 'mismatch'
+
+
+def print_results(results: dict):
+    print(f'{results["pages"]} pages, {results["markdown_bytes"] / 2 ** 20:.2f} MB of markdown')
+    print(f'{"stage":<26} {"min (s)":>9} {"median (s)":>11}')
+    for name, timing in results['timings'].items():
+        print(f'{name:<26} {timing["min"]:>9.4f} {timing["median"]:>11.4f}')
+    print(f'Golden build: {results["golden"]}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Time md2html on a synthetic site.')
+    for key, default in DEFAULT_SHAPE.items():
+        arg_parser.add_argument(f'--{key.replace("_", "-")}', type=int, default=default,
+                                help=f'(default: {default})')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='times to run each stage (default: 3)')
+    arg_parser.add_argument('-o', '--output', help='file to write the results to as JSON')
+    arg_parser.add_argument('--update-golden', action='store_true',
+                            help='make the HTML of this build the golden build for its shape')
+    args = arg_parser.parse_args()
+    site_shape = {key: getattr(args, key) for key in DEFAULT_SHAPE}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        site = os.path.join(temp_dir, 'site')
+        generate_site(site, **site_shape)
+        bench_results = bench_site(site, os.path.join(temp_dir, 'output'), site_shape, args.repeat)
+    bench_results['golden'] = check_golden(site_shape, bench_results['output_hash'], args.update_golden)
+
+    print_results(bench_results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(bench_results, f, indent=1)
+    if bench_results['golden'] == 'mismatch':
+        sys.exit('The HTML of the build is not the same as the golden build.')
@@ -0,0 +1,218 @@
+"""Generate synthetic sites to benchmark md2html with.
+
+The same shape and seed always give the same site, so builds of it can be
+timed and compared across changes.
+"""
+import os
+import random
+
+# Relative number of each kind of block in a page
+DEFAULT_MIX = {
+    'paragraph':    6,
+    'header':       2,
+    'list':         2,
+    'table':        1,
+    'code':         1,
+    'quote':        1,
+    'links':        1,
+}
+DEFAULT_SHAPE = {
+    'folders': 2,
+    'depth': 2,
+    'pages_per_folder': 10,
+    'page_blocks': 40,
+    'seed': 0,
+}
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+         'et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip '
+         'ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla '
+         'pariatur excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim '
+         'id est laborum').split()
+CODE_LINES = ('def build(site):', '    for page in site.pages:', '        if page.changed:',
+              '            page.render()', '    return site', 'x = [i * 2 for i in range(10)]')
+
+CONFIG = '''\
+address: http://www.example.com
+title: Synthetic Site
+description: A generated site for benchmarks.
+
+# Comma separated filenames to be ignored
+ignore: .DS_Store
+'''
+STYLE = '''\
+body {
+  color: black;
+  font-family: sans-serif;
+}
+'''
+MODULES = {
+    'head.html': '''\
+<head>
+  <meta charset="UTF-8">
+  <title>{{ page.title }}</title>
+  <meta name="description" content="{{ page.description }}">
+  <style>
+    {{ site.css }}
+  </style>
+</head>''',
+    'header.html': '''\
+<header>
+    <h1>{{ site.title }}</h1>
+</header>''',
+    'footer.md': 'Built by **md2html** for [{{ site.title }}](index.html).',
+}
+STRUCTURES = {
+    'page.html': '''\
+<!DOCTYPE html>
+<html lang="en">
+{{ modules.head }}
+<body>
+{{ modules.header }}
+
+<a href="./index.html" class="parent">⬆</a>
+
+<h2>{{ page.title }}</h2>
+
+{{ page }}
+
+{{ modules.footer }}
+
+</body>
+</html>''',
+    'index.html': '''\
+<!DOCTYPE html>
+<html lang="en">
+{{ modules.head }}
+<body>
+{{ modules.header }}
+
+{{ index }}
+
+</body>
+</html>''',
+}
+
+
+class PageGenerator:
+    """Makes the markdown of pages out of a random mix of blocks."""
+
+    def __init__(self, rng: random.Random, mix: dict = None):
+        self.rng = rng
+        mix = mix or DEFAULT_MIX
+        self.kinds = list(mix.keys())
+        self.weights = list(mix.values())
+
+    def words(self, low: int, high: int) -> str:
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def sentence(self) -> str:
+        words = self.words(6, 16).split()
+        # Inline markup on some words
+        for markup in ('**', '_', '`', '~~'):
+            if self.rng.random() < 0.3:
+                i = self.rng.randrange(len(words))
+                words[i] = f'{markup}{words[i]}{markup}'
+        return ' '.join(words).capitalize() + '.'
+
+    def link(self, pages: list) -> str:
+        if pages and self.rng.random() < 0.7:
+            return f'[{self.words(1, 3)}]({self.rng.choice(pages)})'
+        if self.rng.random() < 0.5:
+            return f'<https://www.example.com/{self.rng.choice(WORDS)}>'
+        return f'[{self.words(1, 3)}](https://www.example.com/{self.rng.choice(WORDS)})'
+
+    def block(self, kind: str, pages: list) -> list:
+        rng = self.rng
+        if kind == 'paragraph':
+            return [' '.join(self.sentence() for _ in range(rng.randint(2, 5))) for _ in range(rng.randint(1, 3))]
+        if kind == 'header':
+            return ['#' * rng.randint(1, 4) + ' ' + self.words(2, 6).title()]
+        if kind == 'list':
+            lines, depth = [], 0
+            ordered = rng.random() < 0.5
+            for i in range(rng.randint(2, 8)):
+                # Lists start unindented and only go one level deeper at a time
+                depth = max(0, min(depth + rng.choice((-1, 0, 0, 1)), 3)) if i else 0
+                bullet = f'{i + 1}.' if ordered else rng.choice('*-')
+                checkbox = rng.choice(('', '', '[ ] ', '[x] '))
+                lines.append('  ' * depth + f'{bullet} {checkbox}{self.words(2, 8)}')
+            return lines
+        if kind == 'table':
+            columns = rng.randint(2, 5)
+            return ([' | '.join(self.words(1, 2).title() for _ in range(columns)),
+                     ' | '.join([rng.choice(('---', ':-:', '--:'))] + ['---'] * (columns - 1))] +
+                    [' | '.join(self.words(1, 4) for _ in range(columns)) for _ in range(rng.randint(2, 12))])
+        if kind == 'code':
+            code = [rng.choice(CODE_LINES) for _ in range(rng.randint(2, 10))]
+            if rng.random() < 0.5:
+                return ['```python'] + code + ['```']
+            return ['    ' + line for line in code]
+        if kind == 'quote':
+            return ['> ' + self.sentence()]
+        # links
+        return [' '.join(f'{self.sentence()} See {self.link(pages)}.' for _ in range(rng.randint(2, 5)))]
+
+    def page(self, title: str, blocks: int, pages: list) -> str:
+        """Make a page of blocks, linking to the given pages.
+
+        :param pages: paths of pages to link to, relative to the root of the site
+        """
+        lines = ['---',
+                 f'title: {title}',
+                 f'description: {self.words(4, 12).capitalize()}.',
+                 'structure: page',
+                 '---',
+                 '']
+        for kind in self.rng.choices(self.kinds, self.weights, k=blocks):
+            lines += self.block(kind, pages) + ['']
+        return '\n'.join(lines)
+
+
+def get_folders(folders: int, depth: int) -> list:
+    """Get the path of every folder in a tree of pages, relative to its root
+    (which is '').
+    """
+    paths = ['']
+    level = ['']
+    for _ in range(depth):
+        level = [os.path.join(parent, f'folder_{i}') for parent in level for i in range(folders)]
+        paths += level
+    return paths
+
+
+def generate_site(site_dir: str, folders: int = 2, depth: int = 2, pages_per_folder: int = 10,
+                  page_blocks: int = 40, seed: int = 0, mix: dict = None) -> int:
+    """Write a synthetic site to site_dir.
+
+    :param folders: number of subfolders in each folder of pages
+    :param depth: levels of subfolders below the root of the pages
+    :param pages_per_folder: number of pages in each folder
+    :param page_blocks: number of blocks of markdown in each page
+    :param seed: seed of the random choices, so a site can be made again
+    :param mix: relative number of each kind of block (see DEFAULT_MIX)
+    :return: The number of pages written
+    """
+    generator = PageGenerator(random.Random(seed), mix)
+    pages_dir = os.path.join(site_dir, '_pages')
+    os.makedirs(pages_dir)
+
+    with open(os.path.join(site_dir, 'config.ini'), 'w') as f:
+        f.write(CONFIG)
+    with open(os.path.join(site_dir, 'style.css'), 'w') as f:
+        f.write(STYLE)
+    for group, templates in (('_modules', MODULES), ('_structures', STRUCTURES)):
+        os.mkdir(os.path.join(site_dir, group))
+        for name, template in templates.items():
+            with open(os.path.join(site_dir, group, name), 'w') as f:
+                f.write(template)
+
+    folder_paths = get_folders(folders, depth)
+    page_paths = [os.path.join(folder, f'page_{i}') for folder in folder_paths for i in range(pages_per_folder)]
+    page_links = [f'{path}.html' for path in page_paths]
+    for folder in folder_paths[1:]:
+        os.makedirs(os.path.join(pages_dir, folder))
+    for i, path in enumerate(page_paths):
+        with open(os.path.join(pages_dir, f'{path}.md'), 'w') as f:
+            f.write(generator.page(f'Page {i} {generator.words(1, 3).title()}', page_blocks, page_links))
+    return len(page_paths)
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import md2html
+from benchmarks.bench_md2html import check_golden, hash_tree
+from benchmarks.site_generator import DEFAULT_SHAPE, generate_site, get_folders
+
+
+class TestSiteGenerator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def generate(self, name: str, **shape) -> str:
+        site_dir = os.path.join(self.temp_dir.name, name)
+        generate_site(site_dir, **shape)
+        return site_dir
+
+    def test_get_folders(self):
+        self.assertEqual(['', 'folder_0', 'folder_1'], get_folders(2, 1))
+        self.assertEqual(7, len(get_folders(2, 2)))
+
+    def test_shape(self):
+        site_dir = self.generate('site', folders=3, depth=1, pages_per_folder=4, page_blocks=5)
+        pages_dir = os.path.join(site_dir, '_pages')
+        self.assertEqual(['folder_0', 'folder_1', 'folder_2'],
+                         sorted(folder for folder in os.listdir(pages_dir) if not folder.endswith('.md')))
+        self.assertEqual(4, len(os.listdir(os.path.join(pages_dir, 'folder_1'))))
+
+    def test_same_seed_same_site(self):
+        first = self.generate('first', seed=3, depth=1)
+        second = self.generate('second', seed=3, depth=1)
+        third = self.generate('third', seed=4, depth=1)
+        self.assertEqual(hash_tree(first), hash_tree(second))
+        self.assertNotEqual(hash_tree(first), hash_tree(third))
+
+    def test_mix(self):
+        site_dir = self.generate('site', depth=0, pages_per_folder=1, mix={'table': 1})
+        with open(os.path.join(site_dir, '_pages', 'page_0.md'), 'r') as f:
+            markdown = f.read().split('---\n', 2)[2]
+        self.assertTrue(all(' | ' in line for line in markdown.split('\n') if line))
+
+    def test_site_builds(self):
+        site_dir = self.generate('site', depth=1, pages_per_folder=2)
+        output_dir = os.path.join(self.temp_dir.name, 'output')
+        with redirect_stdout(StringIO()):
+            md2html.main(site_dir, output_dir, full=True)
+        with open(os.path.join(output_dir, 'folder_0', 'page_1.html'), 'r') as f:
+            html = f.read()
+        self.assertIn('<h2>Page 3 ', html)
+        self.assertIn('<a href="../page_', html)
+
+    def test_golden_build(self):
+        site_dir = self.generate('site', **DEFAULT_SHAPE)
+        output_dir = os.path.join(self.temp_dir.name, 'output')
+        with redirect_stdout(StringIO()):
+            md2html.main(site_dir, output_dir, full=True)
+        self.assertEqual('match', check_golden(DEFAULT_SHAPE, hash_tree(output_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+"""A build daemon (md2html.py --daemon), and how to talk to one over its
+Unix socket.
+
+Each request and response is a JSON object on a line of its own. This
+module only needs the standard library, so a client starts in a fraction of
+the time it takes to load md2html and a site.
+
+Run from the root of the repo: `python -m build_daemon.build_daemon SOCKET build`
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+DAEMON_SOCKET = '.md2html.sock'
+COMMANDS = ('build', 'render', 'status', 'stop')
+
+
+class DaemonError(Exception):
+    """Raised when a daemon can't carry out a request, or can't listen for them."""
+
+
+def send_message(file, message: dict):
+    file.write(json.dumps(message).encode('utf-8') + b'\n')
+    file.flush()
+
+
+def read_message(file) -> dict or None:
+    """Read the next message from a file, or None if the other end closed it."""
+    line = file.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def send_request(socket_path: str, message: dict, timeout: float = None) -> dict:
+    """Send a request to the daemon listening at socket_path, and wait for its
+    response.
+
+    :raises OSError: if no daemon is listening there
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        with connection.makefile('rwb') as file:
+            send_message(file, message)
+            response = read_message(file)
+    if response is None:
+        raise ConnectionError(f'The daemon at {socket_path} closed the connection without a response.')
+    return response
+
+
+def remove_stale_socket(socket_path: str):
+    """Remove the socket a daemon left behind when it didn't stop cleanly, so
+    a new daemon can listen there.
+
+    :raises FileExistsError: if the path is something other than a socket,
+                             or a daemon is still listening there
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{socket_path} already exists and isn\'t a socket.')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except ConnectionRefusedError:
+            # Nothing is listening, so the socket is stale
+            os.remove(socket_path)
+            return
+    raise FileExistsError(f'A daemon is already listening at {socket_path}.')
+
+
+class BuildDaemon:
+    """Keeps a site's templates, parser and scan loaded between builds,
+    building it when asked over a Unix socket (see send_request() for the
+    client).
+
+    Requests are handled one at a time. Each is a JSON object with a command:
+    build (what changed since the last build, or everything with full),
+    render (a page, given by its path relative to _pages, giving back its
+    HTML once the site is up to date), status, or stop. The response has ok,
+    what the command printed as log, and either its result or an error.
+    """
+
+    def __init__(self, watcher, socket_path: str = None):
+        """
+        :param watcher: the SiteWatcher of the site (see site_watcher), which
+                        built it once and loaded everything the later builds reuse
+        :param socket_path: where to listen (by default DAEMON_SOCKET in the
+                            output folder of the watcher)
+        """
+        self.watcher = watcher
+        self.socket_path = socket_path or os.path.join(watcher.output_dir, DAEMON_SOCKET)
+        self.started = time.time()
+        self.requests = 0
+        self.running = False
+        self.watcher.save_manifest()
+
+    def serve(self):
+        """Listen for requests until stopped by one, or interrupted.
+
+        :raises DaemonError: if another daemon is listening at the socket path,
+                             or something other than a socket is there
+        """
+        try:
+            remove_stale_socket(self.socket_path)
+        except FileExistsError as error:
+            raise DaemonError(str(error)) from error
+        server = socketserver.UnixStreamServer(self.socket_path, DaemonRequestHandler)
+        server.daemon = self
+        self.running = True
+        print(f'\nListening for builds of {self.watcher.files_dir} at {self.socket_path}')
+        try:
+            while self.running:
+                server.handle_request()
+        except KeyboardInterrupt:
+            print('\nStopped listening')
+        finally:
+            server.server_close()
+            os.remove(self.socket_path)
+            self.watcher.save_manifest()
+
+    def handle(self, request: dict) -> dict:
+        """Carry out a request.
+
+        :return: The response to send back
+        """
+        self.requests += 1
+        command = request.get('command')
+        log = StringIO()
+        start = time.perf_counter()
+        try:
+            with redirect_stdout(log):
+                if command == 'build':
+                    response = self.build(request.get('full', False))
+                elif command == 'render':
+                    response = self.render(request['page'])
+                elif command == 'status':
+                    response = self.get_status()
+                elif command == 'stop':
+                    self.running = False
+                    response = dict()
+                else:
+                    raise DaemonError(f'Unknown command \'{command}\'.')
+        except (Exception, SystemExit) as error:
+            # Keep running, so the next request can be built once the site is fixed
+            return {'ok': False, 'error': str(error) or type(error).__name__, 'log': log.getvalue()}
+        return {'ok': True, **response, 'seconds': time.perf_counter() - start, 'log': log.getvalue()}
+
+    def build(self, full: bool = False) -> dict:
+        if full:
+            self.watcher.build(full=True)
+            rebuilt = True
+        else:
+            rebuilt = self.watcher.poll()
+        # Saved after every build, so a build without the daemon picks up where it left off
+        self.watcher.save_manifest()
+        return {'rebuilt': rebuilt, 'failed': sorted(self.watcher.failed_pages)}
+
+    def render(self, page: str) -> dict:
+        source = os.path.normpath(page)
+        self.build()
+        if os.path.join('_pages', source) in self.watcher.failed_pages:
+            raise DaemonError(f'{os.path.join("_pages", source)} failed: '
+                              f'{self.watcher.failed_pages[os.path.join("_pages", source)]}')
+        if source not in self.watcher.manifest.pages:
+            raise DaemonError(f'No page at \'{os.path.join("_pages", source)}\'.')
+        with open(self.watcher.manifest.pages[source]['output'], 'r') as f:
+            return {'html': f.read()}
+
+    def get_status(self) -> dict:
+        return {'pid': os.getpid(), 'files_dir': self.watcher.files_dir, 'output_dir': self.watcher.output_dir,
+                'uptime': time.time() - self.started, 'requests': self.requests,
+                'pages': len(self.watcher.manifest.pages), 'failed': sorted(self.watcher.failed_pages)}
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while (request := read_message(self.rfile)) is not None:
+            send_message(self.wfile, self.server.daemon.handle(request))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Send a request to an md2html build daemon.')
+    arg_parser.add_argument('socket', help=f'socket of the daemon (by default {DAEMON_SOCKET} in its out_fp)')
+    arg_parser.add_argument('command', choices=COMMANDS,
+                            help='build what changed since the last build, render a page and print its HTML, '
+                                 'show the status of the daemon, or stop it')
+    arg_parser.add_argument('page', nargs='?', help='page to render, relative to _pages (e.g. blog/post.md)')
+    arg_parser.add_argument('--full', action='store_true', help='rebuild every page and index')
+    arg_parser.add_argument('--timeout', type=float, help='most seconds to wait for the daemon')
+    args = arg_parser.parse_args()
+    if (args.command == 'render') != (args.page is not None):
+        arg_parser.error('a page is needed to render, and only to render')
+
+    request = {'command': args.command}
+    if args.page is not None:
+        request['page'] = args.page
+    if args.full:
+        request['full'] = True
+    try:
+        daemon_response = send_request(args.socket, request, args.timeout)
+    except OSError as error:
+        sys.exit(f'Could not reach the daemon at {args.socket}: {error}')
+
+    sys.stdout.write(daemon_response.get('log', ''))
+    if 'html' in daemon_response:
+        sys.stdout.write(daemon_response['html'])
+    if args.command == 'status':
+        print(json.dumps({key: value for key, value in daemon_response.items() if key not in ('ok', 'log')},
+                         indent=1))
+    if not daemon_response['ok']:
+        sys.exit(daemon_response['error'])
+    if daemon_response.get('failed'):
+        sys.exit(f'{len(daemon_response["failed"])} page(s) failed to render.')
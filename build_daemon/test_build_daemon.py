@@ -0,0 +1,98 @@
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from types import SimpleNamespace
+
+from build_daemon import (DAEMON_SOCKET, BuildDaemon, DaemonError, read_message, remove_stale_socket, send_message,
+                          send_request)
+
+
+class EchoHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while (message := read_message(self.rfile)) is not None:
+            send_message(self.wfile, {'echo': message})
+
+
+class TestBuildDaemon(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, 'daemon.sock')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_messages(self):
+        file = BytesIO()
+        send_message(file, {'command': 'build', 'full': True})
+        send_message(file, {'command': 'status'})
+        file.seek(0)
+        self.assertEqual({'command': 'build', 'full': True}, read_message(file))
+        self.assertEqual({'command': 'status'}, read_message(file))
+        self.assertIsNone(read_message(file))
+
+    def test_send_request(self):
+        server = socketserver.UnixStreamServer(self.socket_path, EchoHandler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            self.assertEqual({'echo': {'command': 'status'}}, send_request(self.socket_path, {'command': 'status'}, 5))
+        finally:
+            thread.join()
+            server.server_close()
+
+    def test_no_daemon(self):
+        with self.assertRaises(OSError):
+            send_request(self.socket_path, {'command': 'status'})
+
+    def test_remove_stale_socket(self):
+        remove_stale_socket(self.socket_path)
+        # A socket closed without being removed is left behind
+        socketserver.UnixStreamServer(self.socket_path, EchoHandler).server_close()
+        remove_stale_socket(self.socket_path)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_keep_live_socket(self):
+        server = socketserver.UnixStreamServer(self.socket_path, EchoHandler)
+        try:
+            with self.assertRaises(FileExistsError):
+                remove_stale_socket(self.socket_path)
+            self.assertTrue(os.path.exists(self.socket_path))
+        finally:
+            server.server_close()
+
+    def test_keep_other_file(self):
+        with open(self.socket_path, 'w') as f:
+            f.write('Not a socket')
+        with self.assertRaises(FileExistsError):
+            remove_stale_socket(self.socket_path)
+        with open(self.socket_path, 'r') as f:
+            self.assertEqual('Not a socket', f.read())
+
+    def test_handle(self):
+        watcher = SimpleNamespace(files_dir='site', output_dir=self.temp_dir.name, save_manifest=lambda: None,
+                                  failed_pages={'_pages/bad.md': 'Bad'},
+                                  manifest=SimpleNamespace(pages={'good.md': {}}))
+        daemon = BuildDaemon(watcher)
+        self.assertEqual(os.path.join(self.temp_dir.name, DAEMON_SOCKET), daemon.socket_path)
+        status = daemon.handle({'command': 'status'})
+        self.assertTrue(status['ok'])
+        self.assertEqual(1, status['pages'])
+        self.assertEqual(['_pages/bad.md'], status['failed'])
+        response = daemon.handle({'command': 'rebuild'})
+        self.assertFalse(response['ok'])
+        self.assertEqual('Unknown command \'rebuild\'.', response['error'])
+
+    def test_socket_path_taken(self):
+        with open(self.socket_path, 'w') as f:
+            f.write('Not a socket')
+        daemon = BuildDaemon(SimpleNamespace(output_dir=self.temp_dir.name, save_manifest=lambda: None),
+                             self.socket_path)
+        with self.assertRaises(DaemonError):
+            daemon.serve()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = '.md2html_manifest.json'
+MANIFEST_VERSION = 2
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HashedLines:
+    """Lines of text that are hashed as they are iterated over, giving the
+    same hash as hash_text() of the whole text.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.hash = hashlib.sha256()
+        # Bytes of UTF-8 hashed so far
+        self.size = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            encoded = line.encode('utf-8')
+            self.hash.update(encoded)
+            self.size += len(encoded)
+            yield line
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+def hash_templates(template_groups: dict) -> dict:
+    """Hash every site, module, and structure template, keyed by reference
+    (e.g. 'modules.footer').
+    """
+    template_hashes = dict()
+    for group_name in ('site', 'modules', 'structures'):
+        for name, template in template_groups.get(group_name, dict()).items():
+            template_hashes[f'{group_name}.{name}'] = hash_text(template)
+    return template_hashes
+
+
+class BuildManifest:
+    """Record of what the last build rendered and what each output depended on.
+
+    Entries from the previous build are only read, while the entries of the
+    current build are recorded fresh, so sources that disappear are dropped
+    from the manifest on the next save.
+    """
+
+    def __init__(self, previous: dict = None):
+        previous = previous or dict()
+        self.previous_pages = previous.get('pages', dict())
+        self.previous_indexes = previous.get('indexes', dict())
+        self.pages = dict()
+        self.indexes = dict()
+        self.template_hashes = dict()
+
+    @classmethod
+    def load(cls, output_dir: str):
+        """Load the manifest from the output folder, or an empty one if there
+        is no usable manifest there.
+        """
+        return cls(cls.read(output_dir))
+
+    @staticmethod
+    def read(output_dir: str) -> dict:
+        """Read the entries of the manifest in the output folder, or none if
+        there is no usable manifest there.
+        """
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            return dict()
+        try:
+            with open(manifest_path, 'r') as f:
+                previous = json.load(f)
+        except ValueError:
+            return dict()
+        if previous.get('version') != MANIFEST_VERSION:
+            return dict()
+        return previous
+
+    @classmethod
+    def carry_over(cls, previous: dict):
+        """Make a manifest that already has every entry of a build, for a
+        build that only renders what changed since and records over the rest.
+        """
+        manifest = cls(previous)
+        manifest.pages = dict(manifest.previous_pages)
+        manifest.indexes = dict(manifest.previous_indexes)
+        return manifest
+
+    def get_entries(self) -> dict:
+        return {'version': MANIFEST_VERSION,
+                'pages': self.pages,
+                'indexes': self.indexes}
+
+    def save(self, output_dir: str):
+        # Without indenting, the manifest is written by the much faster C encoder
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+            f.write(json.dumps(self.get_entries(), sort_keys=True))
+
+    def set_templates(self, template_groups: dict):
+        self.template_hashes = hash_templates(template_groups)
+
+    def get_dependencies(self, references: set) -> dict:
+        """Get the hashes of the given templates (e.g. every template a page
+        uses, see DependencyGraph.get_dependencies()), leaving out any that
+        don't exist.
+        """
+        return {reference: self.template_hashes[reference] for reference in sorted(references)
+                if reference in self.template_hashes}
+
+    def get_previous_page(self, source: str) -> dict or None:
+        return self.previous_pages.get(source)
+
+    def page_is_current(self, source: str, source_hash: str, dependencies: dict, output_path: str) -> bool:
+        """Check if a page's output was built from the same source and
+        templates that it would be built from now.
+        """
+        previous = self.previous_pages.get(source)
+        return (previous is not None
+                and previous['source_hash'] == source_hash
+                and previous['dependencies'] == dependencies
+                and previous['output'] == output_path
+                and os.path.isfile(output_path))
+
+    def record_page(self, source: str, source_hash: str, front_matter: dict, output_path: str, dependencies: dict,
+                    references: list = ()):
+        """Record a page that was built.
+
+        :param references: the templates the page uses directly, which stay
+                           the same while its source does
+        """
+        self.pages[source] = {'source_hash': source_hash,
+                              'front_matter': front_matter,
+                              'output': output_path,
+                              'dependencies': dependencies,
+                              'references': sorted(references)}
+
+    def index_is_current(self, folder: str, index_hash: str, dependencies: dict, output_path: str) -> bool:
+        previous = self.previous_indexes.get(folder)
+        return (previous is not None
+                and previous['hash'] == index_hash
+                and previous['dependencies'] == dependencies
+                and previous['output'] == output_path
+                and os.path.isfile(output_path))
+
+    def record_index(self, folder: str, index_hash: str, output_path: str, dependencies: dict):
+        self.indexes[folder] = {'hash': index_hash,
+                                'output': output_path,
+                                'dependencies': dependencies}
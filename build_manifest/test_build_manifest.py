@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest, HashedLines, hash_templates, hash_text, MANIFEST_FILE
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.output_dir.name, 'page.html')
+        with open(self.output_path, 'w') as f:
+            f.write('<p>Built</p>')
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def test_empty_when_missing(self):
+        manifest = BuildManifest.load(self.output_dir.name)
+        self.assertIsNone(manifest.get_previous_page('page.md'))
+
+    def test_empty_when_corrupt(self):
+        with open(os.path.join(self.output_dir.name, MANIFEST_FILE), 'w') as f:
+            f.write('{not json')
+        manifest = BuildManifest.load(self.output_dir.name)
+        self.assertIsNone(manifest.get_previous_page('page.md'))
+
+    def test_page_is_current_after_save(self):
+        manifest = BuildManifest()
+        manifest.record_page('page.md', 'abc', {'structure': 'page'}, self.output_path, {'structures.page': '123'})
+        manifest.save(self.output_dir.name)
+
+        manifest = BuildManifest.load(self.output_dir.name)
+        self.assertTrue(manifest.page_is_current('page.md', 'abc', {'structures.page': '123'}, self.output_path))
+        self.assertFalse(manifest.page_is_current('page.md', 'abd', {'structures.page': '123'}, self.output_path))
+        self.assertFalse(manifest.page_is_current('page.md', 'abc', {'structures.page': '124'}, self.output_path))
+        self.assertEqual({'structure': 'page'}, manifest.get_previous_page('page.md')['front_matter'])
+
+    def test_page_not_current_without_output(self):
+        manifest = BuildManifest()
+        manifest.record_page('page.md', 'abc', {}, self.output_path, {})
+        manifest.save(self.output_dir.name)
+        os.remove(self.output_path)
+
+        manifest = BuildManifest.load(self.output_dir.name)
+        self.assertFalse(manifest.page_is_current('page.md', 'abc', {}, self.output_path))
+
+    def test_removed_sources_are_dropped(self):
+        manifest = BuildManifest()
+        manifest.record_page('page.md', 'abc', {}, self.output_path, {})
+        manifest.save(self.output_dir.name)
+
+        BuildManifest.load(self.output_dir.name).save(self.output_dir.name)
+        self.assertIsNone(BuildManifest.load(self.output_dir.name).get_previous_page('page.md'))
+
+    def test_carry_over_keeps_entries(self):
+        manifest = BuildManifest()
+        manifest.record_page('page.md', 'abc', {}, self.output_path, {})
+        manifest.record_index('', 'def', self.output_path, {})
+
+        manifest = BuildManifest.carry_over(manifest.get_entries())
+        self.assertTrue(manifest.index_is_current('', 'def', {}, self.output_path))
+        manifest.record_page('other.md', 'ghi', {}, self.output_path, {})
+        manifest.save(self.output_dir.name)
+        self.assertEqual({'page.md', 'other.md'}, set(BuildManifest.read(self.output_dir.name)['pages']))
+
+    def test_dependencies_only_include_given_templates(self):
+        manifest = BuildManifest()
+        manifest.set_templates({'site': {'title': 'Site'},
+                                'modules': {'footer': 'Footer'},
+                                'structures': {'page': '{{ page }}', 'index': '{{ index }}'}})
+        self.assertEqual({'modules.footer', 'structures.page'},
+                         set(manifest.get_dependencies({'modules.footer', 'structures.page', 'site.missing'})))
+
+    def test_hashed_lines_match_hash_text(self):
+        lines = HashedLines(['---\n', 'title: Café\n', '---\n', 'Text'])
+        self.assertEqual('---\ntitle: Café\n---\nText', ''.join(lines))
+        self.assertEqual(hash_text('---\ntitle: Café\n---\nText'), lines.hexdigest())
+        self.assertEqual(len('---\ntitle: Café\n---\nText'.encode('utf-8')), lines.size)
+
+    def test_hash_templates(self):
+        hashes = hash_templates({'modules': {'footer': 'Footer'}, 'page': {'title': 'Ignored'}})
+        self.assertEqual(['modules.footer'], list(hashes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT_VERSION = 1
+
+
+def get_percentile(sorted_values: list, percent: float) -> float:
+    """Get a percentile of sorted values by the nearest rank."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))  # ceiling
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(values: list) -> dict:
+    values = sorted(values)
+    return {'p50': get_percentile(values, 50),
+            'p95': get_percentile(values, 95),
+            'max': values[-1] if values else 0.0}
+
+
+class PageTimer:
+    """Times the stages of rendering one page.
+
+    Stages can be timed as a block, or as the time spent getting items from
+    an iterator, for stages that are done lazily as the page is written.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = dict()
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def time_iter(self, stage: str, iterator) -> iter:
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            self.add(stage, time.perf_counter() - start)
+            yield item
+
+    def finish(self, other_stage: str) -> dict:
+        """Stop timing the page, counting the time not in any stage as
+        other_stage.
+
+        :return: The seconds of the page as a whole and of each stage
+        """
+        seconds = time.perf_counter() - self.start
+        self.stages[other_stage] = max(0.0, seconds - sum(self.stages.values()))
+        return {'seconds': seconds, 'stages': self.stages}
+
+
+class BuildProfile:
+    """Timers and counters for the stages of a build and each page in it,
+    reported as JSON.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.start = time.perf_counter()
+        self.stages = dict()
+        self.counters = dict()
+        self.pages = []
+        self.trace_memory = trace_memory
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds, calls = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (seconds + time.perf_counter() - start, calls + 1)
+
+    def count(self, counter: str, amount: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record_page(self, source: str, timing: dict, bytes_read: int, bytes_written: int):
+        """Record the timing of a page from PageTimer.finish()."""
+        self.pages.append({'source': source, **timing, 'bytes_read': bytes_read, 'bytes_written': bytes_written})
+        self.count('bytes_read', bytes_read)
+        self.count('bytes_written', bytes_written)
+
+    def report(self, top: int = 10) -> dict:
+        """Make the report of the build so far.
+
+        :param top: number of the slowest pages to list
+        """
+        page_stages = dict()
+        for page in self.pages:
+            for stage, seconds in page['stages'].items():
+                page_stages.setdefault(stage, []).append(seconds)
+        report = {
+            'version': REPORT_VERSION,
+            'seconds': time.perf_counter() - self.start,
+            'stages': {stage: {'seconds': seconds, 'calls': calls} for stage, (seconds, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+            'pages': {'count': len(self.pages),
+                      'seconds': summarize([page['seconds'] for page in self.pages]),
+                      'stages': {stage: summarize(times) for stage, times in page_stages.items()}},
+            'slowest_pages': sorted(self.pages, key=lambda page: page['seconds'], reverse=True)[:top],
+            'peak_memory_bytes': None,
+        }
+        if self.trace_memory and tracemalloc.is_tracing():
+            report['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        return report
+
+    def save(self, path: str, top: int = 10):
+        report = self.report(top)
+        if self.trace_memory:
+            tracemalloc.stop()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+from build_profile import BuildProfile, PageTimer, get_percentile, summarize
+
+
+class TestPercentiles(unittest.TestCase):
+    def test_get_percentile(self):
+        values = list(range(1, 21))
+        self.assertEqual(10, get_percentile(values, 50))
+        self.assertEqual(19, get_percentile(values, 95))
+        self.assertEqual(1, get_percentile(values, 0))
+        self.assertEqual(0.0, get_percentile([], 50))
+
+    def test_summarize(self):
+        self.assertEqual({'p50': 2, 'p95': 3, 'max': 3}, summarize([3, 1, 2]))
+
+
+class TestPageTimer(unittest.TestCase):
+    def test_stages(self):
+        timer = PageTimer()
+        with timer.stage('split'):
+            pass
+        with timer.stage('write'):
+            pass
+        with timer.stage('write'):
+            pass
+        self.assertEqual(['a', 'b'], list(timer.time_iter('parse', 'ab')))
+        timing = timer.finish('fill')
+        self.assertEqual({'split', 'write', 'parse', 'fill'}, set(timing['stages']))
+        self.assertAlmostEqual(timing['seconds'], sum(timing['stages'].values()))
+
+
+class TestBuildProfile(unittest.TestCase):
+    def test_report(self):
+        profile = BuildProfile()
+        with profile.stage('walk'):
+            pass
+        with profile.stage('walk'):
+            pass
+        profile.count('pages_rendered', 2)
+        for i, seconds in enumerate((0.5, 2.0)):
+            profile.record_page(f'page{i}.md', {'seconds': seconds, 'stages': {'parse': seconds}}, 10, 100)
+        report = profile.report(top=1)
+        self.assertEqual(2, report['stages']['walk']['calls'])
+        self.assertEqual({'pages_rendered': 2, 'bytes_read': 20, 'bytes_written': 200}, report['counters'])
+        self.assertEqual(2.0, report['pages']['seconds']['max'])
+        self.assertEqual(0.5, report['pages']['stages']['parse']['p50'])
+        self.assertEqual(['page1.md'], [page['source'] for page in report['slowest_pages']])
+        self.assertIsNone(report['peak_memory_bytes'])
+
+    def test_save_with_memory(self):
+        profile = BuildProfile(trace_memory=True)
+        data = [0] * 10000
+        del data
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'profile.json')
+            profile.save(path)
+            with open(path, 'r') as f:
+                report = json.load(f)
+        self.assertGreater(report['peak_memory_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
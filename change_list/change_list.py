@@ -0,0 +1,86 @@
+import json
+import os
+
+from site_tree.site_tree import scan_site
+
+CHANGES_FILE = '.md2html_changes.json'
+CHANGES_VERSION = 1
+# Only files the build could have made are pruned, so other files kept in
+# the output folder (e.g. images) are left alone
+PRUNED_EXTENSION = '.html'
+
+
+class ChangeList:
+    """The output files a build added, modified, and removed, saved as JSON
+    so a deploy can push just those instead of comparing the whole output.
+
+    Every output the build made is recorded, changed or not, so the outputs
+    it didn't make (e.g. of pages since removed) can be pruned.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        # Change and hash of every output, by its path relative to the output folder
+        self.outputs = dict()
+
+    def get_path(self, path: str) -> str:
+        if path.startswith(self.output_dir) and path[len(self.output_dir):len(self.output_dir) + 1] == os.sep:
+            return path[len(self.output_dir) + 1:]
+        return os.path.relpath(path, self.output_dir)
+
+    def record(self, path: str, change: str or None, output_hash: str = None):
+        """Record an output the build made.
+
+        :param change: 'added', 'modified', or None if it was unchanged
+        :param output_hash: hash of the output, if it was added or modified
+        """
+        self.outputs[self.get_path(path)] = (change, output_hash)
+
+    def remove(self, path: str):
+        """Record an output the build removed."""
+        self.outputs[self.get_path(path)] = ('removed', None)
+
+    def get_entries(self) -> dict:
+        entries = {'version': CHANGES_VERSION, 'added': dict(), 'modified': dict(), 'removed': []}
+        for path, (change, output_hash) in sorted(self.outputs.items()):
+            if change == 'removed':
+                entries['removed'].append(path)
+            elif change is not None:
+                entries[change][path] = output_hash
+        return entries
+
+    def save(self):
+        with open(os.path.join(self.output_dir, CHANGES_FILE), 'w') as f:
+            f.write(json.dumps(self.get_entries()))
+
+    def prune(self, ignore: list = ()) -> list:
+        """Remove the HTML files in the output folder that the build didn't
+        make, and any folders left empty by it.
+
+        :param ignore: folders to leave alone (e.g. the source folder, if it's
+                       inside the output folder)
+        :return: The paths of the removed files, relative to the output folder
+        """
+        removed = []
+        # Folders something was pruned from, which are removed if that left them empty
+        pruned_folders = set()
+        tree = scan_site(self.output_dir, ignore)
+        # Bottom up, so a folder is only checked once its subfolders were pruned
+        for path, folder in reversed(list(tree.walk())):
+            for name in list(folder.files):
+                file_path = os.path.join(path, name)
+                if name.endswith(PRUNED_EXTENSION) and self.outputs.get(file_path, ('removed',))[0] == 'removed':
+                    os.remove(os.path.join(self.output_dir, file_path))
+                    del folder.files[name]
+                    self.outputs[file_path] = ('removed', None)
+                    removed.append(file_path)
+                    pruned_folders.add(path)
+            for name, subfolder in list(folder.folders.items()):
+                subfolder_path = os.path.join(path, name)
+                if (subfolder_path not in pruned_folders or subfolder.files or subfolder.folders or
+                        os.listdir(os.path.join(self.output_dir, subfolder_path))):
+                    continue
+                os.rmdir(os.path.join(self.output_dir, subfolder_path))
+                del folder.folders[name]
+                pruned_folders.add(path)
+        return sorted(removed)
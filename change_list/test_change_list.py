@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+
+from change_list import ChangeList, CHANGES_FILE
+
+
+class TestChangeList(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_files(self, *paths: str):
+        for path in paths:
+            path = os.path.join(self.output_dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('<p></p>')
+
+    def test_save(self):
+        changes = ChangeList(self.output_dir)
+        changes.record(os.path.join(self.output_dir, 'index.html'), None)
+        changes.record(os.path.join(self.output_dir, 'folder', 'page.html'), 'added', 'abc')
+        changes.record(os.path.join(self.output_dir, 'page.html'), 'modified', 'def')
+        changes.remove(os.path.join(self.output_dir, 'index-2.html'))
+        changes.save()
+        with open(os.path.join(self.output_dir, CHANGES_FILE), 'r') as f:
+            self.assertEqual({'version': 1,
+                              'added': {os.path.join('folder', 'page.html'): 'abc'},
+                              'modified': {'page.html': 'def'},
+                              'removed': ['index-2.html']}, json.load(f))
+
+    def test_prune(self):
+        self.make_files('index.html', 'old.html', 'image.png', os.path.join('old', 'index.html'),
+                        os.path.join('kept', 'index.html'), os.path.join('kept', 'old.html'))
+        os.mkdir(os.path.join(self.output_dir, 'empty'))
+        changes = ChangeList(self.output_dir)
+        for path in ('index.html', os.path.join('kept', 'index.html')):
+            changes.record(os.path.join(self.output_dir, path), None)
+        self.assertEqual([os.path.join('kept', 'old.html'), 'old.html', os.path.join('old', 'index.html')],
+                         changes.prune())
+        self.assertEqual(['empty', 'image.png', 'index.html', 'kept'], sorted(os.listdir(self.output_dir)))
+        self.assertEqual(['index.html'], os.listdir(os.path.join(self.output_dir, 'kept')))
+        self.assertEqual([os.path.join('kept', 'old.html'), 'old.html', os.path.join('old', 'index.html')],
+                         changes.get_entries()['removed'])
+
+    def test_prune_ignores_folders(self):
+        self.make_files(os.path.join('source', '_modules', 'head.html'))
+        ChangeList(self.output_dir).prune([os.path.join(self.output_dir, 'source')])
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, 'source', '_modules', 'head.html')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+
+GRAPH_FILE = '.md2html_graph.json'
+
+
+class DependencyGraph:
+    """Which templates each template and page of a site uses, to find what a
+    change to a template affects.
+
+    Templates are named by reference, like 'modules.footer'. A page uses its
+    structure (e.g. 'structures.page') and any template its front matter or
+    markdown refers to.
+    """
+
+    def __init__(self, templates: dict = None, pages: dict = None):
+        """
+        :param templates: the templates each template refers to directly, by
+                          template (see Templater.get_dependency_graph())
+        :param pages: the templates each page uses directly, by source
+        """
+        self.templates = templates or dict()
+        self.pages = pages or dict()
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'r') as f:
+            graph = json.load(f)
+        return cls(graph['templates'], graph['pages'])
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'templates': self.templates, 'pages': self.pages}, f, sort_keys=True)
+
+    def set_page(self, source: str, references: list):
+        self.pages[source] = sorted(references)
+
+    def remove_page(self, source: str):
+        self.pages.pop(source, None)
+
+    def get_dependencies(self, references: list) -> set:
+        """Get the templates used by the given templates, directly or through
+        other templates, as well as the given templates themselves.
+        """
+        dependencies = set(references)
+        to_visit = list(dependencies)
+        while to_visit:
+            for reference in self.templates.get(to_visit.pop(), ()):
+                if reference not in dependencies:
+                    dependencies.add(reference)
+                    to_visit.append(reference)
+        return dependencies
+
+    def get_page_dependencies(self, source: str) -> set:
+        return self.get_dependencies(self.pages.get(source, ()))
+
+    def get_dependents(self, references: list) -> set:
+        """Get the templates that use any of the given templates, directly or
+        through other templates, as well as the given templates themselves.
+
+        :param references: templates, which don't have to exist any more
+                           (e.g. a removed module)
+        """
+        users = dict()
+        for template, template_references in self.templates.items():
+            for reference in template_references:
+                users.setdefault(reference, []).append(template)
+        dependents = set(references)
+        to_visit = list(dependents)
+        while to_visit:
+            for user in users.get(to_visit.pop(), ()):
+                if user not in dependents:
+                    dependents.add(user)
+                    to_visit.append(user)
+        return dependents
+
+    def get_affected_pages(self, references: list) -> list:
+        """Get the sources of the pages that use any of the given templates,
+        directly or through other templates, sorted.
+        """
+        dependents = self.get_dependents(references)
+        return sorted(source for source, page_references in self.pages.items()
+                      if not dependents.isdisjoint(page_references))
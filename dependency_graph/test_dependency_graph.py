@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from dependency_graph import DependencyGraph
+
+TEMPLATES = {
+    'site.title': [],
+    'modules.head': ['site.title'],
+    'modules.header': ['site.title'],
+    'modules.footer': [],
+    'structures.page': ['modules.footer', 'modules.head', 'modules.header'],
+    'structures.index': ['modules.head'],
+    'structures.bare': [],
+}
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph(dict(TEMPLATES), {'page1.md': ['structures.page'],
+                                                      'page2.md': ['site.title', 'structures.bare'],
+                                                      'folder/page3.md': ['structures.bare']})
+
+    def test_get_dependencies(self):
+        self.assertEqual({'structures.index', 'modules.head', 'site.title'},
+                         self.graph.get_dependencies(['structures.index']))
+        self.assertEqual({'structures.bare', 'site.title'}, self.graph.get_page_dependencies('page2.md'))
+        self.assertEqual(set(), self.graph.get_page_dependencies('missing.md'))
+
+    def test_get_dependents(self):
+        self.assertEqual({'modules.footer', 'structures.page'}, self.graph.get_dependents(['modules.footer']))
+        self.assertEqual({'site.title', 'modules.head', 'modules.header', 'structures.page', 'structures.index'},
+                         self.graph.get_dependents(['site.title']))
+        self.assertEqual({'modules.removed'}, self.graph.get_dependents(['modules.removed']))
+
+    def test_get_affected_pages(self):
+        self.assertEqual(['page1.md'], self.graph.get_affected_pages(['modules.footer']))
+        self.assertEqual(['page1.md', 'page2.md'], self.graph.get_affected_pages(['site.title']))
+        self.assertEqual(['folder/page3.md', 'page2.md'], self.graph.get_affected_pages(['structures.bare']))
+        self.assertEqual([], self.graph.get_affected_pages(['modules.unused']))
+
+    def test_set_and_remove_pages(self):
+        self.graph.set_page('page1.md', ['structures.bare', 'modules.footer'])
+        self.graph.remove_page('page2.md')
+        self.assertEqual(['folder/page3.md', 'page1.md'], self.graph.get_affected_pages(['structures.bare']))
+        self.assertEqual(['page1.md'], self.graph.get_affected_pages(['site.title', 'modules.footer']))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'graph.json')
+            self.graph.save(path)
+            graph = DependencyGraph.load(path)
+        self.assertEqual(self.graph.templates, graph.templates)
+        self.assertEqual(self.graph.pages, graph.pages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Benchmarks for markdown made to make the parser backtrack or loop.
+
+Each case is parsed at doubling sizes. If parsing any of them grows faster
+than linearly, the case is marked SLOW and the run exits with an error, so
+it can guard against a regex that brings the backtracking back.
+
+The growth is fitted over every size, so a single jump in time (e.g. when a
+line stops fitting in the CPU cache) isn't taken for backtracking, which
+grows at least quadratically.
+
+Run from this folder: `python bench_adversarial.py`
+"""
+import math
+import sys
+import timeit
+
+from markdown_parser import MarkdownParser
+
+SIZES = tuple(2 ** power for power in range(14, 19))
+# Most the time can grow by per doubling of the size, as a power of 2.
+# Linear is 1 and quadratic is 2, with room between for noise.
+MAX_GROWTH = 1.5
+# Least time to parse a case for, repeating it if it's quicker, so a short
+# time isn't lost in the noise
+MIN_TIME = 0.02
+
+CASES = {
+    # Table rows with a trailing pipe made the old regex try every split of the cells
+    'table row, trailing pipe':     lambda n: 'a' + ' | a' * (n // 4) + ' |',
+    'table row, no cells':          lambda n: 'a' + ' |' * (n // 2),
+    'table rows':                   lambda n: '\n'.join(['a | b | c |'] * (n // 11)),
+    # Simple links that never close, or open on every character
+    'simple link, no close':        lambda n: '<' + 'a.' * (n // 2),
+    'simple links, all open':       lambda n: '<' * (n - 2) + '.a',
+    'simple links, many dots':      lambda n: '<a.' * (n // 3),
+    'simple links, spaced':         lambda n: '<a.b ' * (n // 5),
+    # Links and images that never close
+    'links, all open':              lambda n: '[' * n,
+    'links, no url close':          lambda n: '[a](' * (n // 4),
+    'link, long text':              lambda n: '[' + 'a' * (n // 2) + '](' + 'b' * (n // 2),
+    'image, no close':              lambda n: '![' + 'a' * (n // 2) + '](' + 'b' * (n // 2),
+    # Inline markup on every character
+    'emphasis':                     lambda n: '*_' * (n // 2),
+    'backticks':                    lambda n: '`a' * (n // 2),
+    'checkboxes':                   lambda n: '[ ] ' * (n // 4),
+    # Block markup
+    'horizontal rule, broken':      lambda n: '-' * n + 'x',
+    'list, deep indent':            lambda n: ' ' * (n // 8) + '- a',
+    'blockquotes':                  lambda n: '\n'.join(['> a'] * (n // 4)),
+}
+
+
+def time_parse(markdown: str, repeat: int = 5) -> float:
+    """Best time of several to parse markdown once."""
+    md_parser = MarkdownParser()
+    timer = timeit.Timer(lambda: md_parser.parse(markdown))
+    number = 1
+    while (seconds := timer.timeit(number)) < MIN_TIME:
+        number *= 2
+    return min([seconds] + timer.repeat(repeat=repeat - 1, number=number)) / number
+
+
+def fit_growth(sizes: tuple, seconds: list) -> float:
+    """Power of 2 the time grows by per doubling of the size, fitted to
+    every size by least squares.
+    """
+    xs = [math.log2(size) for size in sizes]
+    ys = [math.log2(s) for s in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+
+def bench_adversarial() -> bool:
+    """Time every case at every size.
+
+    :return: If every case parsed in linear time
+    """
+    print(f'{"case":<28}' + ''.join(f'{size:>10,}' for size in SIZES) + f'{"growth":>8}')
+    all_linear = True
+    for name, make_markdown in CASES.items():
+        seconds = [time_parse(make_markdown(size)) for size in SIZES]
+        growth = fit_growth(SIZES, seconds)
+        linear = growth <= MAX_GROWTH
+        all_linear = all_linear and linear
+        print(f'{name:<28}' + ''.join(f'{s:>10.4f}' for s in seconds) + f'{growth:>8.2f}' +
+              ('' if linear else '  SLOW'))
+    return all_linear
+
+
+if __name__ == '__main__':
+    if not bench_adversarial():
+        sys.exit('Some cases parsed in more than linear time.')
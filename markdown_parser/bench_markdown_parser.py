@@ -0,0 +1,82 @@
+"""Benchmarks for the markdown parser.
+
+Run from this folder: `python bench_markdown_parser.py`
+"""
+import timeit
+
+from markdown_parser import MarkdownParser
+
+SEQUENTIAL_LINE_TYPES = ('header', 'image', 'ul', 'ol', 'code_block', 'code_block_indent', 'table_row', 'hr',
+                         'blockquote')
+PROSE = ('Lorem ipsum dolor sit amet, **consectetur** adipiscing elit, sed do _eiusmod_ tempor '
+         'incididunt ut `labore` et dolore [magna](magna_aliqua.html) aliqua & <http://www.example.com> '
+         'ut enim ad ~~minim~~ veniam. ')
+
+
+def time_parse(markdown: str, number: int = 3) -> float:
+    md_parser = MarkdownParser()
+    return min(timeit.repeat(lambda: md_parser.parse(markdown), number=1, repeat=number))
+
+
+def bench_inline_scaling():
+    """Parse a single paragraph on a single line, doubling its size each time.
+
+    Linear scaling keeps the time per MB about the same at every size.
+    """
+    print('Single line paragraph')
+    print(f'{"size (MB)":>10} {"time (s)":>9} {"s/MB":>7}')
+    for megabytes in (1, 2, 4, 8):
+        paragraph = PROSE * (megabytes * 2 ** 20 // len(PROSE))
+        seconds = time_parse(paragraph)
+        size = len(paragraph) / 2 ** 20
+        print(f'{size:>10.1f} {seconds:>9.3f} {seconds / size:>7.3f}')
+
+
+def make_corpus(kind: str, lines: int) -> list:
+    if kind == 'prose':
+        paragraph = ['Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.',
+                     'Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip.',
+                     'Duis aute irure dolor in **reprehenderit** in voluptate velit esse cillum dolore.', '']
+        block = ['# A header', ''] + paragraph * 6
+    elif kind == 'lists':
+        block = ['* An item', '* Another item with `code`', '  - A nested item', '    1. Deeper still',
+                 '  - Back up a level', '1. An ordered item', '2. [ ] A checkbox', '']
+    else:
+        block = ['Name | Value | Notes', '--- | --- | ---'] + \
+                [f'Row {i} | {i * 7} | Some notes about row {i}' for i in range(20)] + ['']
+    return (block * (lines // len(block) + 1))[:lines]
+
+
+def classify_sequentially(md_parser: MarkdownParser, line: str) -> str or None:
+    """Classify a line by trying each block regex in turn."""
+    for line_type in SEQUENTIAL_LINE_TYPES:
+        if md_parser.line_is(line_type, line):
+            return line_type
+    return None
+
+
+def bench_line_types():
+    """Count how many lines per second get classified, and parsed in full,
+    for corpora of mostly prose, lists, or tables.
+    """
+    print('\nLines per second')
+    print(f'{"corpus":>7} {"sequential":>11} {"dispatch":>9} {"parse":>9}')
+    md_parser = MarkdownParser()
+    for kind in ('prose', 'lists', 'tables'):
+        lines = make_corpus(kind, 100_000)
+        non_empty_lines = [line for line in lines if line]
+        assert [classify_sequentially(md_parser, line) for line in non_empty_lines] == \
+               [md_parser.get_line_type(line) for line in non_empty_lines]
+
+        sequential = min(timeit.repeat(lambda: [classify_sequentially(md_parser, line) for line in non_empty_lines],
+                                       number=1, repeat=3))
+        dispatch = min(timeit.repeat(lambda: [md_parser.get_line_type(line) for line in non_empty_lines],
+                                     number=1, repeat=3))
+        parse = time_parse('\n'.join(lines))
+        print(f'{kind:>7} {len(non_empty_lines) / sequential:>11,.0f} {len(non_empty_lines) / dispatch:>9,.0f} '
+              f'{len(lines) / parse:>9,.0f}')
+
+
+if __name__ == '__main__':
+    bench_inline_scaling()
+    bench_line_types()
@@ -0,0 +1,58 @@
+"""Benchmark for parsing one very large document in chunks across processes.
+
+Parses a generated changelog of headers, prose, lists, tables and code
+blocks (50 MB by default) in one process and in parallel, and checks that
+both give the same HTML. The run exits with an error if they don't.
+
+Run from this folder: `python bench_parallel.py`
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_markdown_parser import make_corpus
+from markdown_parser import DEFAULT_CHUNK_SIZE, MarkdownParser
+
+CODE_BLOCK = ['```python', 'def release(version):', '', '    return f"v{version}"', '```', '']
+
+
+def make_changelog(megabytes: float) -> str:
+    """Make a changelog of releases until it is at least megabytes long."""
+    release = '\n'.join(make_corpus('prose', 40) + make_corpus('lists', 16) + make_corpus('tables', 23) +
+                        CODE_BLOCK + ['> Released with no known issues.', ''])
+    releases = []
+    size = 0
+    while size < megabytes * 2 ** 20:
+        releases.append(f'## Release {len(releases)}\n\n{release}')
+        size += len(releases[-1]) + 1
+    return '\n'.join(releases)
+
+
+def time_parse(md_parser: MarkdownParser, markdown: str) -> (float, str):
+    start = time.perf_counter()
+    html = md_parser.parse(markdown)
+    return time.perf_counter() - start, html
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Time parsing a large document in parallel.')
+    arg_parser.add_argument('--megabytes', type=float, default=50, help='size of the document (default: 50)')
+    arg_parser.add_argument('--jobs', type=int, help='processes to parse with (default: one per CPU)')
+    arg_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'least characters in each chunk (default: {DEFAULT_CHUNK_SIZE})')
+    args = arg_parser.parse_args()
+
+    changelog = make_changelog(args.megabytes)
+    parallel_parser = MarkdownParser(parallel_threshold=0, jobs=args.jobs, chunk_size=args.chunk_size)
+    chunks = parallel_parser.split_chunks(changelog)
+    print(f'{len(changelog) / 2 ** 20:.1f} MB in {len(chunks)} chunks, '
+          f'{args.jobs or os.cpu_count()} process(es) of {os.cpu_count()} CPU(s)')
+
+    serial_seconds, serial_html = time_parse(MarkdownParser(), changelog)
+    print(f'{"serial":>9} {serial_seconds:>8.2f} s')
+    parallel_seconds, parallel_html = time_parse(parallel_parser, changelog)
+    print(f'{"parallel":>9} {parallel_seconds:>8.2f} s  ({serial_seconds / parallel_seconds:.2f}x)')
+    if parallel_html != serial_html:
+        sys.exit('The HTML parsed in parallel is not the same as parsed serially.')
+    print('Same HTML')
@@ -1,8 +1,168 @@
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Changes whenever the same markdown could be parsed or rendered differently,
+# so results kept from an older parser are not reused
+PARSER_VERSION = 2
+
+# Kinds of tokens. TEXT tokens hold text as it is written to the HTML, so it
+# is already escaped. OPEN and VOID tokens hold a tag id and a tuple of
+# (attribute, value) pairs, where a value of True is a boolean attribute.
+#   (OPEN, tag_id, attributes), (CLOSE, tag_id), (TEXT, text), (VOID, tag_id, attributes)
+OPEN, CLOSE, TEXT, VOID = range(4)
+
+# Least characters in each chunk of a document parsed in parallel
+DEFAULT_CHUNK_SIZE = 2 ** 20
+
+
+class ParseTimeout(Exception):
+    """Raised when parsing takes longer than the parser's time limit."""
+
+
+# Tag names by tag id, and tag ids by tag name. Tags are only ever added,
+# and a tag's name is added before its id, so reading them needs no lock.
+tag_names = []
+tag_ids = dict()
+tag_lock = threading.Lock()
+
+
+def get_tag_id(tag: str) -> int:
+    if (tag_id := tag_ids.get(tag)) is None:
+        with tag_lock:
+            if (tag_id := tag_ids.get(tag)) is None:
+                tag_names.append(tag)
+                tag_id = tag_ids[tag] = len(tag_names) - 1
+    return tag_id
+
+
+A_TAG_ID = get_tag_id('a')
+
+
+class HtmlRenderer:
+    """Renders the blocks of tokens made by MarkdownParser to HTML.
+
+    Internal links are relative to the root of the site in the tokens, and
+    are made relative to the page when rendered at its depth. Rendering to
+    parts instead splits the HTML where those links start, so joining the
+    parts with '../' * depth gives the HTML at any depth.
+    """
+
+    def __init__(self):
+        # Rendered opening and closing tags by tag id, for tags without
+        # attributes. Replaced whole as tags are added, so threads rendering
+        # at once always see the two lists match.
+        self.tags = ([], [])
+
+    def render(self, blocks, file_depth: int = 0) -> str:
+        return '\n'.join(self.render_block(tokens, file_depth) for tokens in blocks)
+
+    def render_block(self, tokens: list, file_depth: int = 0) -> str:
+        return (file_depth * '../').join(self.render_block_parts(tokens))
+
+    def render_parts(self, blocks) -> list:
+        """Render blocks of tokens to parts of HTML, joining the blocks with
+        newlines.
+        """
+        parts = ['']
+        separator = ''
+        for tokens in blocks:
+            block_parts = self.render_block_parts(tokens)
+            parts[-1] += separator + block_parts[0]
+            parts += block_parts[1:]
+            separator = '\n'
+        return parts
+
+    def render_block_parts(self, tokens: list) -> list:
+        open_tags, close_tags = self.tags
+        if len(open_tags) < len(tag_names):
+            names = tag_names[:]
+            open_tags, close_tags = self.tags = ([f'<{tag}>' for tag in names], [f'</{tag}>' for tag in names])
+        internal_link = MarkdownParser.regex['internal_link']
+        parts = []
+        html = []
+        for token in tokens:
+            kind = token[0]
+            if kind == TEXT:
+                html.append(token[1])
+            elif kind == CLOSE:
+                html.append(close_tags[token[1]])
+            elif not token[2]:
+                html.append(open_tags[token[1]])
+            elif token[1] == A_TAG_ID:
+                tag = self.render_tag(token[1], token[2])
+                href = dict(token[2]).get('href')
+                if href is not None and internal_link.search(href):
+                    # Split the HTML where the internal link starts
+                    start = tag.index(f' href="{href}"') + len(' href="')
+                    html.append(tag[:start])
+                    parts.append(''.join(html))
+                    html = [tag[start:]]
+                else:
+                    html.append(tag)
+            else:
+                html.append(self.render_tag(token[1], token[2]))
+        parts.append(''.join(html))
+        return parts
+
+    @staticmethod
+    def render_tag(tag_id: int, attributes: tuple) -> str:
+        html = '<' + tag_names[tag_id]
+        for attr, value in attributes:
+            html += f' {attr}'
+            # If not HTML5 boolean attribute
+            if type(value) == str:
+                html += f'="{value}"'
+        return html + '>'
+
+
+class ParseState:
+    """The state of parsing one document.
+
+    Each parse has its own, so one MarkdownParser can parse any number of
+    documents at once, from any number of threads.
+    """
+
+    def __init__(self):
+        self.element_stack = ['ROOT']
+        # Tokens of the current block
+        self.current_block = []
+        # Finished blocks of tokens
+        self.output = []
+        self.blockquote = False
+        self.code = False
+        self.code_triple = False
+        self.pre = False
+        self.pre_indent = False
+        self.list_depth = 0
+
+    def get_carried_state(self) -> tuple:
+        """Get the state a blank line outside of code leaves to the lines
+        after it. Everything else starts over after a blank line.
+        """
+        return self.blockquote, self.code, self.code_triple
+
+    def set_carried_state(self, carried_state: tuple):
+        self.blockquote, self.code, self.code_triple = carried_state
+
+
+def parse_chunk(markdown: str, file_depth: int, carried_state: tuple, time_limit: float = None) -> (str, tuple):
+    """Parse a chunk of a document from the state carried over from the
+    chunks before it, in a process of a pool.
+
+    :return: The HTML of the chunk, and the state it carries over to the next
+    """
+    state = ParseState()
+    state.set_carried_state(carried_state)
+    html = '\n'.join(MarkdownParser(time_limit).iter_parse(markdown.split('\n'), file_depth, state))
+    return html, state.get_carried_state()
 
 
 class MarkdownParser:
+    # None of these can backtrack more than linearly, so hostile markdown
+    # can't make a line take much longer to parse than its length
     regex = {
         # Whole line
         'header':               re.compile(r'^#+'),
@@ -11,102 +171,296 @@ class MarkdownParser:
         'blockquote':           re.compile(r'^>(?!>).*'),  # match only one
         'code_block':           re.compile(r'^`{3}\w*$'),
         'code_block_indent':    re.compile(r'^\s{4}'),
-        'checkbox':             re.compile(r'^\[[\sxX]]\s'),
+        'checkbox':             re.compile(r'\[[\sxX]]\s'),
         'ul':                   re.compile(r'^\s*[*-]\s'),
         'ol':                   re.compile(r'^\s*\d+\.\s'),
         # Inline
-        'strong':               re.compile(r'^((\*\*)|(__))'),
-        'em':                   re.compile(r'^((\*(?!\*))|(_(?!_)))'),
-        'strikethrough':        re.compile(r'^~~'),
-        'code':                 re.compile(r'^`(?!`)'),
-        'code_triple':          re.compile(r'^`{3}'),
-        'link':                 re.compile(r'^\[[^\[\]]+]\([^()]+\)'),
-        'link_simple':          re.compile(r'^<\S+\.\S+>'),
+        'link':                 re.compile(r'\[[^\[\]]+]\([^()]+\)'),
+        'non_space':            re.compile(r'\S*'),
+        'inline_text':          re.compile(r'[^*_~`\[<]+'),
+        'inline_code_text':     re.compile(r'[^`]+'),
         'image':                re.compile(r'^!\[[^\[\]]+]\([^()]+\)$'),
         # Tables
         'table_div':            re.compile(r'^((---)|(:--)|(:-:)|(--:))(\s\|\s((---)|(:--)|(:-:)|(--:)))+$'),
-        'table_row':            re.compile(r'^[^|]+((\s\|\s).+[^\s|])+$'),
+        # Same as ^[^|]+((\s\|\s).+[^\s|])+$, as '.+' can take in any more cells
+        'table_row':            re.compile(r'^[^|]+\s\|\s.+[^\s|]$'),
 
         # Utilities
         'internal_link':        re.compile(r'^(?!https?://).*$'),
     }
+    # Types a line can be by its first character, in the order they are
+    # checked, with only the types that can start with that character
+    line_types = {
+        '#':        ('header',),
+        '!':        ('image', 'table_row'),
+        '*':        ('ul', 'table_row', 'hr'),
+        '-':        ('ul', 'table_row', 'hr'),
+        '`':        ('code_block', 'table_row'),
+        '_':        ('table_row', 'hr'),
+        '=':        ('table_row', 'hr'),
+        '>':        ('table_row', 'blockquote'),
+        '|':        (),
+        'digit':    ('ol', 'table_row'),
+        'space':    ('ul', 'ol', 'code_block_indent', 'table_row'),
+    }
+    other_line_types = ('table_row',)
     list_indent_interval = 2
 
-    def __init__(self):
-        self.element_stack = []
-        self.current_line = ''
-        self.output = []
-        self.blockquote = False
-        self.code = False
-        self.code_triple = False
-        self.pre = False
-        self.pre_indent = False
-        self.list_depth = 0
-        self.file_depth = 0
+    def __init__(self, time_limit: float = None, parallel_threshold: int = None, jobs: int = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        :param time_limit: Most seconds to parse a document for before
+                           raising ParseTimeout, or None for no limit
+        :param parallel_threshold: Least characters in a document for parse()
+                                   to parse it in chunks across processes (see
+                                   parse_parallel()), or None to never do so
+        :param jobs: Processes to parse chunks with (by default, one per CPU)
+        :param chunk_size: Least characters in each chunk
+        """
+        self.time_limit = time_limit
+        self.parallel_threshold = parallel_threshold
+        self.jobs = jobs
+        self.chunk_size = chunk_size
+        self.renderer = HtmlRenderer()
 
     def parse(self, markdown: str, file_depth: int = 0):
-        # Set up vars
-        self.set_up(file_depth)
-
+        if self.parallel_threshold is not None and len(markdown) >= self.parallel_threshold:
+            return self.parse_parallel(markdown, file_depth)
+        return '\n'.join(self.iter_parse(markdown.split('\n'), file_depth))
+
+    def parse_parallel(self, markdown: str, file_depth: int = 0) -> str:
+        """Parse a document in chunks across a pool of processes, giving the
+        same HTML as parsing it in one go.
+
+        The document is split at blank lines outside of code blocks, where
+        every block is finished and the parse starts over but for the state
+        from get_carried_state(). Each chunk is parsed from the state the
+        chunks before it are expected to leave. A chunk whose actual starting
+        state turns out different is parsed again from that state.
+        """
+        chunks = self.split_chunks(markdown)
+        if len(chunks) == 1:
+            return '\n'.join(self.iter_parse(markdown.split('\n'), file_depth))
+        deadline = time.monotonic() + self.time_limit if self.time_limit is not None else None
+
+        def get_time_limit() -> float or None:
+            return max(0.0, deadline - time.monotonic()) if deadline is not None else None
+
+        html = []
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(parse_chunk, chunk, file_depth, carried_state, self.time_limit)
+                       for chunk, carried_state in chunks]
+            carried_state = ParseState().get_carried_state()
+            for (chunk, expected_state), future in zip(chunks, futures):
+                chunk_html, end_state = future.result()
+                if expected_state != carried_state:
+                    chunk_html, end_state = parse_chunk(chunk, file_depth, carried_state, get_time_limit())
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise ParseTimeout(f'Parsing took longer than {self.time_limit} seconds.')
+                # A chunk of only blank lines has no blocks to join
+                if chunk_html:
+                    html.append(chunk_html)
+                carried_state = end_state
+        return '\n'.join(html)
+
+    def split_chunks(self, markdown: str) -> list:
+        """Split a document into chunks of at least chunk_size characters,
+        at blank lines outside of code blocks.
+
+        Whether a chunk starts after a blockquote is known from the lines
+        before it, but not whether inline code left open carries over, which
+        is expected not to.
+
+        :return: Each chunk, with the state it's expected to start from
+        """
+        regex = self.regex
+        chunks = []
+        chunk_start = 0
+        blockquote = pre = pre_indent = False
+        start_state = (False, False, False)
+        line_start = 0
         for line in markdown.split('\n'):
-            self.parse_line(line)
-        self.reset_element_stack()
-        return '\n'.join(self.output)
+            line_end = line_start + len(line)
+            if pre:
+                # The same as parse_line()
+                if regex['code_block'].search(line):
+                    pre = False
+                line_start = line_end + 1
+                continue
+            if pre_indent:
+                if line[:4] == '    ':
+                    line_start = line_end + 1
+                    continue
+                pre_indent = False
+            line = line.rstrip()
+            if not line:
+                if line_start - chunk_start >= self.chunk_size:
+                    # The blank line is left out, as the end of a chunk finishes its blocks the same way
+                    chunks.append((markdown[chunk_start:max(chunk_start, line_start - 1)], start_state))
+                    chunk_start = line_end + 1
+                    start_state = (blockquote, False, False)
+            elif line[0] in '`>' or line[0].isspace():
+                line_type = self.get_line_type(line)
+                if line_type == 'code_block' or line_type == 'code_block_indent':
+                    # The same as use_code_block()
+                    if line[:4] == '    ':
+                        pre_indent = True
+                    else:
+                        pre = True
+                elif line_type == 'blockquote':
+                    blockquote = True
+            line_start = line_end + 1
+        chunks.append((markdown[chunk_start:], start_state))
+        return chunks
+
+    def parse_tokens(self, markdown: str) -> list:
+        """Parse markdown into a list of blocks of tokens, which can be
+        rendered later with HtmlRenderer.render() at any file depth.
+        """
+        return list(self.iter_parse_tokens(markdown.split('\n')))
+
+    def parse_parts(self, lines) -> list:
+        """Parse lines of markdown into parts of HTML that don't depend on the
+        file depth. Joining the parts with '../' * file_depth gives the same
+        HTML as parse() at that depth.
+        """
+        return self.renderer.render_parts(self.iter_parse_tokens(lines))
+
+    def iter_parse(self, lines, file_depth: int = 0, state: ParseState = None):
+        """Parse lines of markdown, yielding each block of HTML as soon as it
+        is finished.
+
+        Joining the blocks with newlines gives the same HTML as parse().
+
+        :param lines: lines of markdown, without their newlines
+        :param state: state to start parsing from, which is left as the parse ends
+        """
+        render_block = self.renderer.render_block
+        for tokens in self.iter_parse_tokens(lines, state):
+            yield render_block(tokens, file_depth)
+
+    def iter_parse_tokens(self, lines, state: ParseState = None):
+        """Parse lines of markdown, yielding each block of tokens as soon as
+        it is finished.
+        """
+        if state is None:
+            state = ParseState()
+        time_limit = self.time_limit
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+
+        for line in lines:
+            self.parse_line(state, line)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise ParseTimeout(f'Parsing took longer than {time_limit} seconds.')
+            if state.output:
+                yield from state.output
+                state.output = []
+        self.reset_element_stack(state)
+        yield from state.output
+
+    def parse_stream(self, file, file_depth: int = 0):
+        """Parse markdown from an open file, yielding each block of HTML as
+        soon as it is finished.
+        """
+        return self.iter_parse(self.split_lines(file), file_depth)
 
-    def parse_line(self, line: str):
-        if self.pre:
+    @staticmethod
+    def split_lines(file):
+        """Yield the lines of a file the same as splitting its text on
+        newlines would, including the empty line after a final newline.
+        """
+        line = ''
+        for line in file:
+            yield line[:-1] if line[-1:] == '\n' else line
+        if line == '' or line[-1:] == '\n':
+            yield ''
+
+    def parse_line(self, state: ParseState, line: str):
+        if state.pre:
             if self.line_is('code_block', line):
-                self.pre = False
-                self.reset_element_stack()
+                state.pre = False
+                self.reset_element_stack(state)
                 return
             else:
-                self.current_line += line + '\n'
+                state.current_block.append((TEXT, line + '\n'))
                 return
-        elif self.pre_indent:
+        elif state.pre_indent:
             if line[:4] != '    ':
-                self.pre_indent = False
-                self.reset_element_stack()
+                state.pre_indent = False
+                self.reset_element_stack(state)
                 # Continue to parse current line normally
             else:
-                self.current_line += line[4:] + '\n'
+                state.current_block.append((TEXT, line[4:] + '\n'))
                 return
 
         line = line.rstrip()
 
         if not line:
-            self.reset_element_stack()
-            self.list_depth = 0
-        elif self.line_is('header', line):
-            self.use_header(line)
-        elif self.line_is('image', line):
-            self.use_image(line)
-        elif self.line_is('ul', line):
-            self.use_list('ul', line)
-        elif self.line_is('ol', line):
-            self.use_list('ol', line)
-        elif self.line_is('code_block', line) or self.line_is('code_block_indent', line):
-            self.use_code_block(line)
-        elif self.line_is('table_row', line):
-            self.use_table(line)
-        elif self.line_is('hr', line):
-            self.use_el('hr', {'_nothing': True})
-        elif self.line_is('blockquote', line):
-            self.use_blockquote(line)
+            self.reset_element_stack(state)
+            state.list_depth = 0
+        elif (line_type := self.get_line_type(line)) is None:
+            self.use_paragraph(state, line)
+        elif line_type == 'header':
+            self.use_header(state, line)
+        elif line_type == 'image':
+            self.use_image(state, line)
+        elif line_type == 'ul' or line_type == 'ol':
+            self.use_list(state, line_type, line)
+        elif line_type == 'code_block' or line_type == 'code_block_indent':
+            self.use_code_block(state, line)
+        elif line_type == 'table_row':
+            self.use_table(state, line)
+        elif line_type == 'hr':
+            self.use_el(state, 'hr', {'_nothing': True})
         else:
-            self.use_paragraph(line)
+            self.use_blockquote(state, line)
+
+    def get_line_type(self, line: str) -> str or None:
+        """Get the block type of a non-empty line, or None for a paragraph."""
+        first_char = line[0]
+        if first_char.isspace():
+            first_char = 'space'
+        elif first_char.isdecimal():
+            first_char = 'digit'
+        for line_type in self.line_types.get(first_char, self.other_line_types):
+            # Skip the regex for the most common miss, a line with no pipes
+            if line_type == 'table_row' and '|' not in line:
+                continue
+            if self.regex[line_type].search(line):
+                return line_type
+        return None
+
+    def parse_inline(self, state: ParseState, line: str):
+        """Parse the inline elements of a line in a single pass.
 
-    def parse_inline(self, line: str):
+        Runs of plain text are found and escaped whole, and markup is only
+        looked for at the characters that can start it.
+        """
+        regex = self.regex
+        output = state.current_block
+        # End of the run of non-space characters a simple link would have to
+        # be in, with the last '>' and '.' that could end it
+        run_end = simple_link_end = simple_link_dot = 0
         i = 0
         while i < len(line):
-            if (self.code and self.line_is('code', line[i:]) or
-                    self.code_triple and self.line_is('code_triple', line[i:])):
-                i += 1 if self.code else 3  # ```
-                self.code, self.code_triple = False, False
-                self.use_el('code')
+            if state.code or state.code_triple:
+                if text := regex['inline_code_text'].match(line, i):
+                    output.append((TEXT, self.html_escape(text.group())))
+                    i = text.end()
+                    continue
+                # Only backticks are left to check for the end of the code
+                if state.code and line[i + 1:i + 2] != '`' or state.code_triple and line.startswith('```', i):
+                    i += 1 if state.code else 3  # ```
+                    state.code, state.code_triple = False, False
+                    self.use_el(state, 'code')
+                else:
+                    output.append((TEXT, '`'))
+                    i += 1
                 continue
-            elif self.code or self.code_triple:
-                self.current_line += self.html_escape(line[i])
-                i += 1
+
+            if text := regex['inline_text'].match(line, i):
+                output.append((TEXT, self.html_escape(text.group())))
+                i = text.end()
                 continue
 
             # All of these need a way to check if a closing block exists.
@@ -114,149 +468,173 @@ class MarkdownParser:
             # when there is an underscore in a link. If anyone ever uses an
             # asterisk or underscore, it will trigger an em, which is not the
             # intended way to go.
-            if self.line_is('strong', line[i:]):
-                self.use_el('strong')
-                i += 1  # ** or __
-            elif self.line_is('em', line[i:]):
-                self.use_el('em')
-            elif self.line_is('strikethrough', line[i:]):
-                self.use_el('s')
-                i += 1  # ~~
-            elif self.line_is('code_triple', line[i:]):
-                self.code_triple = True
-                self.use_el('code')
-                i += 2  # ```
-            elif self.line_is('code', line[i:]):
-                self.code = True
-                self.use_el('code')
-            elif self.line_is('link', line[i:]) or self.line_is('link_simple', line[i:]):
-                link = self.get_link(line[i:])
-                self.use_link(link)
-                i += len(link) - 1  # go to end of link inline
-            elif self.line_is('checkbox', line[i:]):
-                self.use_checkbox(line[i:4])
-                i += 2  # '[ ] '
+            char = line[i]
+            if char in '*_':
+                if line[i + 1:i + 2] == char:
+                    self.use_el(state, 'strong')
+                    i += 1  # ** or __
+                else:
+                    self.use_el(state, 'em')
+            elif char == '~':
+                if line[i + 1:i + 2] == '~':
+                    self.use_el(state, 's')
+                    i += 1  # ~~
+                else:
+                    output.append((TEXT, char))
+            elif char == '`':
+                if line.startswith('```', i):
+                    state.code_triple = True
+                    self.use_el(state, 'code')
+                    i += 2  # ```
+                elif line[i + 1:i + 2] != '`':
+                    state.code = True
+                    self.use_el(state, 'code')
+                else:
+                    output.append((TEXT, char))
+            elif char == '[':
+                if link := regex['link'].match(line, i):
+                    self.use_link(state, link.group())
+                    i = link.end() - 1  # go to end of link inline
+                elif regex['checkbox'].match(line, i):
+                    self.use_checkbox(state, line[i:4])
+                    i += 2  # '[ ] '
+                else:
+                    output.append((TEXT, char))
+            # <
             else:
-                self.current_line += self.html_escape(line[i])
+                # Same as matching <\S+\.\S+>, but each run of non-space
+                # characters is only searched once, however many '<' are in it
+                if i >= run_end:
+                    run_end = regex['non_space'].match(line, i).end()
+                    simple_link_end = line.rfind('>', i, run_end)
+                    simple_link_dot = line.rfind('.', i, simple_link_end - 1) if simple_link_end != -1 else -1
+                if simple_link_dot >= i + 2:
+                    self.use_link(state, line[i:simple_link_end + 1])
+                    i = simple_link_end
+                else:
+                    output.append((TEXT, '&lt;'))
             i += 1
 
     def line_is(self, element: str, line: str):
         return self.regex[element].search(line)
 
-    def use_header(self, header: str):
+    def use_header(self, state: ParseState, header: str):
         level = str(self.regex['header'].search(header).span()[1])
-        self.use_el(f'h{level}', {'_content': header.replace('#', '').lstrip()})
+        self.use_el(state, f'h{level}', {'_content': header.replace('#', '').lstrip()})
 
-    def use_image(self, image: str):
+    def use_image(self, state: ParseState, image: str):
         alt, src = image[2:-1].split('](')  # ![ ... ]
-        self.use_el('img', {'_nothing': True, 'src': src, 'alt': alt, 'title': alt})
-
-    def get_link(self, line: str) -> str:
-        link_type = 'link_simple' if line[0] == '<' else 'link'
-        return self.regex[link_type].search(line).group()
+        self.use_el(state, 'img', {'_nothing': True, 'src': src, 'alt': alt, 'title': alt})
 
-    def use_link(self, link: str):
+    def use_link(self, state: ParseState, link: str):
         if link[0] == '<':
             href = text = link[1:-1]
         else:
             text, href = link[1:-1].split('](')
-        if self.line_is('internal_link', href):
-            href = self.file_depth * '../' + href
-        self.use_el('a', {'href': href, '_content': self.html_escape(text)})
+        self.use_el(state, 'a', {'href': href, '_content': self.html_escape(text)})
 
-    def use_checkbox(self, checkbox: str):
+    def use_checkbox(self, state: ParseState, checkbox: str):
         options = {'type': 'checkbox', '_nothing': True}
         if checkbox.lower() == '[x] ':
             options['checked'] = True
-        self.use_el('input', options)
+        self.use_el(state, 'input', options)
 
-    def use_code_block(self, code_block: str):
+    def use_code_block(self, state: ParseState, code_block: str):
         # Indent block
         if code_block[:4] == '    ':
-            self.pre_indent = True
-            self.use_el('pre')
-            self.current_line += self.html_escape(code_block[4:]) + '\n'
+            state.pre_indent = True
+            self.use_el(state, 'pre')
+            state.current_block.append((TEXT, self.html_escape(code_block[4:]) + '\n'))
         # Triple backticks
         else:
-            self.pre = True
+            state.pre = True
             options = {}
             if code_block[3:]:
                 options['data-code-lang'] = self.html_escape(code_block[3:])
-            self.use_el('pre', options)
+            self.use_el(state, 'pre', options)
 
-    def use_table(self, line: str):
+    def use_table(self, state: ParseState, line: str):
         # instantiating the table if first table line seen
-        if self.element_stack[-1] == 'ROOT':
-            self.use_el('table')
-            self.use_el('thead')
-            self.use_el('tr')
+        if state.element_stack[-1] == 'ROOT':
+            self.use_el(state, 'table')
+            self.use_el(state, 'thead')
+            self.use_el(state, 'tr')
             for cell in line.split(' | '):
-                self.use_el('th', {'scope': 'col', '_content': self.html_escape(cell)})
-            self.use_el('tr')
-            self.use_el('thead')
+                self.use_el(state, 'th', {'scope': 'col', '_content': self.html_escape(cell)})
+            self.use_el(state, 'tr')
+            self.use_el(state, 'thead')
         elif self.line_is('table_div', line):
             # ':--' Left align is default, do nothing
             if (alignment := line[0:3]) == ':-:':
-                self.current_line = self.current_line.replace('<table>', '<table class="center">')
+                self.set_table_class(state, 'center')
             elif alignment == '--:':
-                self.current_line = self.current_line.replace('<table>', '<table class="right">')
-            self.use_el('tbody')
+                self.set_table_class(state, 'right')
+            self.use_el(state, 'tbody')
         else:
-            self.use_el('tr')
+            self.use_el(state, 'tr')
             for cell in line.split(' | '):
-                self.use_el('td', {'_content': self.html_escape(cell)})
-            self.use_el('tr')
-
-    def use_blockquote(self, line: str):
-        if not self.blockquote:
-            self.blockquote = True
-            self.use_el('blockquote')
-            self.use_el('p')
+                self.use_el(state, 'td', {'_content': self.html_escape(cell)})
+            self.use_el(state, 'tr')
+
+    def set_table_class(self, state: ParseState, table_class: str):
+        """Add a class to the tables in the current block that have no
+        attributes yet.
+        """
+        table_id = get_tag_id('table')
+        state.current_block = [(OPEN, table_id, (('class', table_class),))
+                              if token[0] == OPEN and token[1] == table_id and not token[2] else token
+                              for token in state.current_block]
+
+    def use_blockquote(self, state: ParseState, line: str):
+        if not state.blockquote:
+            state.blockquote = True
+            self.use_el(state, 'blockquote')
+            self.use_el(state, 'p')
             line = line[2:]
         else:
             line = ' ' + line[2:]
-        self.parse_inline(line)
+        self.parse_inline(state, line)
 
-    def use_list(self, list_type: str, li: str):
+    def use_list(self, state: ParseState, list_type: str, li: str):
         current_indent = (len(li) - len(li.lstrip())) // self.list_indent_interval
 
-        if current_indent > self.list_depth:
+        if current_indent > state.list_depth:
             first = True
-            while current_indent > self.list_depth:
-                self.use_el(list_type)
+            while current_indent > state.list_depth:
+                # Skipped levels each get an item to hold the next list
                 if not first:
-                    self.use_el('li')
-                    continue
+                    self.use_el(state, 'li')
+                self.use_el(state, list_type)
                 first = False
-                self.list_depth += 1
-        elif current_indent < self.list_depth:
+                state.list_depth += 1
+        elif current_indent < state.list_depth:
             first = True
-            while current_indent < self.list_depth:
+            while current_indent < state.list_depth:
                 if first:
-                    self.use_el('li')
+                    self.use_el(state, 'li')
                     first = False
-                self.use_el(self.element_stack[-1])
-                self.use_el('li')
-                self.list_depth -= 1
-        elif self.element_stack[-1] not in [list_type, 'li']:
-            self.use_el(list_type)
+                self.use_el(state, state.element_stack[-1])
+                self.use_el(state, 'li')
+                state.list_depth -= 1
+        elif state.element_stack[-1] not in [list_type, 'li']:
+            self.use_el(state, list_type)
         else:
-            self.use_el('li')
+            self.use_el(state, 'li')
 
-        self.list_depth = current_indent
+        state.list_depth = current_indent
 
         text = self.regex[list_type].split(li.lstrip())[1]
-        self.use_el('li')
-        self.parse_inline(text)
+        self.use_el(state, 'li')
+        self.parse_inline(state, text)
 
-    def use_paragraph(self, text: str):
-        if self.element_stack[-1] != 'p':
-            self.current_line += self.open_el('p')
+    def use_paragraph(self, state: ParseState, text: str):
+        if state.element_stack[-1] != 'p':
+            self.open_el(state, 'p')
         else:
-            self.use_el('br', {'_nothing': True})
-        self.parse_inline(text)
+            self.use_el(state, 'br', {'_nothing': True})
+        self.parse_inline(state, text)
 
-    def use_el(self, element: str, options: dict = None):
+    def use_el(self, state: ParseState, element: str, options: dict = None):
         """Create an HTML element.
 
         Arguments:
@@ -267,61 +645,38 @@ class MarkdownParser:
             <any>: str     -- Attribute: value (true means boolean attr)
         """
         if options:
-            attributes = {key: options[key] for key in options if key[0] != '_'}
-            self.current_line += self.open_el(element, attributes)
-            if content := options.get('_content'):
-                self.parse_inline(content)
-                self.current_line += self.close_el(element)
+            attributes = tuple((key, options[key]) for key in options if key[0] != '_')
             if options.get('_nothing'):
-                self.element_stack.pop()
-        elif self.element_stack[-1] != element:
-            self.current_line += self.open_el(element, options)
+                state.current_block.append((VOID, get_tag_id(element), attributes))
+                return
+            self.open_el(state, element, attributes)
+            if content := options.get('_content'):
+                self.parse_inline(state, content)
+                self.close_el(state, element)
+        elif state.element_stack[-1] != element:
+            self.open_el(state, element)
         else:
-            self.current_line += self.close_el(element)
+            self.close_el(state, element)
 
-    def open_el(self, element: str, options: dict = None):
-        self.element_stack.append(element)
-        if options is None:
-            options = {}
-        attributes = ''
-        for attr, value in options.items():
-            attributes += f' {attr}'
-            # If not HTML5 boolean attribute
-            if type(value) == str:
-                attributes += f'="{value}"'
-        return '<' + element + attributes + '>'
+    def open_el(self, state: ParseState, element: str, attributes: tuple = ()):
+        state.element_stack.append(element)
+        state.current_block.append((OPEN, get_tag_id(element), attributes))
 
-    def close_el(self, element: str):
-        self.element_stack.pop()
-        return '</' + element + '>'
-
-    def set_up(self, file_depth: int):
-        self.element_stack = ['ROOT']
-        self.current_line = ''
-        self.output = []
-        self.blockquote = False
-        self.code = False
-        self.code_triple = False
-        self.pre = False
-        self.pre_indent = False
-        self.list_depth = 0
-        self.file_depth = file_depth
+    def close_el(self, state: ParseState, element: str):
+        state.element_stack.pop()
+        state.current_block.append((CLOSE, get_tag_id(element)))
 
-    def reset_element_stack(self):
-        for element in reversed(self.element_stack):
+    def reset_element_stack(self, state: ParseState):
+        for element in reversed(state.element_stack):
             if element != 'ROOT':
-                self.use_el(element)
-        if self.current_line:
-            self.output.append(self.current_line)
-            self.current_line = ''
+                self.use_el(state, element)
+        if state.current_block:
+            state.output.append(state.current_block)
+        state.current_block = []
 
     @staticmethod
     def html_escape(line):
-        escape_chars = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
-        escaped = ''
-        for char in line:
-            escaped += escape_chars.get(char) if escape_chars.get(char) else char
-        return escaped
+        return line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
 if __name__ == '__main__':
@@ -331,9 +686,8 @@ if __name__ == '__main__':
     _, in_fp, out_fp = sys.argv
     markdown_parser = MarkdownParser()
 
-    with open(in_fp, 'r') as markdown:
-        parsed_markdown = markdown_parser.parse(markdown.read())
-    with open(out_fp, 'w') as html:
-        html.write(parsed_markdown)
+    with open(in_fp, 'r') as markdown, open(out_fp, 'w') as html:
+        for i, block in enumerate(markdown_parser.parse_stream(markdown)):
+            html.write(f'\n{block}' if i else block)
 
     print(f'({in_fp}) : markdown --> html : ({out_fp})')
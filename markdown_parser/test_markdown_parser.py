@@ -1,6 +1,11 @@
+import sys
+import threading
 import unittest
-from markdown_parser import MarkdownParser
+from concurrent.futures import ThreadPoolExecutor
+from markdown_parser import MarkdownParser, ParseTimeout, HtmlRenderer, OPEN, CLOSE, TEXT, VOID, get_tag_id, tag_names
 
+from io import StringIO
+from unittest import mock
 from textwrap import dedent
 
 
@@ -101,6 +106,20 @@ class TestMarkdownParserSingleLines(unittest.TestCase):
         self.assertEqual('<p><a href="cousin_folder/faraway.html">cousin_folder/faraway.html</a></p>',
                          self.md_parser.parse('<cousin_folder/faraway.html>'))
 
+    def test_lone_markup_characters(self):
+        self.assertEqual('<p>Tilde ~ and &lt; [brackets]</p>',
+                         self.md_parser.parse('Tilde ~ and < [brackets]'))
+
+    def test_code_inline_escaped(self):
+        self.assertEqual('<p><code>&lt;b&gt; &amp; *not* ` </code></p>',
+                         self.md_parser.parse('```<b> & *not* ` ```'))
+
+    def test_long_line(self):
+        line = 'Some **bold** and `code` with a [link](page.html) & more. ' * 5000
+        paragraph = ('Some <strong>bold</strong> and <code>code</code> with a <a href="page.html">link</a> &amp; more. '
+                     * 5000).rstrip()
+        self.assertEqual(f'<p>{paragraph}</p>', self.md_parser.parse(line))
+
     def test_image(self):
         # Won't do inline images, only as whole line
         self.assertEqual('<img src="https://duckduckgo.com/assets/logo_homepage.alt.v108.svg" alt="The whole line" title="The whole line">',
@@ -361,6 +380,143 @@ class TestMarkdownParserBlocks(unittest.TestCase):
         self.assertEqual(html_code, self.md_parser.parse(md_code))
 
 
+class TestMarkdownParserLineTypes(unittest.TestCase):
+    def setUp(self):
+        self.md_parser = MarkdownParser()
+
+    def test_line_types(self):
+        self.assertEqual('header', self.md_parser.get_line_type('## Header'))
+        self.assertEqual('image', self.md_parser.get_line_type('![alt](image.png)'))
+        self.assertEqual('ul', self.md_parser.get_line_type('* Item'))
+        self.assertEqual('ul', self.md_parser.get_line_type('    - Indented item'))
+        self.assertEqual('ol', self.md_parser.get_line_type('12. Item'))
+        self.assertEqual('code_block', self.md_parser.get_line_type('```python'))
+        self.assertEqual('code_block_indent', self.md_parser.get_line_type('    code'))
+        self.assertEqual('table_row', self.md_parser.get_line_type('a | bc'))
+        self.assertEqual('table_row', self.md_parser.get_line_type('> a | bc'))
+        self.assertEqual('hr', self.md_parser.get_line_type('***'))
+        self.assertEqual('blockquote', self.md_parser.get_line_type('> Quote'))
+        self.assertIsNone(self.md_parser.get_line_type('Just some prose.'))
+        self.assertIsNone(self.md_parser.get_line_type('| Not a table | row'))
+
+    def test_line_types_unicode(self):
+        # Regex digits and whitespace include more than ASCII
+        self.assertEqual('ol', self.md_parser.get_line_type('\u0663. Item'))
+        self.assertEqual('code_block_indent', self.md_parser.get_line_type('\u2003\u2003\u2003\u2003code'))
+
+
+class TestMarkdownParserAdversarial(unittest.TestCase):
+    # Each of these took exponential time or never finished before
+    def setUp(self):
+        self.md_parser = MarkdownParser()
+
+    def test_table_row_trailing_pipe(self):
+        line = 'a' + ' | a' * 5000 + ' |'
+        self.assertIsNone(self.md_parser.get_line_type(line))
+        self.assertEqual(f'<p>{line}</p>', self.md_parser.parse(line))
+
+    def test_simple_link_no_close(self):
+        line = '<' * 5000 + 'a.' * 5000
+        self.assertEqual(f'<p>{"&lt;" * 5000}{"a." * 5000}</p>', self.md_parser.parse(line))
+
+    def test_list_skipped_indents(self):
+        md_code = dedent('''\
+          - One
+                - Four
+          - One again''')
+        html_code = '<ul><li>One<ul><li><ul><li><ul><li>Four</li></ul></li></ul></li></ul></li><li>One again</li></ul>'
+        self.assertEqual(html_code, self.md_parser.parse(md_code))
+
+    def test_time_limit(self):
+        md_parser = MarkdownParser(time_limit=0)
+        with self.assertRaises(ParseTimeout):
+            md_parser.parse('A paragraph\n\nAnother paragraph')
+
+    def test_no_time_limit(self):
+        self.assertEqual('<p>A paragraph</p>', MarkdownParser(time_limit=None).parse('A paragraph'))
+
+
+class TestMarkdownParserStream(unittest.TestCase):
+    def setUp(self):
+        self.md_parser = MarkdownParser()
+
+    def test_iter_parse_yields_blocks(self):
+        blocks = self.md_parser.iter_parse(['# Header', '', 'Some', 'text', '', '* List'])
+        self.assertEqual('<h1>Header</h1>', next(blocks))
+        self.assertEqual(['<p>Some<br>text</p>', '<ul><li>List</li></ul>'], list(blocks))
+
+    def test_parse_stream_matches_parse(self):
+        for markdown in ['', '\n', 'One line', 'Ends with newline\n', '```\nunclosed code\n',
+                         'Para\n\n    code\n    more\n\n> quote\n']:
+            self.assertEqual(self.md_parser.parse(markdown),
+                             '\n'.join(self.md_parser.parse_stream(StringIO(markdown))), repr(markdown))
+
+
+class TestMarkdownParserTokens(unittest.TestCase):
+    def setUp(self):
+        self.md_parser = MarkdownParser()
+        self.renderer = HtmlRenderer()
+
+    def test_tokens_of_paragraph(self):
+        p, strong = get_tag_id('p'), get_tag_id('strong')
+        self.assertEqual([[(OPEN, p, ()), (TEXT, 'A '), (OPEN, strong, ()), (TEXT, 'bold'), (CLOSE, strong),
+                           (TEXT, ' &amp; plain line'), (CLOSE, p)]],
+                         self.md_parser.parse_tokens('A **bold** & plain line'))
+
+    def test_tokens_of_void_element(self):
+        [tokens] = self.md_parser.parse_tokens('***')
+        self.assertEqual([(VOID, get_tag_id('hr'), ())], tokens)
+
+    def test_tokens_of_table_alignment(self):
+        [tokens] = self.md_parser.parse_tokens('A | Bc\n:-: | ---\nD | Ef')
+        self.assertEqual((OPEN, get_tag_id('table'), (('class', 'center'),)), tokens[0])
+
+    def test_tag_ids_are_interned(self):
+        self.assertEqual(get_tag_id('p'), get_tag_id('p'))
+        self.assertEqual('p', tag_names[get_tag_id('p')])
+
+    def test_render_matches_parse(self):
+        md_code = dedent('''\
+          # Header
+
+          - [x] Done
+          - Not *done*
+
+          > Quote
+
+          A | Bc
+          --: | ---
+          <https://example.com> | [link](/a/b)
+
+          ```py
+          if a < b:
+          ```''')
+        self.assertEqual(self.md_parser.parse(md_code, 2),
+                         self.renderer.render(self.md_parser.parse_tokens(md_code), 2))
+
+    def test_tokens_can_be_rendered_again(self):
+        blocks = self.md_parser.parse_tokens('Some `code`\n\n![Alt](/img.png)')
+        self.assertEqual(self.renderer.render(blocks), HtmlRenderer().render(blocks))
+
+    def test_tokens_do_not_depend_on_file_depth(self):
+        blocks = self.md_parser.parse_tokens('[Here](here.html) and [there](https://example.com)')
+        self.assertEqual('<p><a href="here.html">Here</a> and <a href="https://example.com">there</a></p>',
+                         self.renderer.render(blocks))
+        self.assertEqual('<p><a href="../../here.html">Here</a> and <a href="https://example.com">there</a></p>',
+                         self.renderer.render(blocks, 2))
+
+    def test_parts_join_at_any_depth(self):
+        md_code = '[Here](here.html)\n\nA [link](/a/b) and <https://example.com>\n\n# End'
+        parts = self.md_parser.parse_parts(md_code.split('\n'))
+        self.assertEqual(3, len(parts))
+        for file_depth in range(3):
+            self.assertEqual(self.md_parser.parse(md_code, file_depth), (file_depth * '../').join(parts))
+
+    def test_render_boolean_attribute(self):
+        tokens = [(VOID, get_tag_id('input'), (('type', 'checkbox'), ('checked', True)))]
+        self.assertEqual('<input type="checkbox" checked>', self.renderer.render_block(tokens))
+
+
 class TestMarkdownParserCombined(unittest.TestCase):
     def setUp(self):
         self.md_parser = MarkdownParser()
@@ -419,5 +575,107 @@ class TestMarkdownParserCombined(unittest.TestCase):
         self.assertEqual(html_code, self.md_parser.parse(md_code))
 
 
+class TestMarkdownParserParallel(unittest.TestCase):
+    def setUp(self):
+        self.md_parser = MarkdownParser()
+
+    def test_matches_serial(self):
+        markdown = '\n'.join(TestMarkdownParserThreads.make_document(i) for i in range(40))
+        md_parser = MarkdownParser(parallel_threshold=0, jobs=2, chunk_size=500)
+        self.assertGreater(len(md_parser.split_chunks(markdown)), 10)
+        for file_depth in (0, 2):
+            self.assertEqual(self.md_parser.parse(markdown, file_depth), md_parser.parse(markdown, file_depth))
+
+    def test_code_not_split(self):
+        markdown = dedent('''\
+            Before
+
+            ```
+            code
+
+            more code
+            ```
+
+                indented
+
+                more indented
+
+            After''')
+        chunks = [chunk for chunk, _ in MarkdownParser(chunk_size=1).split_chunks(markdown)]
+        self.assertEqual(['Before', '```\ncode\n\nmore code\n```', '    indented', '    more indented', 'After'],
+                         chunks)
+
+    def test_state_carried_over(self):
+        # Inline code left open, and being after a blockquote, carry over blank lines
+        markdown = '> A quote\n\nSome `open code\n\nNot *code*\n\n> Another quote\n\nAfter'
+        md_parser = MarkdownParser(parallel_threshold=0, jobs=2, chunk_size=1)
+        self.assertEqual([False, True, True, True, True],
+                         [state[0] for _, state in md_parser.split_chunks(markdown)])
+        self.assertEqual(self.md_parser.parse(markdown), md_parser.parse(markdown))
+
+    def test_under_threshold(self):
+        md_parser = MarkdownParser(parallel_threshold=100, chunk_size=1)
+        with mock.patch('markdown_parser.ProcessPoolExecutor') as executor:
+            self.assertEqual('<p>Short</p>\n<p>Text</p>', md_parser.parse('Short\n\nText'))
+        executor.assert_not_called()
+
+
+class TestMarkdownParserThreads(unittest.TestCase):
+    # Threads take turns often under the GIL, and run at the same time on a
+    # free-threaded build (e.g. 3.13t)
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.md_parser = MarkdownParser()
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    @staticmethod
+    def make_document(i: int) -> str:
+        return '\n'.join([f'{"#" * (i % 6 + 1)} Document {i}', '',
+                          f'Some **bold {i}** and _em_ with a [link](page_{i}.html) and `code`.', '',
+                          *(f'{"  " * (j % 3)}- item {i}.{j}' for j in range(i % 7 + 1)), '',
+                          'Cell | Cell', ':-: | ---', f'{i} | {i * 2}', '',
+                          '```', f'code {i} <b>', '```', '',
+                          f'> quote {i}'] * (i % 4 + 1))
+
+    def test_shared_parser_in_threads(self):
+        documents = [self.make_document(i) for i in range(200)]
+        expected = [MarkdownParser().parse(document, i % 3) for i, document in enumerate(documents)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(5):
+                self.assertEqual(expected, list(executor.map(self.md_parser.parse, documents,
+                                                             [i % 3 for i in range(len(documents))])))
+
+    def test_interleaved_parses(self):
+        first, second = self.make_document(1), self.make_document(2)
+        first_blocks = self.md_parser.iter_parse(first.split('\n'))
+        second_blocks = self.md_parser.iter_parse(second.split('\n'))
+        first_html, second_html = [], []
+        for first_block, second_block in zip(first_blocks, second_blocks):
+            first_html.append(first_block)
+            second_html.append(second_block)
+        first_html += first_blocks
+        second_html += second_blocks
+        self.assertEqual(MarkdownParser().parse(first), '\n'.join(first_html))
+        self.assertEqual(MarkdownParser().parse(second), '\n'.join(second_html))
+
+    def test_tag_ids_in_threads(self):
+        tags = [f'thread-tag-{i}' for i in range(500)]
+        barrier = threading.Barrier(8)
+
+        def add_tags(offset: int) -> list:
+            barrier.wait()
+            return [get_tag_id(tags[(i + offset) % len(tags)]) for i in range(len(tags))]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(add_tags, range(0, 400, 50)))
+        for offset, tag_ids in zip(range(0, 400, 50), results):
+            self.assertEqual([tags[(i + offset) % len(tags)] for i in range(len(tags))],
+                             [tag_names[tag_id] for tag_id in tag_ids])
+        self.assertEqual(len(tag_names), len(set(tag_names)))
+
+
 if __name__ == '__main__':
     unittest.main()
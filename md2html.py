@@ -1,164 +1,1051 @@
+import argparse
+import cProfile
 import os
+import posixpath
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from io import StringIO
 
-from markdown_parser.markdown_parser import MarkdownParser
+from build_daemon.build_daemon import DAEMON_SOCKET, BuildDaemon, DaemonError
+from build_manifest.build_manifest import BuildManifest, HashedLines, hash_text
+from build_profile.build_profile import BuildProfile, PageTimer
+from change_list.change_list import ChangeList
+from dependency_graph.dependency_graph import DependencyGraph, GRAPH_FILE
+from markdown_parser.markdown_parser import MarkdownParser, ParseTimeout, PARSER_VERSION
+from output_writer.output_writer import OutputFile, write_output
+from page_cache.page_cache import DEFAULT_PAGE_CACHE_SIZE
+from parse_cache.parse_cache import ParseCache, DEFAULT_CACHE_SIZE
+from preview_server.preview_server import PreviewServer, PREVIEW_PORT
+from site_tree.site_tree import SiteFolder, get_file_depth, scan_site
+from site_watcher.site_watcher import SiteWatcher, WATCH_INTERVAL
 from templater.templater import Templater
 from split_fm_md import split_fm_md
 
-templates = Templater()
-md_parser = MarkdownParser()
-
 CONFIG_FILE = 'config.ini'
 
+# The build of a process rendering pages for a build with jobs (see init_worker())
+worker_build = None
 
-def main(files_dir: str, output_dir: str):
-    print('\nSite build start...')
-    if not os.path.isdir(output_dir):
-        os.mkdir(output_dir)
 
-    # Load variables from config file into _site
-    with open(os.path.join(files_dir, CONFIG_FILE), 'r') as f:
-        load_config(f.read(), files_dir)
+class BuildError(Exception):
+    """Raised when a site can't be built (e.g. a file it needs is missing)."""
 
-    pages_exist = False
 
-    for folder in os.listdir(files_dir):
-        if not os.path.isdir(os.path.join(files_dir, folder)):
-            continue
-        # All our directories are prefixed by a single underscore
-        if folder[0:2] == '__' or folder[0] != '_':
-            continue
-        # Needs to be done after all else is parsed
-        elif folder == '_pages':
-            pages_exist = True
-        # Folders that contain unparsed files
-        elif folder == '_modules':
-            load_templates(os.path.join(files_dir, folder), folder[1:], parsed=False)
-        else:
-            load_templates(os.path.join(files_dir, folder), folder[1:])
+def main(files_dir: str, output_dir: str, full: bool = False, jobs: int = 1,
+         cache_dir: str = None, cache_size: int = DEFAULT_CACHE_SIZE, page_timeout: float = None,
+         profile: BuildProfile = None, quiet: bool = False, prune: bool = False,
+         parallel_parse_chars: int = None) -> list:
+    """Build the site in files_dir into output_dir.
+
+    :param profile: profile to time the stages of the build and each page in
+    :param quiet: don't print a line for every page and index
+    :param prune: remove the HTML files in output_dir that the build didn't make
+    :param parallel_parse_chars: least characters in a page to parse it in chunks
+                                across every CPU (see MarkdownParser.parse_parallel()).
+                                Only pages rendered in this process are.
+    :return: The pages that failed to render, with the reason for each
+    """
+    site_build = SiteBuild(cache_dir, cache_size, page_timeout, parallel_parse_chars)
+    return site_build.build(files_dir, output_dir, full, jobs, profile, quiet, prune)
+
+
+def build_indexes(files_dir: str, output_dir: str, full: bool = False, profile: BuildProfile = None,
+                  quiet: bool = False):
+    """Build only the index of every folder in the site, from the front
+    matter of its pages, without rendering any page.
+
+    Only the front matter at the top of each page is read. Every page with
+    front matter is listed, including any that failed to render in the
+    last build.
+
+    :param full: write every index, even if unchanged since the last build
+    """
+    SiteBuild().build_indexes(files_dir, output_dir, full, profile, quiet)
+
+
+class SiteBuild:
+    """What a site is built with (its templates, the parsers of its pages and
+    modules, and the parse cache), and what a build finds out as it goes (the
+    templates each page uses, and the outputs it changed).
+
+    All of it is kept from one build to the next, so a site can be built
+    again, or in part, without loading it again (see SiteWatcher).
+    """
+
+    def __init__(self, cache_dir: str = None, cache_size: int = DEFAULT_CACHE_SIZE, page_timeout: float = None,
+                 parallel_parse_chars: int = None, read_file=None):
+        """
+        :param cache_dir: folder to keep parsed markdown in between builds, or
+                          None to parse every page that is rendered
+        :param page_timeout: most seconds to spend parsing a page, before
+                             raising ParseTimeout
+        :param parallel_parse_chars: least characters in a page to parse it in chunks
+                                    across every CPU (see MarkdownParser.parse_parallel())
+        :param read_file: function to read the template files with (see Templater)
+        """
+        self.templates = Templater(read_file)
+        # Modules are parsed when a page first uses them, but only pages are
+        # parsed with a time limit
+        self.page_parser = MarkdownParser(page_timeout, parallel_parse_chars)
+        self.module_parser = MarkdownParser(parallel_threshold=parallel_parse_chars)
+        self.page_timeout = page_timeout
+        # Parsed markdown kept between builds, if there is somewhere to keep it
+        self.parse_cache = ParseCache(cache_dir, PARSER_VERSION, cache_size) if cache_dir else None
+        # Templates used by each template and page, found as the site is built
+        self.dependency_graph = DependencyGraph()
+        # Outputs the build made, changed, and removed
+        self.change_list = None
+        # Path of the CSS file of the site, once its config is loaded
+        self.css_path = None
+
+    def build(self, files_dir: str, output_dir: str, full: bool = False, jobs: int = 1,
+              profile: BuildProfile = None, quiet: bool = False, prune: bool = False) -> list:
+        """Build the site in files_dir into output_dir (see main()).
+
+        :return: The pages that failed to render, with the reason for each
+        """
+        print('\nSite build start...')
+        if not os.path.isdir(output_dir):
+            os.mkdir(output_dir)
+        # A full build ignores what was built before, but still records a manifest
+        # for the next incremental build
+        manifest = BuildManifest() if full else BuildManifest.load(output_dir)
+        self.change_list = ChangeList(output_dir)
+        cache_dirs = [self.parse_cache.cache_dir] if self.parse_cache is not None else []
+
+        # Every folder of the site is listed once, and the templates, pages and
+        # indexes are all found from that one scan
+        with timed(profile, 'scan'):
+            site = scan_site(files_dir, [output_dir] + cache_dirs)
+        self.load_site(files_dir, profile, site)
+        # recursively go through each file and folder and build pages
+        failed_pages = self.render_pages(os.path.join(files_dir, '_pages'), output_dir, manifest, jobs, profile,
+                                         quiet, site.folders['_pages'])
+        if prune:
+            with timed(profile, 'prune'):
+                pruned = self.change_list.prune([files_dir] + cache_dirs)
+            for path in pruned:
+                if not quiet:
+                    print(f'{path}  pruned')
+            print(f'{len(pruned)} file(s) pruned')
+        with timed(profile, 'save_manifest'):
+            manifest.save(output_dir)
+            self.dependency_graph.save(os.path.join(output_dir, GRAPH_FILE))
+            self.change_list.save()
+        if self.parse_cache is not None and (evicted := self.parse_cache.evict()):
+            print(f'{evicted} parse cache entries evicted')
+
+        print('\nSite build complete')
+        return failed_pages
+
+    def build_indexes(self, files_dir: str, output_dir: str, full: bool = False, profile: BuildProfile = None,
+                      quiet: bool = False):
+        """Build only the index of every folder in the site (see build_indexes())."""
+        print('\nIndex build start...')
+        self.change_list = ChangeList(output_dir)
+        with timed(profile, 'scan'):
+            site = scan_site(files_dir, [output_dir])
+        self.load_site(files_dir, profile, site)
+        # The templates each index uses are checked for changes through the graph
+        self.reset_dependency_graph()
+        files_to_ignore = self.get_ignored_files()
+        previous = BuildManifest.read(output_dir)
+        # Pages aren't rendered, so they stay as the last build recorded them
+        manifest = BuildManifest({**previous, 'indexes': dict()} if full else previous)
+        manifest.pages = dict(manifest.previous_pages)
+        manifest.set_templates(self.templates.get_template_sources())
+
+        print('\nRendering indexes...')
+        files_written, files_unchanged = 0, 0
+        for subfolder, site_folder in site.folders['_pages'].walk():
+            output_folder = os.path.join(output_dir, subfolder)
+            os.makedirs(output_folder, exist_ok=True)
+            with timed(profile, 'read_front_matter'):
+                pages = read_front_matters({page.rsplit('.', 1)[0]: entry.path
+                                            for page, entry in site_folder.files.items()
+                                            if page not in files_to_ignore})
+            with timed(profile, 'create_index'):
+                written, unchanged = self.create_index(subfolder, site_folder, output_folder, pages, manifest, quiet,
+                                                       profile)
+            files_written += written
+            files_unchanged += unchanged
+            if profile is not None:
+                profile.count('indexes_written' if written else 'indexes_unchanged')
+        with timed(profile, 'save_manifest'):
+            manifest.save(output_dir)
+            self.change_list.save()
+        count_files(files_written, files_unchanged, profile)
+
+        print('\nIndex build complete')
+
+    def load_site(self, files_dir: str, profile: BuildProfile = None, site: SiteFolder = None):
+        """Load the config and every template of the site in files_dir, in
+        place of any loaded before.
+
+        :param site: scan of files_dir, if it was already scanned
+        """
+        self.reset_templates()
+        # Load variables from config file into _site
+        with timed(profile, 'load_config'), open(os.path.join(files_dir, CONFIG_FILE), 'r') as f:
+            self.load_config(f.read(), files_dir)
+
+        pages_exist = False
+
+        if site is None:
+            site = scan_site(files_dir)
+        with timed(profile, 'load_templates'):
+            for folder, template_folder in site.folders.items():
+                # All our directories are prefixed by a single underscore
+                if folder[0:2] == '__' or folder[0] != '_':
+                    continue
+                # Needs to be done after all else is parsed
+                elif folder == '_pages':
+                    pages_exist = True
+                # Folders that contain unparsed files
+                elif folder == '_modules':
+                    self.load_templates(template_folder, folder[1:], parsed=False)
+                else:
+                    self.load_templates(template_folder, folder[1:])
+
+        if not pages_exist:
+            raise BuildError('No \'_pages\' folder was found.')
+
+    def load_config(self, config: str, files_dir: str):
+        config_vars = parse_config(config)
+        self.css_path = os.path.join(files_dir, *os.path.split(config_vars['css']))
+        if not os.path.isfile(self.css_path):
+            raise BuildError(f'CSS file not found at \'{self.css_path}\'.')
+        with open(self.css_path, 'r') as f:
+            self.add_config(config_vars, f.read())
+
+    def add_config(self, config_vars: dict, css: str):
+        """Add the variables of the config as the site template group, with
+        the CSS of the site in place of its path.
+        """
+        self.templates.add_templates({'site': {**config_vars, 'css': css.replace('\n', '')}})
+
+    def load_templates(self, folder: SiteFolder, template_group: str, parsed=True):
+        for entry in folder.files.values():
+            self.load_template(entry.path, template_group, parsed)
+
+    def load_template(self, path: str, template_group: str, parsed=True) -> str:
+        """Add a single template file to its group. It is only read, and parsed
+        if it is markdown in a group that isn't parsed yet, once it is used.
+
+        :return: The name of the template
+        """
+        template_name, extension = os.path.basename(path).rsplit('.', 1)
+        self.templates.add_template_file(template_group, template_name, path,
+                                         self.parse_markdown if not parsed and extension != 'html' else None)
+        return template_name
+
+    def reset_templates(self):
+        """Forget every template, so templates taken out of the site since
+        they were loaded don't linger."""
+        for template_group in self.templates.get_templates().keys() | self.templates.get_template_files().keys():
+            self.templates.reset_template_group(template_group)
+
+    def reset_dependency_graph(self):
+        """Start the dependency graph over from the templates loaded, before any
+        page is found to use them."""
+        self.dependency_graph = DependencyGraph(self.templates.get_dependency_graph())
+
+    def get_ignored_files(self) -> list:
+        """Get the names of the files in the folders of pages that aren't pages."""
+        return self.templates.get_templates()['site'].get('ignore', '').split(',')
+
+    def render_pages(self, folder: str, output: str, manifest: BuildManifest = None, jobs: int = 1,
+                     profile: BuildProfile = None, quiet: bool = False, pages: SiteFolder = None) -> list:
+        """Render every page in folder, then the index of every folder.
+
+        A page that can't be parsed in time is left out of the output and its
+        folder's index, and the rest of the build goes on without it.
+
+        :param pages: scan of folder, if it was already scanned
+        :return: The pages that failed to render, with the reason for each
+        """
+        # get ignore files
+        files_to_ignore = self.get_ignored_files()
+        self.reset_dependency_graph()
+        if manifest is not None:
+            manifest.set_templates(self.templates.get_template_sources())
+
+        if pages is None:
+            pages = scan_site(folder)
+        with timed(profile, 'walk'):
+            folders, page_jobs, unchanged_pages = self.find_pages(pages, output, files_to_ignore, manifest, profile)
+
+        print(f'\nRendering {len(page_jobs)} page(s)...')
+        profile_pages = profile is not None
+        render_args = [(entry.path, output_path, file_depth, profile_pages)
+                       for _, _, entry, _, output_path, file_depth in page_jobs]
+        with timed(profile, 'render_pages'):
+            if jobs > 1 and len(render_args) > 1:
+                with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                         initargs=self.get_worker_settings()) as executor:
+                    rendered_pages = list(executor.map(try_render_worker_page, *zip(*render_args),
+                                                       chunksize=max(1, len(render_args) // (jobs * 4))))
+            else:
+                rendered_pages = (self.try_render_page(*args) for args in render_args)
+
+            failed_pages = []
+            # Pages skipped as unchanged since the last build weren't written either
+            files_written, files_unchanged = 0, unchanged_pages
+            for (folder_pages, page_name, entry, source, output_path, _), rendered in zip(page_jobs, rendered_pages):
+                if (error := self.record_page(source, output_path, rendered, manifest)) is not None:
+                    failed_pages.append((os.path.join('_pages', source), error))
+                    print(f'''{os.path.join("_pages", source)}  failed: {error}''')
+                    continue
+                front_matter, _, _, (change, _), _, timing = rendered
+                folder_pages[page_name] = front_matter
+                if change is not None:
+                    files_written += 1
+                else:
+                    files_unchanged += 1
+                if profile is not None:
+                    profile.record_page(source, timing, entry.stat().st_size, os.path.getsize(output_path))
+                if not quiet:
+                    print(f'''{os.path.join("_pages", source)}  ->  {output_path}''')
+        if profile is not None:
+            profile.count('pages_rendered', len(page_jobs) - len(failed_pages))
+            profile.count('pages_failed', len(failed_pages))
+            profile.count('pages_unchanged', unchanged_pages)
+        if unchanged_pages:
+            print(f'{unchanged_pages} unchanged page(s) skipped')
+
+        print('\nRendering indexes...')
+        for subfolder, site_folder, output_folder, folder_pages in folders:
+            # Create index of all pages and folders in folder
+            with timed(profile, 'create_index'):
+                written, unchanged = self.create_index(subfolder, site_folder, output_folder, folder_pages, manifest,
+                                                       quiet, profile)
+            files_written += written
+            files_unchanged += unchanged
+            if profile is not None:
+                profile.count('indexes_written' if written else 'indexes_unchanged')
+        count_files(files_written, files_unchanged, profile)
+        return failed_pages
+
+    def record_page(self, source: str, output_path: str, rendered: tuple, manifest: BuildManifest = None) -> str:
+        """Record a page rendered by try_render_page() in the dependency graph,
+        the change list, and the manifest if there is one, or leave it out of
+        them if it failed.
+
+        :param source: path of the page, relative to the folder of pages
+        :return: The reason the page failed, or None if it was rendered
+        """
+        front_matter, source_hash, references, (change, output_hash), error, _ = rendered
+        if change == 'removed':
+            self.change_list.remove(output_path)
+        if error is not None:
+            self.dependency_graph.remove_page(source)
+            if manifest is not None:
+                manifest.pages.pop(source, None)
+            return error
+        self.change_list.record(output_path, change, output_hash)
+        self.dependency_graph.set_page(source, references)
+        if manifest is not None:
+            manifest.record_page(source, source_hash, front_matter, output_path,
+                                 self.get_dependencies(manifest, references), references)
+        return None
+
+    def get_worker_settings(self) -> tuple:
+        """Get what init_worker() needs to give a render process a build like this one."""
+        # Each process parses modules with its own parser, so only whether a
+        # template file is parsed is passed along
+        template_files = {group_name: {name: (path, prepare is not None) for name, (path, prepare) in files.items()}
+                          for group_name, files in self.templates.get_template_files().items()}
+        cache_settings = (self.parse_cache.cache_dir, self.parse_cache.max_size) if self.parse_cache else None
+        return self.templates.get_templates(), template_files, cache_settings, self.page_timeout
+
+    def find_pages(self, pages_folder: SiteFolder, output: str, files_to_ignore: list,
+                   manifest: BuildManifest = None, profile: BuildProfile = None) -> (list, list, int):
+        """Walk the scanned folder of pages for the pages to render, making the
+        output folders as it goes. Pages the manifest shows are unchanged are
+        skipped.
+
+        :return: The folders, as (subfolder, scanned folder, output folder, front matter of its
+                 pages by name); the pages to render, as (front matter of the pages in their folder,
+                 page name, file entry, source, output path, file depth); and the number of
+                 unchanged pages
+        """
+        # Pages in every folder are rendered before any index, so the pages can be
+        # spread across processes and each index only needs the front matter of
+        # the pages in its folder
+        folders = []
+        page_jobs = []
+        unchanged_pages = 0
+
+        # for each folder including root
+        for subfolder, site_folder in pages_folder.walk():
+            output_folder = os.path.join(output, subfolder) if subfolder != '' else os.path.join(output)
+            if not os.path.isdir(output_folder):
+                os.mkdir(output_folder)
+            file_depth = get_file_depth(subfolder)
+            folder_pages = dict()
+            folders.append((subfolder, site_folder, output_folder, folder_pages))
+
+            for page, entry in site_folder.files.items():
+                if page in files_to_ignore:
+                    continue
+                source = os.path.join(subfolder, page)
+                page_name = page.rsplit('.', 1)[0]
+                output_path = os.path.join(output_folder, f'{page_name}.html')
+
+                # Front matter of an unchanged source can be reused without splitting the page
+                if manifest is not None and (previous := manifest.get_previous_page(source)):
+                    # The source is hashed a line at a time, so it's never in memory all at once
+                    with open(entry.path, 'r') as f:
+                        source_lines = HashedLines(f)
+                        for _ in source_lines:
+                            pass
+                    source_hash = source_lines.hexdigest()
+                    if profile is not None:
+                        profile.count('bytes_read', source_lines.size)
+                    if previous['source_hash'] == source_hash:
+                        front_matter = previous['front_matter']
+                        dependencies = self.get_dependencies(manifest, previous['references'])
+                        if manifest.page_is_current(source, source_hash, dependencies, output_path):
+                            manifest.record_page(source, source_hash, front_matter, output_path, dependencies,
+                                                 previous['references'])
+                            self.dependency_graph.set_page(source, previous['references'])
+                            self.change_list.record(output_path, None)
+                            folder_pages[page_name] = front_matter
+                            unchanged_pages += 1
+                            continue
+
+                page_jobs.append((folder_pages, page_name, entry, source, output_path, file_depth))
+        return folders, page_jobs, unchanged_pages
+
+    def get_dependencies(self, manifest: BuildManifest, references: list) -> dict:
+        """Get the hashes of the given templates and every template they use,
+        directly or through other templates.
+        """
+        return manifest.get_dependencies(self.dependency_graph.get_dependencies(references))
+
+    def find_references(self, lines, references: set) -> iter:
+        """Pass lines through, adding the templates they refer to to references."""
+        for line in lines:
+            if '{{' in line:
+                references |= self.templates.find_references(line)
+            yield line
+
+    def parse_markdown(self, markdown: str) -> str:
+        """Parse markdown that isn't a page, from the parse cache if it is there."""
+        if self.parse_cache is None:
+            return self.module_parser.parse(markdown)
+        key = f'module-{hash_text(markdown)}'
+        if (html := self.parse_cache.get(key)) is None:
+            html = self.module_parser.parse(markdown)
+            self.parse_cache.put(key, html)
+        return html
+
+    def try_render_page(self, source_path: str, output_path: str, file_depth: int,
+                        profile_page: bool = False) -> (dict, str, list, tuple, str, dict):
+        """Render a page, or give the reason it couldn't be rendered without
+        stopping the build. Nothing is left at the output path of a failed page.
+
+        :param profile_page: time the stages of rendering the page
+        :return: The front matter of the page, the hash of its source, the
+                 templates it uses directly, the change made to its output and
+                 the output's hash (see render_page()), None, and the timing of
+                 the page if profiled; or None, None, None, ('removed', None) if
+                 an output was removed or (None, None) if not, the reason the
+                 page failed, and None
+        """
+        timer = PageTimer() if profile_page else None
+        try:
+            front_matter, source_hash, references, output = self.render_page(source_path, output_path, file_depth,
+                                                                             timer)
+        except ParseTimeout as error:
+            removed = os.path.isfile(output_path)
+            if removed:
+                os.remove(output_path)
+            return None, None, None, ('removed' if removed else None, None), str(error), None
+        # Time not spent in another stage is spent filling the templates
+        return front_matter, source_hash, references, output, None, timer.finish('fill') if timer is not None else None
+
+    def render_page(self, source_path: str, output_path: str, file_depth: int,
+                    timer: PageTimer = None) -> (dict, str, list, tuple):
+        """Render a single page to its output path.
+
+        The page is read, parsed, and written a block at a time, so it never has
+        to be in memory all at once. The output is only replaced once the whole
+        page is written, and only if it changed (see OutputFile).
+
+        With a parse cache, the page is read whole and its HTML comes from the
+        cache if it was parsed before, with its internal links made relative to
+        the page's folder.
+
+        :param timer: timer for the stages of rendering the page. Parsing is
+                      timed as the blocks are taken while the page is written.
+        :return: The front matter of the page, the hash of its source, the
+                 templates it uses directly, and the change made to the output
+                 ('added', 'modified', or None if it was unchanged) with its hash
+        """
+        references = set()
+        output_file = OutputFile(output_path)
+        with open(source_path, 'r') as f:
+            if self.parse_cache is not None:
+                with timed(timer, 'parse'):
+                    front_matter, parts, source_hash = self.read_cached_page(f, references)
+                # A page without any blocks is filled with an empty string
+                parsed_markdown = join_parts(parts, file_depth) if parts[0] or len(parts) > 1 else ''
+            else:
+                source = HashedLines(f)
+                # Get material from page
+                with timed(timer, 'split'):
+                    front_matter, markdown_lines = split_fm_md.read_page(self.find_references(source, references))
+                # A page has at least as many bytes as characters, so only one this
+                # big can have enough characters for parse() to parse it in parallel
+                parallel_threshold = self.page_parser.parallel_threshold
+                if parallel_threshold is not None and os.path.getsize(source_path) >= parallel_threshold:
+                    blocks = iter([self.page_parser.parse('\n'.join(markdown_lines), file_depth)])
+                else:
+                    blocks = self.page_parser.iter_parse(markdown_lines, file_depth)
+                if timer is not None:
+                    blocks = timer.time_iter('parse', blocks)
+                first_block = next(blocks, '')
+                parsed_markdown = join_blocks(first_block, blocks) if first_block else ''
+            # Fill templates with page info
+            with output_file as output:
+                for chunk in self.templates.iter_fill_structure(front_matter['structure'],
+                                                                {'page': {**front_matter,
+                                                                          '_html': parsed_markdown}}):
+                    with timed(timer, 'write'):
+                        output.write(chunk)
+        return (front_matter, source_hash if self.parse_cache is not None else source.hexdigest(),
+                get_page_references(front_matter, references), (output_file.change, output_file.hash))
+
+    def read_cached_page(self, file, references: set) -> (dict, list, str):
+        """Get the front matter and HTML parts of a page from the parse cache, or
+        parse the page and add them to it.
+
+        The page is read once to hash it, and again to parse it if it isn't in
+        the cache, a line at a time both times.
+
+        :param file: the page, open in text mode
+        :param references: set to add the templates the page refers to to
+        :return: The front matter, the parts of HTML (see MarkdownParser.parse_parts),
+                 and the hash of the source
+        """
+        source = HashedLines(file)
+        for _ in self.find_references(source, references):
+            pass
+        source_hash = source.hexdigest()
+        key = f'page-{source_hash}'
+        if (entry := self.parse_cache.get(key)) is not None:
+            front_matter, parts = entry
+            return front_matter, parts, source_hash
+        file.seek(0)
+        front_matter, markdown_lines = split_fm_md.read_page(file)
+        parts = self.page_parser.parse_parts(markdown_lines)
+        self.parse_cache.put(key, (front_matter, parts))
+        return front_matter, parts, source_hash
 
-    if not pages_exist:
-        sys.exit('No \'_pages\' folder was found.')
-    # recursively go through each file and folder and build pages
-    render_pages(os.path.join(files_dir, '_pages'), output_dir)
+    def render_page_html(self, path: str, file, file_depth: int) -> (dict, str):
+        """Render a page without writing it (e.g. to serve it).
 
-    print('\nSite build complete')
+        :param path: path of the page, to name it if it has no front matter
+        :param file: the page, open in text mode
+        :return: The front matter of the page, and its HTML
+        """
+        front_matter, markdown_lines = split_fm_md.read_page(file, quiet=True)
+        if front_matter is None:
+            raise BuildError(f'No front matter found in \'{path}\'.')
+        blocks = self.page_parser.iter_parse(markdown_lines, file_depth)
+        first_block = next(blocks, '')
+        html = ''.join(self.templates.iter_fill_structure(
+            front_matter['structure'],
+            {'page': {**front_matter, '_html': join_blocks(first_block, blocks) if first_block else ''}}))
+        return front_matter, html
 
+    def create_index(self, subfolder: str, site_folder: SiteFolder, output_folder: str, pages: dict,
+                     manifest: BuildManifest = None, quiet: bool = False, profile: BuildProfile = None) -> (int, int):
+        """Write the index of a folder, listing its pages and folders.
 
-def load_config(config: str, files_dir: str):
+        The index is split into pages of index_page_size entries from the
+        config, if it is set, so only one page of the listing is formatted at a
+        time (e.g. index.html, index-2.html, ...).
+
+        :param site_folder: the folder as it was scanned, for its subfolders
+        :param profile: profile to count the bytes of each file of the index written in
+        :return: The number of files of the index written, and the number left
+                 unchanged, either since the last build recorded them as current
+                 or since they had the same HTML
+        """
+        if subfolder and not quiet:
+            print(subfolder)
+        page_size = get_index_page_size(self.templates.get_templates()['site'])
+        entries = get_index_entries(site_folder.folders, pages)
+        page_count = get_index_page_count(entries, page_size)
+        output_path = os.path.join(output_folder, get_index_name(1))
+
+        # Skip the index if its listing and templates are the same as last build
+        if manifest is not None:
+            listing = HashedLines(format_index_entry(kind, name, pages) for kind, _, name in entries)
+            for _ in listing:
+                pass
+            index_hash = hash_text(f'{page_size}:{listing.hexdigest()}')
+            dependencies = self.get_dependencies(manifest, ['structures.index'])
+            manifest.record_index(subfolder, index_hash, output_path, dependencies)
+            if manifest.index_is_current(subfolder, index_hash, dependencies, output_path) and \
+                    all(os.path.isfile(os.path.join(output_folder, get_index_name(page)))
+                        for page in range(2, page_count + 1)):
+                for page in range(1, page_count + 1):
+                    self.change_list.record(os.path.join(output_folder, get_index_name(page)), None)
+                return 0, page_count
+
+        written = 0
+        for index_name, index_html in iter_index_html(subfolder, entries, pages, page_size):
+            output = write_output(os.path.join(output_folder, index_name), self.fill_index(index_html))
+            self.change_list.record(output.path, output.change, output.hash)
+            written += output.change is not None
+            if profile is not None:
+                profile.count('bytes_written', os.path.getsize(output.path))
+
+        # Remove the pages left over from when the index had more of them
+        page = page_count + 1
+        while os.path.isfile(stale_path := os.path.join(output_folder, get_index_name(page))):
+            os.remove(stale_path)
+            self.change_list.remove(stale_path)
+            page += 1
+        return written, page_count - written
+
+    def get_index_page(self, subfolder: str, folders: list, page_paths: dict, page: int = 1) -> (str, str):
+        """Make one page of the index of a folder without writing it (e.g. to
+        serve it), reading the front matter of each of its pages.
+
+        :param folders: names of the subfolders of the folder
+        :param page_paths: path of each page of the folder by page name
+        :return: The file name and HTML of the page of the index, or None if
+                 the index has no such page
+        """
+        pages = read_front_matters(page_paths)
+        page_size = get_index_page_size(self.templates.get_templates()['site'])
+        entries = get_index_entries(folders, pages)
+        if page > get_index_page_count(entries, page_size):
+            return None
+        return get_index_name(page), self.fill_index(get_index_html(subfolder, entries, pages, page, page_size))
+
+    def fill_index(self, index_html: str) -> str:
+        # Make index file out of structure and insert list into spot
+        return self.templates.fill_structure('index', {'index': {'_html': index_html}})
+
+
+def timed(profile: BuildProfile or PageTimer or None, stage: str):
+    """Time a stage with a profile or page timer, if there is one."""
+    return profile.stage(stage) if profile is not None else nullcontext()
+
+
+def parse_config(config: str or dict) -> dict:
+    """Get the variables of a config, given as its text or a dict of them,
+    with the path of the CSS file (relative to the site folder) as the css
+    variable.
+
+    :raises BuildError: if a variable in a dict isn't text or a number
+    """
     config_vars = dict()
     # Set default CSS location inside of _pages dir
     config_vars['css'] = os.path.join('style.css')
+    if isinstance(config, dict):
+        for key, value in config.items():
+            # Variables are filled into templates as text, like those read from config.ini
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise BuildError(f'{key} in the config must be text or a number, not {type(value).__name__}.')
+            config_vars[key] = str(value)
+        return config_vars
     for line in config.split('\n'):
         if not line or line[0] == '#':
             continue
         key, value = line.split(': ')
         config_vars[key] = value
+    return config_vars
+
+
+def count_files(files_written: int, files_unchanged: int, profile: BuildProfile = None):
+    """Report the number of output files written and left unchanged."""
+    print(f'\n{files_written} file(s) written, {files_unchanged} unchanged')
+    if profile is not None:
+        profile.count('files_written', files_written)
+        profile.count('files_unchanged', files_unchanged)
+
+
+def read_front_matters(page_paths: dict) -> dict:
+    """Read only the front matter at the top of each page, by page name."""
+    pages = dict()
+    for page_name, path in page_paths.items():
+        with open(path, 'r') as f:
+            front_matter = split_fm_md.read_front_matter(f)
+        # A page without front matter can't be rendered, so it isn't listed
+        if front_matter is not None:
+            pages[page_name] = front_matter
+    return pages
+
+
+def get_page_references(front_matter: dict, references: set) -> list:
+    """Get the templates a page uses directly: its structure, and the
+    templates its front matter and markdown refer to.
+    """
+    return sorted(references | {f'structures.{front_matter["structure"]}'})
+
+
+def init_worker(template_groups: dict, template_files: dict, cache_settings: tuple = None,
+                page_timeout: float = None):
+    """Give a render process its own build, with its own parsers and copy of
+    the templates, and the ones not loaded yet left to load when the process
+    uses them (see SiteBuild.get_worker_settings()).
+    """
+    global worker_build
+    cache_dir, cache_size = cache_settings if cache_settings is not None else (None, DEFAULT_CACHE_SIZE)
+    worker_build = SiteBuild(cache_dir, cache_size, page_timeout)
+    for group_name, files in template_files.items():
+        for template_name, (path, markdown) in files.items():
+            worker_build.templates.add_template_file(group_name, template_name, path,
+                                                     worker_build.parse_markdown if markdown else None)
+    worker_build.templates.add_templates(template_groups)
+
+
+def try_render_worker_page(*args) -> tuple:
+    """Render a page with the build of this render process (see SiteBuild.try_render_page())."""
+    return worker_build.try_render_page(*args)
+
+
+def join_parts(parts: list, file_depth: int) -> iter:
+    """Join parts of HTML with the prefix that makes internal links relative
+    to a page at file_depth, one part at a time.
+    """
+    link_prefix = file_depth * '../'
+    yield parts[0]
+    for part in parts[1:]:
+        yield link_prefix + part
+
+
+def join_blocks(first_block: str, blocks, chunk_size: int = 2 ** 16) -> iter:
+    """Join blocks of HTML with newlines as they come, in chunks of about
+    chunk_size characters, or one block if it is larger than that.
+    """
+    chunk, size = [first_block], len(first_block)
+    for block in blocks:
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+        chunk.append('\n' + block)
+        size += len(block) + 1
+    yield ''.join(chunk)
+
+
+def get_index_entries(folders, pages: dict) -> list:
+    """Sort the folders and pages an index lists, as (kind, sort key, name),
+    where kind is 0 for a folder and 1 for a page.
+    """
+    # Sorting on the link of each entry, up to its closing quote, puts them in
+    # the same order as sorting their HTML would, without making it
+    return sorted([(0, f'{name}/index.html"', name) for name in folders] +
+                  [(1, f'{name}.html"', name) for name in pages])
+
+
+def get_index_page_count(entries: list, page_size: int = None) -> int:
+    return max(1, -(-len(entries) // page_size)) if page_size else 1
+
 
-    css_file = os.path.join(files_dir, *os.path.split(config_vars['css']))
-    if not os.path.isfile(css_file):
-        sys.exit(f'CSS file not found at \'{css_file}\'.')
-    with open(css_file, 'r') as f:
-        config_vars['css'] = f.read().replace('\n', '')
-
-    templates.add_templates({'site': config_vars})
-
-
-def load_templates(dir_name: str, template_group: str, parsed=True):
-    if not os.path.isdir(dir_name):
-        sys.exit('Input path does not exist or is not a directory.')
-    for file in os.listdir(dir_name):
-        with open(os.path.join(dir_name, file), 'r') as f:
-            template_name, extension = file.rsplit('.', 1)
-            template = f.read().strip()
-            if not parsed and extension != 'html':
-                template = md_parser.parse(template)
-            templates.add_templates({template_group: {template_name: template}})
-
-
-def render_pages(folder: str, output: str):
-    # get ignore files
-    files_to_ignore = [filename for filename in templates.get_templates().get('site').get('ignore').split(',')]
-
-    # for each folder including root
-    for subfolder, _, pages in os.walk(folder):
-        subfolder = subfolder[len(folder) + 1:]
-        output_folder = os.path.join(output, subfolder) if subfolder != '' else os.path.join(output)
-        if not os.path.isdir(output_folder):
-            os.mkdir(output_folder)
-        # Get depth by counting slashes + 1 if not an empty string (the root)
-        # This will be appended to all internal links in the parsing process
-        file_depth = 1 + len(''.join(slash for slash in subfolder if slash == os.sep)) if subfolder else 0
-        print(f'''\nRendering pages in {"root" if subfolder == '' else f"'{subfolder}'"} folder...''')
-
-        for page in pages:
+def iter_index_html(subfolder: str, entries: list, pages: dict, page_size: int = None) -> iter:
+    """Make the listing of each page of an index, one page at a time.
+
+    :param entries: the sorted entries of the index (see get_index_entries())
+    :param pages: front matter of the pages in the index by name
+    :return: The file name and HTML of each page of the index
+    """
+    for page in range(1, get_index_page_count(entries, page_size) + 1):
+        yield get_index_name(page), get_index_html(subfolder, entries, pages, page, page_size)
+
+
+def get_index_html(subfolder: str, entries: list, pages: dict, page: int = 1, page_size: int = None) -> str:
+    """Make the listing of one page of an index (see iter_index_html())."""
+    page_count = get_index_page_count(entries, page_size)
+    page_entries = entries[(page - 1) * page_size:page * page_size] if page_size else entries
+    index_html = '<a href="../index.html" class="parent">⬆</a>' if subfolder else ''
+    # Make ul of all items and add to templates in index._html
+    index_html += '<ul>' + ''.join(f'<li class="{"folder" if kind == 0 else "page"}">'
+                                   f'{format_index_entry(kind, name, pages)}</li>'
+                                   for kind, _, name in page_entries) + '</ul>'
+    if page_count > 1:
+        index_html += get_index_navigation(page, page_count)
+    return index_html
+
+
+def get_index_page_size(config_vars: dict) -> int or None:
+    """Get the most entries a page of an index lists from the config, or
+    None if indexes aren't split into pages.
+    """
+    page_size = config_vars.get('index_page_size')
+    if not page_size:
+        return None
+    if not page_size.isdigit() or int(page_size) < 1:
+        raise BuildError(f'index_page_size in {CONFIG_FILE} must be a positive number of entries, '
+                         f'not \'{page_size}\'.')
+    return int(page_size)
+
+
+def get_index_name(page: int) -> str:
+    return 'index.html' if page == 1 else f'index-{page}.html'
+
+
+def format_index_entry(kind: int, name: str, pages: dict) -> str:
+    """Make the link of a folder (kind 0) or page (kind 1) in an index."""
+    if kind == 0:
+        folder_name = name.replace('_', ' ')
+        if folder_name.islower():
+            folder_name = folder_name.title()
+        return f'<a href="{name}/index.html" class="index__folder">{folder_name}</a>'
+    info = pages[name]
+    return (f'<a href="{name}.html" class="index__title">{info["title"]}</a><br>'
+            f'<span class="index__description">{info["description"]}')
+
+
+def get_index_navigation(page: int, page_count: int) -> str:
+    """Make the links to the previous and next pages of an index."""
+    navigation = '<nav class="index__pages">'
+    if page > 1:
+        navigation += f'<a href="{get_index_name(page - 1)}" class="index__previous">Previous</a>'
+    navigation += f'<span class="index__page">Page {page} of {page_count}</span>'
+    if page < page_count:
+        navigation += f'<a href="{get_index_name(page + 1)}" class="index__next">Next</a>'
+    return navigation + '</nav>'
+
+
+def build_site(files, config: str or dict = None, writer=None, page_timeout: float = None) -> dict or None:
+    """Build a site from files in memory, giving its HTML back instead of
+    writing it to disk.
+
+    The site is loaded and its pages rendered by the same SiteBuild as a
+    build to disk, with its own parsers and templates, so builds don't
+    change each other's templates, and nothing is read from or written to
+    disk. There is no manifest or parse cache, so every page is rendered.
+
+    :param files: the text of every file of the site by its path relative to
+                  the site folder, with '/' between folders (e.g.
+                  '_pages/blog/post.md'). Any mapping will do, so files can
+                  be read as they are used (e.g. from a database).
+    :param config: the config, as its text or a dict of its variables (text
+                   or numbers), in place of the config.ini in files
+    :param writer: function to give the output path and HTML of each page and
+                   index to as it is made, instead of returning them
+    :param page_timeout: most seconds to spend parsing a page, before raising
+                         ParseTimeout
+    :return: The HTML of every page and index by output path (e.g.
+             'blog/post.html'), or None if there is a writer
+    :raises BuildError: if the site can't be built
+    """
+    site_build = SiteBuild(page_timeout=page_timeout, read_file=files.__getitem__)
+
+    if config is None:
+        if CONFIG_FILE not in files:
+            raise BuildError(f'No \'{CONFIG_FILE}\' was found.')
+        config = files[CONFIG_FILE]
+    config_vars = parse_config(config)
+    css_path = posixpath.normpath(config_vars['css'].replace(os.sep, '/'))
+    if css_path not in files:
+        raise BuildError(f'CSS file not found at \'{css_path}\'.')
+    site_build.add_config(config_vars, files[css_path])
+    files_to_ignore = site_build.get_ignored_files()
+    page_size = get_index_page_size(config_vars)
+
+    # Sources of the pages in each folder by page name, and the subfolders of each folder
+    folder_sources = {'': dict()}
+    subfolders = {'': set()}
+    for path in sorted(files):
+        folder, *rest = path.split('/', 1)
+        # All our directories are prefixed by a single underscore
+        if not rest or folder[0:2] == '__' or folder[0:1] != '_':
+            continue
+        if folder == '_pages':
+            subfolder, page = posixpath.split(rest[0])
             if page in files_to_ignore:
                 continue
-            with open(os.path.join(folder, subfolder, page), 'r') as f:
-                raw_page = f.read()
-            # Get material from page
-            front_matter, markdown = split_fm_md.split_page(raw_page)
-            parsed_markdown = md_parser.parse(markdown, file_depth)
-            page_name = page.rsplit('.', 1)[0]
-            output_path = os.path.join(output_folder, f'{page_name}.html')
-            templates.add_templates({'page': {**front_matter,
-                                              '_html': parsed_markdown}},
-                                    {'index': {page_name: front_matter}})
-            # Fill templates with page info
-            finished_page = templates.fill_structure(front_matter['structure'])
-            with open(output_path, 'w') as f:
-                f.write(finished_page)
-            templates.reset_template_group('page')
-            print(f'''{os.path.join(subfolder, "_pages", page)}  ->  {output_path}''')
-
-        # Create index of all pages and folders in folder
-        create_index(subfolder, os.path.join(folder, subfolder), output_folder)
-
-
-def create_index(subfolder: str, current_dir: str, output_folder: str):
-    index_html = ''
-    if subfolder:
-        print(subfolder)
-        index_html += '<a href="../index.html" class="parent">⬆</a>'
-
-    # Make list of all enclosed folders
-    enclosed_folders = []
-    for enclosed_folder in os.listdir(current_dir):
-        if not os.path.isdir(os.path.join(current_dir, enclosed_folder)):
-            continue
-        enclosed_folder_name = enclosed_folder.replace('_', ' ')
-        if enclosed_folder_name.islower():
-            enclosed_folder_name = enclosed_folder_name.title()
-        enclosed_folders.append(f'<a href="{enclosed_folder}/index.html" class="index__folder">{enclosed_folder_name}</a>')
+            folder_sources.setdefault(subfolder, dict())[page.rsplit('.', 1)[0]] = path
+            # Every folder up to the root is listed in the index of its parent
+            while subfolder and subfolder not in subfolders:
+                subfolders[subfolder] = set()
+                parent, name = posixpath.split(subfolder)
+                subfolders.setdefault(parent, set()).add(name)
+                subfolder = parent
+        elif '/' not in rest[0]:
+            site_build.load_template(path, folder[1:], parsed=folder != '_modules')
+    if not any(path.startswith('_pages/') for path in files):
+        raise BuildError('No \'_pages\' folder was found.')
 
-    # Make list of all enclosed files
-    enclosed_files = []
-    for page_name, info in templates.get_templates()['index'].items():
-        enclosed_files.append(f'''<a href="{page_name}.html" class="index__title">{info['title']}</a><br><span class="index__description">{info['description']}''')
+    outputs = dict()
+    for subfolder in sorted(subfolders):
+        file_depth = subfolder.count('/') + 1 if subfolder else 0
+        pages = dict()
+        for page_name, path in folder_sources.get(subfolder, dict()).items():
+            pages[page_name], html = site_build.render_page_html(path, StringIO(files[path]), file_depth)
+            outputs[posixpath.join(subfolder, f'{page_name}.html')] = html
+            if writer is not None:
+                writer(*outputs.popitem())
 
-    # Sort them and concat
-    enclosed_folders.sort()
-    enclosed_files.sort()
+        entries = get_index_entries(subfolders[subfolder], pages)
+        for index_name, index_html in iter_index_html(subfolder, entries, pages, page_size):
+            outputs[posixpath.join(subfolder, index_name)] = site_build.fill_index(index_html)
+            if writer is not None:
+                writer(*outputs.popitem())
+    return outputs if writer is None else None
 
-    # Make ul of all items and add to templates in index._html
-    index_html += '<ul>'
-    if enclosed_folders:
-        index_html += '<li class="folder">' + '</li><li class="folder">'.join(item for item in enclosed_folders) + '</li>'
-    if enclosed_files:
-        index_html += '<li class="page">' + '</li><li class="page">'.join(item for item in enclosed_files) + '</li>'
-    index_html += '</ul>'
-    templates.add_templates({'index': {'_html': index_html}})
 
-    # Make index file out of structure and insert list into spot
-    finished_index = templates.fill_structure('index')
-    with open(os.path.join(output_folder, 'index.html'), 'w') as f:
-        f.write(finished_index)
-    templates.reset_template_group('index')
+def find_affected_pages(files_dir: str, output_dir: str, template_files: list) -> list:
+    """Find the pages that use any of the given template files, directly or
+    through other templates, without building anything.
+
+    The dependency graph saved by the last build into output_dir is used if
+    there is one. Otherwise the site is loaded and its pages are read.
+
+    :param template_files: paths of template files relative to files_dir
+                           (e.g. '_modules/footer.md'). Any other file, like
+                           the config or CSS, affects every page.
+    :return: The sources of the affected pages, relative to the _pages folder
+    """
+    graph_path = os.path.join(output_dir, GRAPH_FILE)
+    graph = DependencyGraph.load(graph_path) if os.path.isfile(graph_path) else read_dependency_graph(files_dir)
+    references = []
+    for template_file in template_files:
+        folder, file = os.path.split(os.path.normpath(template_file))
+        if folder[0:1] != '_' or folder[0:2] == '__' or folder == '_pages':
+            return sorted(graph.pages)
+        references.append(f'{folder[1:]}.{file.rsplit(".", 1)[0]}')
+    return graph.get_affected_pages(references)
+
+
+def read_dependency_graph(files_dir: str) -> DependencyGraph:
+    """Load the site in files_dir and read every page for the templates it uses."""
+    site_build = SiteBuild()
+    site = scan_site(files_dir)
+    site_build.load_site(files_dir, site=site)
+    files_to_ignore = site_build.get_ignored_files()
+    graph = DependencyGraph(site_build.templates.get_dependency_graph())
+    for subfolder, pages_folder in site.folders['_pages'].walk():
+        for page, entry in pages_folder.files.items():
+            if page in files_to_ignore:
+                continue
+            with open(entry.path, 'r') as f:
+                source = f.read()
+            front_matter, _ = split_fm_md.split_page(source)
+            graph.set_page(os.path.join(subfolder, page),
+                           get_page_references(front_matter, site_build.templates.find_references(source)))
+    return graph
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        sys.exit('Please provide an input folder.')
-    _, in_fp, out_fp = sys.argv
+    arg_parser = argparse.ArgumentParser(description='Build a site of HTML pages out of markdown and templates.')
+    arg_parser.add_argument('in_fp', help='folder with the config, templates, and _pages')
+    arg_parser.add_argument('out_fp', nargs='?', help='folder to build the site into (not needed with --preview)')
+    arg_parser.add_argument('--full', action='store_true',
+                            help='rebuild every page and index, even if unchanged since the last build')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='number of processes to render pages with (default: 1)')
+    arg_parser.add_argument('--cache-dir',
+                            help='folder to keep parsed markdown in between builds, so unchanged pages '
+                                 'are not parsed again')
+    arg_parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // 2 ** 20,
+                            help=f'most megabytes the parse cache can use (default: {DEFAULT_CACHE_SIZE // 2 ** 20})')
+    arg_parser.add_argument('--page-timeout', type=float,
+                            help='most seconds to spend parsing a page before leaving it out of the build '
+                                 '(default: no limit)')
+    arg_parser.add_argument('--parallel-parse', metavar='MCHARS', type=float,
+                            help='parse each page of at least MCHARS million characters in chunks across every CPU, '
+                                 'instead of on one (pages rendered in other processes with --jobs are parsed whole)')
+    arg_parser.add_argument('-w', '--watch', action='store_true',
+                            help='keep watching the site after building it, and rebuild what changes affect')
+    arg_parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL,
+                            help=f'seconds between checks for changes when watching (default: {WATCH_INTERVAL})')
+    arg_parser.add_argument('--daemon', action='store_true',
+                            help='build the site, then keep it loaded and build it again whenever asked over a Unix '
+                                 'socket (see build_daemon)')
+    arg_parser.add_argument('--socket', help=f'socket for --daemon to listen at (default: out_fp/{DAEMON_SOCKET})')
+    arg_parser.add_argument('--preview', metavar='PORT', type=int, nargs='?', const=PREVIEW_PORT,
+                            help='serve the site on localhost, rendering pages and indexes as they are requested '
+                                 f'instead of building it (default port: {PREVIEW_PORT})')
+    arg_parser.add_argument('--preview-cache-size', type=int, default=DEFAULT_PAGE_CACHE_SIZE // 2 ** 20,
+                            help='most megabytes of rendered pages to keep in memory when previewing '
+                                 f'(default: {DEFAULT_PAGE_CACHE_SIZE // 2 ** 20})')
+    arg_parser.add_argument('--affected', metavar='TEMPLATE', action='append',
+                            help='list the pages that use a template file (e.g. _modules/footer.md) instead of '
+                                 'building, using the dependencies found by the last build to out_fp if there '
+                                 'was one (can be given more than once)')
+    arg_parser.add_argument('--prune', action='store_true',
+                            help="remove the HTML files in out_fp that the build didn't make (e.g. of removed pages)")
+    arg_parser.add_argument('--metadata-only', action='store_true',
+                            help='only build the index of every folder, reading just the front matter of each page')
+    arg_parser.add_argument('-q', '--quiet', action='store_true',
+                            help="don't print a line for every page and index")
+    arg_parser.add_argument('--profile', metavar='REPORT',
+                            help='write a JSON report of the time each stage of the build and each page took')
+    arg_parser.add_argument('--profile-top', type=int, default=10,
+                            help='number of the slowest pages to list in the report (default: 10)')
+    arg_parser.add_argument('--trace-memory', action='store_true',
+                            help='add the peak memory of the build to the report, which makes the build slower')
+    arg_parser.add_argument('--cprofile', metavar='STATS',
+                            help='write cProfile stats of the build, for pstats (pages rendered in other '
+                                 'processes with --jobs are not included)')
+    args = arg_parser.parse_args()
+    if args.out_fp is None and args.preview is None:
+        arg_parser.error('out_fp is needed unless previewing with --preview')
+    if args.trace_memory and not args.profile:
+        arg_parser.error('--trace-memory needs --profile')
+    if args.watch and (args.profile or args.cprofile):
+        arg_parser.error("--profile and --cprofile can't be used with --watch")
+    if args.watch and args.metadata_only:
+        arg_parser.error("--metadata-only can't be used with --watch")
+    if args.prune and (args.watch or args.metadata_only):
+        arg_parser.error("--prune can't be used with --watch or --metadata-only")
+    if args.daemon and (args.watch or args.metadata_only or args.prune or args.profile or args.cprofile or
+                        args.preview is not None):
+        arg_parser.error("--daemon can't be used with --watch, --metadata-only, --prune, --profile, --cprofile "
+                         "or --preview")
+    if args.socket and not args.daemon:
+        arg_parser.error('--socket needs --daemon')
+    if args.preview is not None and (args.watch or args.metadata_only or args.prune or args.profile or args.cprofile):
+        arg_parser.error("--preview can't be used with --watch, --metadata-only, --prune, --profile or --cprofile")
+
+    parallel_parse_chars = int(args.parallel_parse * 10 ** 6) if args.parallel_parse is not None else None
+    try:
+        if args.preview is not None:
+            PreviewServer(SiteBuild(page_timeout=args.page_timeout), args.in_fp,
+                          cache_size=args.preview_cache_size * 2 ** 20, quiet=args.quiet).serve(args.preview)
+            sys.exit()
+        site_build = SiteBuild(args.cache_dir, args.cache_size * 2 ** 20, args.page_timeout, parallel_parse_chars)
+        if args.daemon:
+            watcher = SiteWatcher(site_build, args.in_fp, args.out_fp, full=args.full, jobs=args.jobs,
+                                  quiet=args.quiet)
+            BuildDaemon(watcher, socket_path=args.socket).serve()
+            sys.exit()
+        if args.affected:
+            for affected_page in find_affected_pages(args.in_fp, args.out_fp, args.affected):
+                print(os.path.join('_pages', affected_page))
+            sys.exit()
+        if args.watch:
+            SiteWatcher(site_build, args.in_fp, args.out_fp, full=args.full, jobs=args.jobs,
+                        quiet=args.quiet).watch(args.watch_interval)
+            sys.exit()
 
-    main(in_fp, out_fp)
+        build_profile = BuildProfile(args.trace_memory) if args.profile else None
+        profiler = cProfile.Profile() if args.cprofile else None
+        if profiler is not None:
+            profiler.enable()
+        if args.metadata_only:
+            site_build.build_indexes(args.in_fp, args.out_fp, full=args.full, profile=build_profile,
+                                     quiet=args.quiet)
+            failed = []
+        else:
+            failed = site_build.build(args.in_fp, args.out_fp, full=args.full, jobs=args.jobs, profile=build_profile,
+                                      quiet=args.quiet, prune=args.prune)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if build_profile is not None:
+            build_profile.save(args.profile, args.profile_top)
+        if failed:
+            sys.exit(f'{len(failed)} page(s) failed to render.')
+    except (BuildError, DaemonError) as error:
+        sys.exit(str(error))
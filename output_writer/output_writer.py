@@ -0,0 +1,85 @@
+import hashlib
+import os
+import stat
+import tempfile
+
+TEMP_PREFIX = '.md2html-'
+CHUNK_SIZE = 2 ** 16
+
+# Temporary files are only readable by their owner, so outputs are given the
+# mode a new file would have instead
+_umask = os.umask(0)
+os.umask(_umask)
+NEW_FILE_MODE = 0o666 & ~_umask
+
+
+def hash_file(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class OutputFile:
+    """A text file written atomically, and only if it changed.
+
+    The text is written to a temporary file next to the output. Once it is
+    closed, it replaces the output by renaming, unless the output already
+    has the same text. An unchanged output is left as it was, modification
+    time and all, so deploys that sync by modification time skip it. If
+    writing fails, the output is left as it was, rather than half written.
+
+    Use as a context manager, e.g.
+        with OutputFile(path) as f:
+            f.write(html)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.temp_path = None
+        # Once it is closed, the hash of the output, and the change made to
+        # it: 'added', 'modified', or None if it was unchanged
+        self.hash = None
+        self.change = None
+
+    def __enter__(self):
+        fd, self.temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', prefix=TEMP_PREFIX,
+                                              suffix='.tmp')
+        self.file = os.fdopen(fd, 'w')
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.file.close()
+            if exc_type is None:
+                self.hash = hash_file(self.temp_path)
+                try:
+                    output_stat = os.stat(self.path)
+                except FileNotFoundError:
+                    output_stat = None
+                # Compared by size first, so only an output of the same size is read
+                if output_stat is None:
+                    self.change = 'added'
+                elif (output_stat.st_size != os.path.getsize(self.temp_path) or
+                      hash_file(self.path) != self.hash):
+                    self.change = 'modified'
+                if self.change is not None:
+                    os.chmod(self.temp_path, stat.S_IMODE(output_stat.st_mode) if output_stat else NEW_FILE_MODE)
+                    os.replace(self.temp_path, self.path)
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+        return False
+
+
+def write_output(path: str, text: str) -> OutputFile:
+    """Write text to an output file with OutputFile.
+
+    :return: The closed output file, with its hash and the change made to it
+    """
+    output = OutputFile(path)
+    with output as f:
+        f.write(text)
+    return output
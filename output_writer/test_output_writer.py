@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from output_writer import OutputFile, write_output, NEW_FILE_MODE
+
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'page.html')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_no_temporary_files(self):
+        self.assertEqual(['page.html'], os.listdir(self.temp_dir.name))
+
+    def test_new_output(self):
+        output = write_output(self.path, '<p>New</p>')
+        self.assertEqual('added', output.change)
+        self.assertEqual(hashlib.sha256(b'<p>New</p>').hexdigest(), output.hash)
+        with open(self.path, 'r') as f:
+            self.assertEqual('<p>New</p>', f.read())
+        self.assertEqual(NEW_FILE_MODE, os.stat(self.path).st_mode & 0o777)
+        self.assert_no_temporary_files()
+
+    def test_unchanged_output_is_left_alone(self):
+        write_output(self.path, '<p>Same</p>')
+        os.utime(self.path, ns=(0, 0))
+        self.assertIsNone(write_output(self.path, '<p>Same</p>').change)
+        self.assertEqual(0, os.stat(self.path).st_mtime_ns)
+        self.assert_no_temporary_files()
+
+    def test_changed_output_of_same_size(self):
+        write_output(self.path, '<p>Old</p>')
+        os.chmod(self.path, 0o640)
+        self.assertEqual('modified', write_output(self.path, '<p>New</p>').change)
+        with open(self.path, 'r') as f:
+            self.assertEqual('<p>New</p>', f.read())
+        self.assertEqual(0o640, os.stat(self.path).st_mode & 0o777)
+
+    def test_failed_write_leaves_output(self):
+        write_output(self.path, '<p>Old</p>')
+        output = OutputFile(self.path)
+        with self.assertRaises(ValueError):
+            with output as f:
+                f.write('<p>Half')
+                raise ValueError
+        with open(self.path, 'r') as f:
+            self.assertEqual('<p>Old</p>', f.read())
+        self.assertIsNone(output.change)
+        self.assert_no_temporary_files()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+from collections import OrderedDict
+
+DEFAULT_PAGE_CACHE_SIZE = 64 * 2 ** 20
+
+
+class PageCache:
+    """Rendered pages kept in memory, up to a total size in bytes.
+
+    Getting an entry makes it the most recently used, and the least recently
+    used entries are evicted to make room for new ones.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        # (entry, size) by key, from least to most recently used
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get the entry for a key, or None if it isn't cached."""
+        if (entry := self.entries.get(key)) is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, entry, size: int = None):
+        """Cache an entry, evicting the least recently used entries until it
+        fits. An entry bigger than the whole cache isn't kept.
+
+        :param size: bytes the entry takes up (by default, sys.getsizeof() of it)
+        """
+        if size is None:
+            size = sys.getsizeof(entry)
+        if (previous := self.entries.pop(key, None)) is not None:
+            self.size -= previous[1]
+        if size > self.max_size:
+            return
+        while self.size + size > self.max_size:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+        self.entries[key] = (entry, size)
+        self.size += size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def get_stats(self) -> dict:
+        return {'entries': len(self.entries), 'size': self.size, 'max_size': self.max_size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
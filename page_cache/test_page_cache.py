@@ -0,0 +1,46 @@
+import unittest
+
+from page_cache import PageCache
+
+
+class TestPageCache(unittest.TestCase):
+    def test_get_missing(self):
+        cache = PageCache(100)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(1, cache.misses)
+
+    def test_put_and_get(self):
+        cache = PageCache(100)
+        cache.put('a', '<p>A</p>', 10)
+        self.assertEqual('<p>A</p>', cache.get('a'))
+        self.assertEqual({'entries': 1, 'size': 10, 'max_size': 100, 'hits': 1, 'misses': 0, 'evictions': 0},
+                         cache.get_stats())
+
+    def test_least_recently_used_evicted(self):
+        cache = PageCache(30)
+        for key in 'abc':
+            cache.put(key, key, 10)
+        cache.get('a')
+        cache.put('d', 'd', 10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(['c', 'a', 'd'], list(cache.entries))
+        self.assertEqual(30, cache.size)
+        self.assertEqual(1, cache.evictions)
+
+    def test_replace_entry(self):
+        cache = PageCache(30)
+        cache.put('a', 'a', 20)
+        cache.put('a', 'b', 25)
+        self.assertEqual('b', cache.get('a'))
+        self.assertEqual(25, cache.size)
+
+    def test_entry_bigger_than_cache(self):
+        cache = PageCache(10)
+        cache.put('a', 'a', 5)
+        cache.put('b', 'b', 20)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('a', cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
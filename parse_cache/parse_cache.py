@@ -0,0 +1,74 @@
+import os
+import pickle
+import tempfile
+
+DEFAULT_CACHE_SIZE = 256 * 2 ** 20
+CACHE_EXTENSION = '.pickle'
+
+
+class ParseCache:
+    """Parse results kept on disk between builds, keyed by the hash of what
+    was parsed and the version of the parser that parsed it.
+
+    Each entry is its own file. Using an entry touches its file, so when the
+    cache grows past its size the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, version: int, max_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.v{self.version}{CACHE_EXTENSION}')
+
+    def get(self, key: str):
+        """Get the entry for a key, or None if there is no usable entry."""
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry):
+        # Written to a temporary file first so no other build reads half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.get_path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def evict(self) -> int:
+        """Remove the least recently used entries until the cache fits in its
+        size.
+
+        :return: The number of entries removed
+        """
+        entries = []
+        size = 0
+        with os.scandir(self.cache_dir) as files:
+            for file in files:
+                if file.name.endswith(CACHE_EXTENSION) and file.is_file():
+                    stat = file.stat()
+                    entries.append((stat.st_mtime, stat.st_size, file.path))
+                    size += stat.st_size
+        removed = 0
+        for _, file_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            os.remove(path)
+            size -= file_size
+            removed += 1
+        return removed
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from parse_cache import ParseCache
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_get_missing(self):
+        cache = ParseCache(self.cache_dir.name, 1)
+        self.assertIsNone(cache.get('abc'))
+        self.assertEqual(1, cache.misses)
+
+    def test_put_and_get(self):
+        cache = ParseCache(self.cache_dir.name, 1)
+        entry = ({'title': 'Page'}, [[(0, 0, ()), (2, 'Text'), (1, 0)]])
+        cache.put('abc', entry)
+        self.assertEqual(entry, ParseCache(self.cache_dir.name, 1).get('abc'))
+
+    def test_other_version_misses(self):
+        ParseCache(self.cache_dir.name, 1).put('abc', 'entry')
+        self.assertIsNone(ParseCache(self.cache_dir.name, 2).get('abc'))
+
+    def test_corrupt_entry_misses(self):
+        cache = ParseCache(self.cache_dir.name, 1)
+        with open(cache.get_path('abc'), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(cache.get('abc'))
+
+    def test_evict_least_recently_used(self):
+        cache = ParseCache(self.cache_dir.name, 1)
+        for age, key in enumerate(('new', 'old', 'used')):
+            cache.put(key, 'x' * 1000)
+            os.utime(cache.get_path(key), (1000 - age * 100, 1000 - age * 100))
+        cache.get('used')
+        cache.max_size = 2 * os.path.getsize(cache.get_path('new'))
+        self.assertEqual(1, cache.evict())
+        self.assertIsNone(cache.get('old'))
+        self.assertEqual('x' * 1000, cache.get('new'))
+        self.assertEqual('x' * 1000, cache.get('used'))
+
+
+if __name__ == '__main__':
+    unittest.main()
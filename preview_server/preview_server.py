@@ -0,0 +1,197 @@
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote, urlsplit
+
+from page_cache.page_cache import PageCache, DEFAULT_PAGE_CACHE_SIZE
+
+PREVIEW_PORT = 8000
+STATUS_PATH = '/_status'
+
+
+class PreviewServer:
+    """Serves the pages and folder indexes of a site over HTTP, rendering
+    each as it is requested instead of building the site. Nothing is written.
+
+    Rendered pages and indexes are kept in a PageCache, keyed by the
+    modification time and size of their sources and the version of the
+    templates. The config and templates are loaded again, as a new version,
+    when any file outside of _pages changes. GET /_status gives the cache's
+    hits, misses and size as JSON.
+    """
+
+    def __init__(self, site_build, files_dir: str, cache_size: int = DEFAULT_PAGE_CACHE_SIZE, quiet: bool = False):
+        """
+        :param site_build: the md2html SiteBuild to render the site with,
+                           which keeps its templates and parser loaded
+        """
+        self.site_build = site_build
+        self.files_dir = files_dir
+        self.pages_dir = os.path.join(files_dir, '_pages')
+        self.quiet = quiet
+        self.cache = PageCache(cache_size)
+        # Modification time and size of the files the templates were loaded from
+        self.template_files = None
+        self.template_version = 0
+        self.pages_rendered = 0
+        self.indexes_rendered = 0
+
+    def serve(self, port: int = PREVIEW_PORT, host: str = 'localhost'):
+        """Serve the site until interrupted."""
+        server = self.get_server(port, host)
+        print(f'\nPreviewing {self.files_dir} at http://{host}:{server.server_port}/')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print('\nStopped previewing')
+        finally:
+            server.server_close()
+
+    def get_server(self, port: int = PREVIEW_PORT, host: str = 'localhost') -> HTTPServer:
+        """Make the server of the site, on any free port if port is 0."""
+        server = HTTPServer((host, port), PreviewRequestHandler)
+        server.preview = self
+        return server
+
+    def get_response(self, url: str) -> (int, str, str):
+        """Render what a URL points to.
+
+        :return: The HTTP status, content type, and body of the response
+        """
+        path = unquote(urlsplit(url).path)
+        if path == STATUS_PATH:
+            return 200, 'application/json', json.dumps(self.get_status(), indent=1)
+        parts = (path.lstrip('/') or 'index.html').split('/')
+        if parts[-1] == '':
+            parts[-1] = 'index.html'
+        folder_path = os.path.join(self.pages_dir, *parts[:-1])
+        if any(part in ('', '.', '..') for part in parts) or not parts[-1].endswith('.html') or \
+                not os.path.isdir(folder_path):
+            return 404, 'text/plain', f'Nothing at {path}'
+        try:
+            self.load_templates()
+            # The index of a folder takes the place of a page called index, like in a build
+            if index_page := re.fullmatch(r'index(?:-([1-9][0-9]*))?\.html', parts[-1]):
+                html = self.render_index('/'.join(parts[:-1]), folder_path, int(index_page.group(1) or 1))
+            else:
+                html = self.render_page(folder_path, parts[-1][:-len('.html')], len(parts) - 1)
+        except Exception as error:
+            # Keep serving, so the page can be requested again once it is fixed
+            print(f'{path}  failed: {error}')
+            return 500, 'text/plain', str(error) or type(error).__name__
+        if html is None:
+            return 404, 'text/plain', f'Nothing at {path}'
+        return 200, 'text/html; charset=utf-8', html
+
+    def get_status(self) -> dict:
+        return {'cache': self.cache.get_stats(), 'template_version': self.template_version,
+                'pages_rendered': self.pages_rendered, 'indexes_rendered': self.indexes_rendered}
+
+    def load_templates(self):
+        """Load the config and templates, if any of the files outside of
+        _pages changed since they were last loaded.
+        """
+        template_files = self.get_template_files()
+        if template_files == self.template_files:
+            return
+        self.site_build.load_site(self.files_dir)
+        # Stat again, since the CSS might have moved
+        self.template_files = self.get_template_files()
+        self.template_version += 1
+        # Pages of older templates can't be used again
+        self.cache.clear()
+
+    def get_template_files(self) -> dict:
+        """Get the (modification time, size) of the config, the CSS, and
+        every template, keyed by path.
+        """
+        files = dict()
+        folders = [self.files_dir]
+        with os.scandir(self.files_dir) as entries:
+            folders += [entry.path for entry in entries if entry.is_dir() and entry.name[0:1] == '_' and
+                        entry.name[0:2] != '__' and entry.name != '_pages']
+        for folder in folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        if (css_path := self.site_build.css_path) is not None and os.path.isfile(css_path):
+            stat = os.stat(css_path)
+            files[css_path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def get_pages(self, folder_path: str) -> (dict, list):
+        """List a folder of pages.
+
+        :return: The (file name, modification time, size) of each page by
+                 page name, and the names of the subfolders
+        """
+        files_to_ignore = self.site_build.get_ignored_files()
+        pages = dict()
+        folders = []
+        with os.scandir(folder_path) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir():
+                    folders.append(entry.name)
+                elif entry.name not in files_to_ignore:
+                    stat = entry.stat()
+                    pages.setdefault(entry.name.rsplit('.', 1)[0], (entry.name, stat.st_mtime_ns, stat.st_size))
+        return pages, folders
+
+    def render_page(self, folder_path: str, page_name: str, file_depth: int) -> str or None:
+        """Render a page, or get it from the cache.
+
+        :return: The HTML of the page, or None if there is no such page
+        """
+        pages, _ = self.get_pages(folder_path)
+        if (page := pages.get(page_name)) is None:
+            return None
+        key = ('page', os.path.join(folder_path, page[0]), *page[1:], self.template_version)
+        if (html := self.cache.get(key)) is not None:
+            return html
+        with open(os.path.join(folder_path, page[0]), 'r') as f:
+            _, html = self.site_build.render_page_html(page[0], f, file_depth)
+        self.cache.put(key, html)
+        self.pages_rendered += 1
+        if not self.quiet:
+            print(f'Rendered {os.path.relpath(os.path.join(folder_path, page[0]), self.files_dir)}')
+        return html
+
+    def render_index(self, subfolder: str, folder_path: str, page: int) -> str or None:
+        """Render a page of the index of a folder, or get it from the cache.
+
+        :return: The HTML of the page of the index, or None if the index has
+                 no such page
+        """
+        pages, folders = self.get_pages(folder_path)
+        key = ('index', folder_path, page, tuple(pages.values()), tuple(folders), self.template_version)
+        if (html := self.cache.get(key)) is not None:
+            return html
+        page_paths = {page_name: os.path.join(folder_path, file_name) for page_name, (file_name, _, _) in pages.items()}
+        if (index := self.site_build.get_index_page(subfolder, folders, page_paths, page)) is None:
+            return None
+        index_name, html = index
+        self.cache.put(key, html)
+        self.indexes_rendered += 1
+        if not self.quiet:
+            print(f'Rendered {os.path.join("_pages", subfolder, index_name)}')
+        return html
+
+
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, content_type, body = self.server.preview.get_response(self.path)
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        # Always ask again, since the sources can change at any time
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.preview.quiet:
+            super().log_message(format, *args)
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from preview_server import PreviewServer, STATUS_PATH
+
+
+class StubBuild:
+    """Renders a page as its file depth and text, and an index as the names of what it lists."""
+
+    def __init__(self):
+        self.css_path = None
+        self.loads = 0
+
+    def load_site(self, files_dir: str):
+        self.loads += 1
+
+    def get_ignored_files(self) -> list:
+        return ['ignored.md']
+
+    def render_page_html(self, path: str, file, file_depth: int) -> (dict, str):
+        text = file.read()
+        if not text:
+            raise ValueError(f'Nothing in {path}')
+        return dict(), f'{file_depth}:{text}'
+
+    def get_index_page(self, subfolder: str, folders: list, page_paths: dict, page: int = 1) -> (str, str):
+        if page > 1:
+            return None
+        return 'index.html', ','.join(folders + sorted(page_paths))
+
+
+class TestPreviewServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files_dir = self.temp_dir.name
+        for path, text in (('config.ini', ''), ('_modules/footer.md', 'Footer'), ('_pages/page.md', 'Text'),
+                           ('_pages/ignored.md', 'Ignored'), ('_pages/folder/sub.md', 'Sub'),
+                           ('_pages/empty.md', '')):
+            self.write_file(path, text)
+        self.site_build = StubBuild()
+        self.preview = PreviewServer(self.site_build, self.files_dir, quiet=True)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, path: str, text: str):
+        os.makedirs(os.path.dirname(os.path.join(self.files_dir, path)), exist_ok=True)
+        with open(os.path.join(self.files_dir, path), 'w') as f:
+            f.write(text)
+
+    def get(self, url: str) -> (int, str):
+        status, _, body = self.preview.get_response(url)
+        return status, body
+
+    def test_page(self):
+        self.assertEqual((200, '0:Text'), self.get('/page.html'))
+        self.assertEqual((200, '1:Sub'), self.get('/folder/sub.html'))
+
+    def test_index(self):
+        self.assertEqual((200, 'folder,empty,page'), self.get('/'))
+        self.assertEqual((200, 'sub'), self.get('/folder/'))
+        self.assertEqual(404, self.get('/index-2.html')[0])
+
+    def test_not_found(self):
+        for url in ('/missing.html', '/ignored.html', '/page.md', '/../config.ini', '/nowhere/index.html'):
+            self.assertEqual(404, self.get(url)[0], url)
+
+    def test_failed_page(self):
+        with redirect_stdout(StringIO()):
+            self.assertEqual((500, 'Nothing in empty.md'), self.get('/empty.html'))
+        self.assertEqual(200, self.get('/page.html')[0])
+
+    def test_cache(self):
+        self.get('/page.html')
+        self.get('/page.html')
+        self.get('/')
+        self.get('/')
+        status = json.loads(self.get(STATUS_PATH)[1])
+        self.assertEqual(1, status['pages_rendered'])
+        self.assertEqual(1, status['indexes_rendered'])
+        self.assertEqual(2, status['cache']['hits'])
+        self.assertEqual(1, self.site_build.loads)
+
+    def test_changed_template_reloads_site(self):
+        self.get('/page.html')
+        self.write_file('_modules/header.html', 'Header')
+        self.get('/page.html')
+        self.assertEqual(2, self.site_build.loads)
+        self.assertEqual(2, self.preview.pages_rendered)
+        self.assertEqual(2, self.preview.template_version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+
+
+class SiteFolder:
+    """A folder as it was scanned: the entries of its files and its
+    subfolders, each by name in the order they were listed.
+
+    Files are kept as their os.DirEntry, which knows it is a file without
+    another system call, and keeps its stat() once it is called.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.files = dict()
+        self.folders = dict()
+
+    def walk(self, path: str = '') -> iter:
+        """Yield this folder and every folder under it, top down like
+        os.walk(), each with its path relative to this folder ('' for this
+        folder itself).
+        """
+        yield path, self
+        for name, folder in self.folders.items():
+            yield from folder.walk(os.path.join(path, name))
+
+    def get_folder(self, path: str):
+        """Get a folder under this one by its relative path, or None if it wasn't found."""
+        folder = self
+        for name in path.split(os.sep) if path else ():
+            if (folder := folder.folders.get(name)) is None:
+                return None
+        return folder
+
+    def get_file(self, path: str) -> os.DirEntry or None:
+        """Get the entry of a file under this folder by its relative path, or
+        None if it wasn't found.
+        """
+        folder_path, name = os.path.split(path)
+        folder = self.get_folder(folder_path)
+        return folder.files.get(name) if folder is not None else None
+
+
+def scan_site(root: str, ignore: list = ()) -> SiteFolder:
+    """Scan root and every folder under it once, listing each folder with a
+    single os.scandir().
+
+    Like os.walk(), folders that can't be listed are left empty, and links
+    to folders are listed as folders but not scanned.
+
+    :param ignore: folders under root to leave out (e.g. an output folder
+                   inside the source folder)
+    """
+    root_path = os.path.abspath(root)
+    ignore = {os.path.relpath(os.path.abspath(path), root_path) for path in ignore}
+    site = SiteFolder(os.path.basename(root_path))
+    to_scan = [(site, root, '')]
+    while to_scan:
+        folder, folder_path, relative_path = to_scan.pop()
+        try:
+            entries = list(os.scandir(folder_path))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                folder.files[entry.name] = entry
+                continue
+            path = os.path.join(relative_path, entry.name)
+            if path in ignore:
+                continue
+            subfolder = folder.folders[entry.name] = SiteFolder(entry.name)
+            if not entry.is_symlink():
+                to_scan.append((subfolder, entry.path, path))
+    return site
+
+
+def get_file_depth(subfolder: str) -> int:
+    # Get depth by counting slashes + 1 if not an empty string (the root)
+    # This will be appended to all internal links in the parsing process
+    return 1 + len(''.join(slash for slash in subfolder if slash == os.sep)) if subfolder else 0
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from site_tree import get_file_depth, scan_site
+
+
+class TestSiteTree(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        for folder in ('_modules', os.path.join('_pages', 'folder', 'subfolder'), 'output'):
+            os.makedirs(os.path.join(self.root, folder))
+        for file in ('config.ini', os.path.join('_modules', 'footer.md'), os.path.join('_pages', 'page.md'),
+                     os.path.join('_pages', 'folder', 'subfolder', 'deep.md'), os.path.join('output', 'index.html')):
+            with open(os.path.join(self.root, file), 'w') as f:
+                f.write(file)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_tree(self):
+        site = scan_site(self.root)
+        self.assertEqual({'_modules', '_pages', 'output'}, set(site.folders))
+        self.assertEqual(['config.ini'], list(site.files))
+        pages = site.folders['_pages']
+        self.assertEqual(['page.md'], list(pages.files))
+        self.assertEqual([('', pages), ('folder', pages.folders['folder']),
+                          (os.path.join('folder', 'subfolder'), pages.folders['folder'].folders['subfolder'])],
+                         list(pages.walk()))
+
+    def test_walk_matches_os_walk(self):
+        site = scan_site(self.root)
+        walked = [(path, sorted(folder.folders), sorted(folder.files)) for path, folder in site.walk()]
+        expected = [(os.path.relpath(path, self.root) if path != self.root else '', sorted(folders), sorted(files))
+                    for path, folders, files in os.walk(self.root)]
+        self.assertEqual(sorted(expected), sorted(walked))
+
+    def test_get_folder_and_file(self):
+        site = scan_site(self.root)
+        self.assertIs(site, site.get_folder(''))
+        self.assertEqual('subfolder', site.get_folder(os.path.join('_pages', 'folder', 'subfolder')).name)
+        self.assertIsNone(site.get_folder(os.path.join('_pages', 'missing')))
+        entry = site.get_file(os.path.join('_modules', 'footer.md'))
+        self.assertEqual(len(os.path.join('_modules', 'footer.md')), entry.stat().st_size)
+        self.assertIsNone(site.get_file(os.path.join('_modules', 'header.html')))
+
+    def test_ignore(self):
+        site = scan_site(self.root, [os.path.join(self.root, 'output')])
+        self.assertNotIn('output', site.folders)
+
+    def test_file_depth(self):
+        self.assertEqual(0, get_file_depth(''))
+        self.assertEqual(1, get_file_depth('folder'))
+        self.assertEqual(2, get_file_depth(os.path.join('folder', 'subfolder')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import os
+import time
+
+from build_manifest.build_manifest import BuildManifest
+from change_list.change_list import ChangeList
+from dependency_graph.dependency_graph import GRAPH_FILE
+from site_tree.site_tree import get_file_depth, scan_site
+
+WATCH_INTERVAL = 0.5
+
+
+class SiteSnapshot:
+    """The size and modification time of every file under a folder, polled to
+    find the files that were added, modified, or removed since the last poll.
+
+    Only stat() is needed, so no file watching library or OS support is.
+    """
+
+    def __init__(self, root: str, ignore: list = ()):
+        """
+        :param root: folder to watch
+        :param ignore: folders under root to leave out (e.g. an output folder
+                       inside the source folder)
+        """
+        self.root = root
+        self.ignore = ignore
+        # The folders and files as of the last scan
+        self.tree = None
+        self.files = self.scan()
+
+    def scan(self) -> dict:
+        """Scan the folder again, and get the (modification time, size) of
+        every file, keyed by its path relative to the root.
+        """
+        files = dict()
+        self.tree = scan_site(self.root, self.ignore)
+        for path, folder in self.tree.walk():
+            for name, entry in folder.files.items():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Removed since its folder was scanned
+                    continue
+                files[os.path.join(path, name)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self) -> (list, list, list):
+        """Scan the files again, and compare them with the last scan.
+
+        :return: The paths of the files added, modified, and removed, relative
+                 to the root and sorted
+        """
+        files = self.scan()
+        added = sorted(path for path in files if path not in self.files)
+        modified = sorted(path for path, stat in files.items() if path in self.files and self.files[path] != stat)
+        removed = sorted(path for path in self.files if path not in files)
+        self.files = files
+        return added, modified, removed
+
+
+class SiteWatcher:
+    """Rebuilds only what is affected by changes to a site, keeping its
+    templates and the parser loaded between rebuilds.
+
+    Changes are found by polling the size and modification time of every
+    file. A changed page is rendered with its folder's index. A changed
+    template renders the pages and indexes whose structure or markdown use
+    it, directly or through other templates. Any other change (e.g. the
+    config or CSS), or a folder of pages being added or removed, rebuilds
+    the site.
+    """
+
+    def __init__(self, site_build, files_dir: str, output_dir: str, full: bool = False, jobs: int = 1,
+                 quiet: bool = False):
+        """
+        :param site_build: the md2html SiteBuild to build the site with, which
+                           keeps its templates, parsers and dependency graph
+                           between rebuilds
+        """
+        self.site_build = site_build
+        self.files_dir = files_dir
+        self.output_dir = output_dir
+        self.pages_dir = os.path.join(files_dir, '_pages')
+        self.jobs = jobs
+        self.quiet = quiet
+        # Files the build writes can be inside the source folder
+        parse_cache = site_build.parse_cache
+        self.snapshot = SiteSnapshot(files_dir, [output_dir] + ([parse_cache.cache_dir] if parse_cache else []))
+        self.manifest = None
+        # The manifest is saved once changes stop coming, rather than slowing down each rebuild
+        self.manifest_saved = True
+        # Reason each page that failed to render failed, by source (e.g. _pages/page.md)
+        self.failed_pages = dict()
+        self.build(full)
+
+    def build(self, full: bool = False):
+        """Build the whole site, loading its templates again."""
+        self.failed_pages = dict(self.site_build.build(self.files_dir, self.output_dir, full=full, jobs=self.jobs,
+                                                       quiet=self.quiet))
+        self.manifest = BuildManifest.carry_over(BuildManifest.read(self.output_dir))
+        self.manifest_saved = True
+        self.manifest.set_templates(self.site_build.templates.get_template_sources())
+
+    def watch(self, interval: float = WATCH_INTERVAL):
+        """Poll for changes and rebuild what they affect until interrupted."""
+        print(f'\nWatching {self.files_dir} for changes...')
+        try:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.poll()
+                except (Exception, SystemExit) as error:
+                    # Keep watching, so the next save can fix it
+                    print(f'\nRebuild failed: {error}')
+        except KeyboardInterrupt:
+            print('\nStopped watching')
+        finally:
+            self.save_manifest()
+
+    def poll(self) -> bool:
+        """Rebuild what changed since the last poll.
+
+        :return: If anything changed
+        """
+        added, modified, removed = self.snapshot.poll()
+        if not (added or modified or removed):
+            self.save_manifest()
+            return False
+        start = time.perf_counter()
+        self.rebuild(added + modified, removed)
+        print(f'\nRebuilt in {(time.perf_counter() - start) * 1000:.0f} ms')
+        return True
+
+    def rebuild(self, changed: list, removed: list):
+        """Rebuild what the changed and removed files affect.
+
+        :param changed: paths of the added and modified files, relative to the source folder
+        :param removed: paths of the removed files, relative to the source folder
+        """
+        site_build = self.site_build
+        site_build.change_list = ChangeList(self.output_dir)
+        changed_pages, removed_pages, changed_templates, removed_templates = [], [], [], []
+        for paths, pages, template_files in ((changed, changed_pages, changed_templates),
+                                             (removed, removed_pages, removed_templates)):
+            for path in paths:
+                folder, *rest = path.split(os.sep, 1)
+                if path.endswith('.css'):
+                    # The CSS is put into every page, whichever folder it is kept in
+                    return self.build(full=True)
+                elif folder == '_pages' and rest:
+                    pages.append(rest[0])
+                elif folder[0:1] == '_' and folder[0:2] != '__' and rest and os.sep not in rest[0]:
+                    template_files.append((folder, rest[0]))
+                else:
+                    # The config, CSS, or something else the whole site can depend on
+                    return self.build(full=True)
+
+        # A folder of pages was added or removed, which changes the index of its parent
+        files_to_ignore = site_build.get_ignored_files()
+        changed_pages = [source for source in changed_pages if os.path.basename(source) not in files_to_ignore]
+        pages_folder = self.snapshot.tree.folders.get('_pages')
+        if pages_folder is None:
+            return self.build(full=True)
+        if (any(os.path.dirname(source) not in self.manifest.indexes for source in changed_pages) or
+                any(pages_folder.get_folder(os.path.dirname(source)) is None for source in removed_pages)):
+            return self.build()
+
+        changed_references = []
+        for folder, file in changed_templates:
+            template_name = site_build.load_template(os.path.join(self.files_dir, folder, file), folder[1:],
+                                                     parsed=folder != '_modules')
+            changed_references.append(f'{folder[1:]}.{template_name}')
+        for folder in {folder for folder, _ in removed_templates}:
+            site_build.templates.reset_template_group(folder[1:])
+            if (template_folder := self.snapshot.tree.folders.get(folder)) is not None:
+                site_build.load_templates(template_folder, folder[1:], parsed=folder != '_modules')
+        changed_references += [f'{folder[1:]}.{file.rsplit(".", 1)[0]}' for folder, file in removed_templates]
+        dependency_graph = site_build.dependency_graph
+        if changed_references:
+            self.manifest.set_templates(site_build.templates.get_template_sources())
+            dependency_graph.templates = site_build.templates.get_dependency_graph()
+
+        pages_to_render = set(changed_pages) | set(dependency_graph.get_affected_pages(changed_references))
+        folders_to_index = {os.path.dirname(source) for source in pages_to_render | set(removed_pages)}
+        if 'structures.index' in dependency_graph.get_dependents(changed_references):
+            folders_to_index = set(self.manifest.indexes)
+
+        for source in removed_pages:
+            self.manifest.pages.pop(source, None)
+            dependency_graph.remove_page(source)
+            self.failed_pages.pop(os.path.join('_pages', source), None)
+        for source in sorted(pages_to_render):
+            self.render_page(source)
+        for subfolder in sorted(folders_to_index):
+            pages = {os.path.basename(source).rsplit('.', 1)[0]: entry['front_matter']
+                     for source, entry in self.manifest.pages.items() if os.path.dirname(source) == subfolder}
+            site_build.create_index(subfolder, pages_folder.get_folder(subfolder),
+                                    os.path.join(self.output_dir, subfolder), pages, self.manifest, self.quiet)
+
+        self.manifest = BuildManifest.carry_over(self.manifest.get_entries())
+        self.manifest.set_templates(site_build.templates.get_template_sources())
+        self.manifest_saved = False
+        site_build.change_list.save()
+
+    def save_manifest(self):
+        if not self.manifest_saved:
+            self.manifest.save(self.output_dir)
+            self.site_build.dependency_graph.save(os.path.join(self.output_dir, GRAPH_FILE))
+            self.manifest_saved = True
+
+    def render_page(self, source: str):
+        """Render a page and record it, or leave it out of the site if it failed."""
+        subfolder, page = os.path.split(source)
+        output_path = os.path.join(self.output_dir, subfolder, f'{page.rsplit(".", 1)[0]}.html')
+        rendered = self.site_build.try_render_page(os.path.join(self.pages_dir, source), output_path,
+                                                   get_file_depth(subfolder))
+        if (error := self.site_build.record_page(source, output_path, rendered, self.manifest)) is not None:
+            print(f'''{os.path.join("_pages", source)}  failed: {error}''')
+            self.failed_pages[os.path.join('_pages', source)] = error
+            return
+        self.failed_pages.pop(os.path.join('_pages', source), None)
+        if not self.quiet:
+            print(f'''{os.path.join("_pages", source)}  ->  {output_path}''')
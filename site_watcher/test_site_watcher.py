@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from site_watcher import SiteSnapshot
+
+
+class TestSiteSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        os.makedirs(os.path.join(self.root, '_pages', 'folder'))
+        self.write('config.ini', 'title: Site')
+        self.write(os.path.join('_pages', 'folder', 'page.md'), 'Page')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, path: str, text: str):
+        path = os.path.join(self.root, path)
+        existed = os.path.isfile(path)
+        with open(path, 'w') as f:
+            f.write(text)
+        if existed:
+            # Make sure the modification time changes, even on a coarse clock
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_no_changes(self):
+        snapshot = SiteSnapshot(self.root)
+        self.assertEqual(([], [], []), snapshot.poll())
+
+    def test_changes(self):
+        snapshot = SiteSnapshot(self.root)
+        page = os.path.join('_pages', 'folder', 'page.md')
+        self.write(page, 'Page, edited')
+        self.write('style.css', 'body {}')
+        os.remove(os.path.join(self.root, 'config.ini'))
+        self.assertEqual((['style.css'], [page], ['config.ini']), snapshot.poll())
+        self.assertEqual(([], [], []), snapshot.poll())
+
+    def test_same_size_edit(self):
+        snapshot = SiteSnapshot(self.root)
+        self.write('config.ini', 'title: Blog')
+        self.assertEqual(([], ['config.ini'], []), snapshot.poll())
+
+    def test_removed_folder(self):
+        snapshot = SiteSnapshot(self.root)
+        page = os.path.join('_pages', 'folder', 'page.md')
+        os.remove(os.path.join(self.root, page))
+        os.rmdir(os.path.join(self.root, '_pages', 'folder'))
+        self.assertEqual(([], [], [page]), snapshot.poll())
+
+    def test_ignored_folder(self):
+        os.mkdir(os.path.join(self.root, 'output'))
+        snapshot = SiteSnapshot(self.root, [os.path.join(self.root, 'output')])
+        self.write(os.path.join('output', 'index.html'), 'Index')
+        self.assertEqual(([], [], []), snapshot.poll())
+
+
+if __name__ == '__main__':
+    unittest.main()
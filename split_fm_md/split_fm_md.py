@@ -1,6 +1,8 @@
 import re
 
 re_front_matter = re.compile(r'^---\s*.+?---\s*', re.DOTALL)
+# The same, but with the whitespace after the opening delimiter in a group
+re_front_matter_opening = re.compile(r'^---(\s*).+?---\s*', re.DOTALL)
 
 
 def split_page(file: str) -> (dict or None, str):
@@ -11,12 +13,17 @@ def split_page(file: str) -> (dict or None, str):
     return front_matter, markdown
 
 
-def get_front_matter(file: str) -> dict or None:
+def get_front_matter(file: str, quiet: bool = False) -> dict or None:
+    """:param quiet: don't print the start of a file without front matter"""
     if file[:3] != '---':
-        print(f'No front matter found in file:\n`{file[0:40]} ...`')
+        if not quiet:
+            print(f'No front matter found in file:\n`{file[0:40]} ...`')
         return None
 
-    raw_front_matter = re_front_matter.match(file).group()
+    return parse_front_matter(re_front_matter.match(file).group())
+
+
+def parse_front_matter(raw_front_matter: str) -> dict:
     raw_front_matter = raw_front_matter.replace('---', '').strip()
 
     parsed_front_matter = dict()
@@ -29,3 +36,91 @@ def get_front_matter(file: str) -> dict or None:
 
 def get_markdown(file: str) -> str:
     return ''.join(x.strip() for x in re_front_matter.split(file) if x != '')
+
+
+def read_page(file, quiet: bool = False) -> (dict or None, iter):
+    """Read a page from an open file, reading the markdown lazily.
+
+    Gives the same front matter and markdown as split_page(), without the
+    whole file in memory at once.
+
+    :param quiet: don't print the start of a page without front matter
+    :return: The front matter, and an iterator of the lines of markdown
+    """
+    lines = iter(file)
+    # Leading whitespace is ignored, like in split_page()
+    head = ''
+    while not head:
+        if (line := next(lines, None)) is None:
+            return get_front_matter(head, quiet), iter([''])
+        head = line.lstrip()
+
+    if head[:3] != '---':
+        # Read enough to show the start of the file
+        while len(head) < 40 and (line := next(lines, None)) is not None:
+            head += line
+        return get_front_matter(head, quiet), iter_markdown_lines(head, lines)
+
+    new_text = head[3:]
+    while True:
+        if '---' in new_text:
+            # Matching with less whitespace after the opening delimiter than
+            # there is means the whole file could still match differently
+            opening_whitespace = len(head) - 3 - len(head[3:].lstrip())
+            if (match := re_front_matter_opening.match(head)) and len(match.group(1)) == opening_whitespace:
+                break
+        if (new_text := next(lines, None)) is None:
+            match = re_front_matter_opening.match(head)
+            break
+        head += new_text
+
+    return get_front_matter(head, quiet), iter_markdown_lines(head[match.end():], lines)
+
+
+def read_front_matter(file) -> dict or None:
+    """Read only the front matter of a page from an open file, stopping at
+    its closing delimiter, so the markdown after it is never read.
+
+    Gives the same front matter as split_page().
+    """
+    front_matter, _ = read_page(file)
+    return front_matter
+
+
+def iter_markdown_lines(text: str, lines) -> iter:
+    """Yield the lines of the text followed by the rest of the file's lines,
+    stripped of leading and trailing whitespace as a whole, the same as
+    get_markdown() would give split on newlines.
+    """
+    text = text.lstrip()
+    while not text:
+        if (line := next(lines, None)) is None:
+            yield ''
+            return
+        text = line.lstrip()
+
+    # Whitespace only lines are held until a line with content comes after
+    # them, since they are stripped if they end the file
+    last_line, held_lines = None, []
+    for line in split_lines(text, lines):
+        if line.strip():
+            if last_line is not None:
+                yield last_line
+                yield from held_lines
+                held_lines = []
+            last_line = line
+        else:
+            held_lines.append(line)
+    yield last_line.rstrip()
+
+
+def split_lines(text: str, lines) -> iter:
+    """Yield the text followed by the rest of the lines, split on newlines."""
+    *complete_lines, partial_line = text.split('\n')
+    yield from complete_lines
+    for line in lines:
+        partial_line += line
+        if partial_line[-1:] == '\n':
+            yield partial_line[:-1]
+            partial_line = ''
+    yield partial_line
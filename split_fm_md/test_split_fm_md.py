@@ -2,6 +2,8 @@ import unittest
 
 import split_fm_md
 
+from contextlib import redirect_stdout
+from io import StringIO
 from textwrap import dedent
 
 
@@ -50,5 +52,51 @@ class TestBuildPageWithFrontMatter(unittest.TestCase):
         self.assertIsNone(front_matter)
 
 
+class TestReadPage(unittest.TestCase):
+    def assert_same_as_split_page(self, page: str):
+        front_matter, markdown = split_fm_md.split_page(page)
+        read_front_matter, markdown_lines = split_fm_md.read_page(StringIO(page))
+        self.assertEqual(front_matter, read_front_matter)
+        self.assertEqual(markdown.split('\n'), list(markdown_lines))
+
+    def test_read_page(self):
+        self.assert_same_as_split_page(TestBuildPageWithFrontMatter.example)
+
+    def test_read_page_whitespace(self):
+        self.assert_same_as_split_page('\n\n  ---\ntitle: Spaced out\n---\n\n\n    indented\n\n  \n  trailing  \n\n\t\n')
+
+    def test_read_page_delimiter_mid_line(self):
+        self.assert_same_as_split_page('--- ---\ntitle: a---b\n---\nText')
+
+    def test_read_page_no_front_matter(self):
+        self.assert_same_as_split_page(dedent('''\
+            # Header
+
+            Some more stuff'''))
+
+    def test_read_page_no_front_matter_quietly(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            front_matter, markdown_lines = split_fm_md.read_page(StringIO('# Header\n\nText'), quiet=True)
+        self.assertIsNone(front_matter)
+        self.assertEqual(['# Header', '', 'Text'], list(markdown_lines))
+        self.assertEqual('', out.getvalue())
+
+    def test_read_page_empty(self):
+        self.assertEqual([''], list(split_fm_md.read_page(StringIO('---\ntitle: Empty\n---\n  \n'))[1]))
+
+    def test_read_page_reads_lazily(self):
+        lines = iter(['---\n', 'title: Lazy\n', '---\n', 'Body\n'])
+        front_matter, _ = split_fm_md.read_page(lines)
+        self.assertEqual({'title': 'Lazy'}, front_matter)
+        self.assertEqual('Body\n', next(lines))
+
+    def test_read_front_matter_stops_at_delimiter(self):
+        lines = iter(['\n', '---\n', 'title: Only this\n', 'description: Short\n', '---\n', 'Body\n'])
+        self.assertEqual({'title': 'Only this', 'description': 'Short'}, split_fm_md.read_front_matter(lines))
+        self.assertEqual('Body\n', next(lines))
+        self.assertIsNone(split_fm_md.read_front_matter(StringIO('# No front matter')))
+
+
 if __name__ == '__main__':
     unittest.main()
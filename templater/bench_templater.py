@@ -0,0 +1,66 @@
+"""Benchmark filling page structures, the per page hot path after parsing.
+
+Compares the compiled templates, with the site and module variables filled in
+once per structure, against filling by rescanning the whole text until no
+variables are left, which is how the templater used to work.
+
+Run from this folder: `python bench_templater.py`
+"""
+from itertools import zip_longest
+import timeit
+
+from templater import Templater
+
+
+def fill_by_rescanning(templater: Templater, text: str) -> str:
+    if len(references := templater.re_delimiters.findall(text)):
+        replacements = [templater.get_template_replacement(r) for r in references]
+        non_references = templater.re_delimiters.split(text)
+        filled_text = ''.join(f'{a}{b}' for a, b in zip_longest(non_references, replacements, fillvalue=''))
+        return fill_by_rescanning(templater, filled_text)
+    return text
+
+
+def make_templater(depth: int, page_size: int) -> (Templater, dict):
+    """Make a structure that nests modules `depth` deep around a page of
+    `page_size` paragraphs.
+    """
+    templater = Templater()
+    modules = {f'level{i}': f'<div class="level{i}">\n{{{{ modules.level{i + 1} }}}}\n</div>' for i in range(depth)}
+    modules[f'level{depth}'] = '<main>{{ page }}</main>'
+    modules['head'] = '<head><title>{{ page.title }}</title><style>{{ site.css }}</style></head>'
+    templater.add_templates({'site': {'css': 'body { margin: 0; }' * 50, 'title': 'Benchmark'},
+                             'modules': modules,
+                             'structures': {'page': '<html>{{ modules.head }}<body>{{ modules.level0 }}</body></html>'}})
+    page = {'title': 'A Page',
+            '_html': '\n'.join(f'<p>Paragraph {i} of {{{{ site.title }}}}</p>'
+                               if i % 50 == 0 else f'<p>Paragraph {i}</p>'
+                               for i in range(page_size))}
+    return templater, page
+
+
+def main():
+    print(f'{"depth":>6} {"paragraphs":>11} {"rescanning (ms)":>16} {"compiled (ms)":>14}')
+    for depth in (1, 8, 32):
+        for page_size in (10, 1000):
+            templater, page = make_templater(depth, page_size)
+            structure = templater.get_templates()['structures']['page']
+
+            def rescan_page():
+                templater.add_templates({'page': page})
+                filled = fill_by_rescanning(templater, structure)
+                templater.reset_template_group('page')
+                return filled
+
+            def fill_page():
+                return templater.fill_structure('page', {'page': page})
+
+            assert rescan_page() == fill_page()
+            number = 200
+            rescanning = timeit.timeit(rescan_page, number=number) / number
+            compiled = timeit.timeit(fill_page, number=number) / number
+            print(f'{depth:>6} {page_size:>11} {rescanning * 1000:>16.3f} {compiled * 1000:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
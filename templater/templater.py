@@ -1,12 +1,35 @@
-from itertools import zip_longest
+from collections import Counter
+from functools import lru_cache
 import re
 
 
+def read_text_file(path: str) -> str:
+    with open(path, 'r') as f:
+        return f.read()
+
+
 class Templater:
     re_delimiters = re.compile('{{.+?}}')
+    # Groups that stay the same for a whole build, unlike the page
+    static_groups = ('site', 'modules', 'structures')
 
-    def __init__(self):
+    def __init__(self, read_file=None):
+        """
+        :param read_file: function to get the text of a template file by its
+                          path, in place of reading it from disk (e.g. for
+                          files kept in memory)
+        """
+        self.read_file = read_file or read_text_file
         self.__templates = dict()
+        # Templates read from their file the first time they are used, by
+        # group, then by template name, as (path, prepare)
+        self.__template_files = dict()
+        # Text of the template files read so far, by (group, template name)
+        self.__sources = dict()
+        # Compiled templates by group, then by template name
+        self.__programs = dict()
+        # Compiled structures with all static groups already filled in
+        self.__static_programs = dict()
 
     def add_templates(self, *templates: dict):
         """Add templates to to be accessed by the engine.
@@ -18,54 +41,315 @@ class Templater:
                 if not self.__templates.get(template_name):
                     self.__templates[template_name] = dict()
                 self.__templates[template_name] |= template
+                if files := self.__template_files.get(template_name):
+                    for name in template:
+                        files.pop(name, None)
+                        self.__sources.pop((template_name, name), None)
+                if programs := self.__programs.get(template_name):
+                    for name in template:
+                        programs.pop(name, None)
+                if template_name in self.static_groups:
+                    self.__static_programs.clear()
+
+    def add_template_file(self, group_name: str, template_name: str, path: str, prepare=None):
+        """Add a template that is only read from its file, and prepared, the
+        first time it is used (e.g. when a structure that refers to it is
+        filled), and then kept.
+
+        :param prepare: function to make the template out of the text of the
+                        file (e.g. parse its markdown), or None to use the text
+        """
+        self.__template_files.setdefault(group_name, dict())[template_name] = (path, prepare)
+        self.__sources.pop((group_name, template_name), None)
+        if group := self.__templates.get(group_name):
+            group.pop(template_name, None)
+        if programs := self.__programs.get(group_name):
+            programs.pop(template_name, None)
+        if group_name in self.static_groups:
+            self.__static_programs.clear()
 
     def get_templates(self) -> dict:
+        """Get the templates added, or read from their files, so far."""
         return self.__templates
 
+    def get_template_files(self) -> dict:
+        """Get the templates added as files, by group, then by template name,
+        as (path, prepare).
+        """
+        return self.__template_files
+
+    def get_template(self, group_name: str, template_name: str) -> str or None:
+        """Get a template, reading and preparing it if it was added as a file
+        and hasn't been used before.
+        """
+        group = self.__templates.get(group_name)
+        if group is not None and template_name in group:
+            return group[template_name]
+        if (template_file := self.__template_files.get(group_name, dict()).get(template_name)) is None:
+            return None
+        _, prepare = template_file
+        template = self.get_template_source(group_name, template_name)
+        if prepare is not None:
+            template = prepare(template)
+        self.__templates.setdefault(group_name, dict())[template_name] = template
+        return template
+
+    def get_template_source(self, group_name: str, template_name: str) -> str or None:
+        """Get what a template is made from: the text of its file if it was
+        added as one (which is read without preparing it), or else the
+        template itself.
+        """
+        if (template_file := self.__template_files.get(group_name, dict()).get(template_name)) is None:
+            return self.__templates.get(group_name, dict()).get(template_name)
+        key = (group_name, template_name)
+        if (source := self.__sources.get(key)) is None:
+            source = self.__sources[key] = self.read_file(template_file[0]).strip()
+        return source
+
+    def get_template_sources(self) -> dict:
+        """Get what every template is made from (see get_template_source()),
+        by group, then by template name, without preparing any template files.
+        """
+        sources = dict()
+        for group_name in self.__templates.keys() | self.__template_files.keys():
+            template_names = self.__templates.get(group_name, dict()).keys() | \
+                             self.__template_files.get(group_name, dict()).keys()
+            sources[group_name] = {template_name: self.get_template_source(group_name, template_name)
+                                   for template_name in sorted(template_names)}
+        return sources
+
     def reset_template_group(self, key: str):
         if self.__templates.get(key):
             del self.__templates[key]
+        for template_name in self.__template_files.pop(key, dict()):
+            self.__sources.pop((key, template_name), None)
+        self.__programs.pop(key, None)
+        if key in self.static_groups:
+            self.__static_programs.clear()
+
+    def fill_structure(self, structure_name: str, groups: dict = None) -> str:
+        """Fill a structure with every template it uses.
 
-    def fill_structure(self, structure_name: str):
-        structure = self.__templates.get('structures').get(structure_name)
-        return self.fill(structure)
+        The site, module, and structure variables are filled in once per
+        structure, so filling it for each page only fills the page's own
+        variables.
+
+        :param groups: template groups used only for this structure (e.g.
+                       {'page': {...}}), in place of added groups of the same
+                       name
+        """
+        groups = groups or dict()
+        output = []
+        self.__render(self.__get_structure_program(structure_name, groups), output,
+                      {('structures', structure_name)}, groups, dict())
+        return ''.join(output)
+
+    def iter_fill_structure(self, structure_name: str, groups: dict = None):
+        """Fill a structure like fill_structure(), yielding it in pieces.
+
+        A variable in the passed in groups that the structure uses directly
+        can be an iterable of strings instead of a string (e.g. the blocks of
+        a page as they are parsed), which is filled and yielded one string at
+        a time. An iterable can only be taken once, so one the structure uses
+        more than once (or might use inside another template) is joined into
+        a string first.
+        """
+        groups = groups or dict()
+        key = ('structures', structure_name)
+        group_programs = dict()
+        chunks, references = self.__get_structure_program(structure_name, groups)
+        # Static templates are only filled into the program, and so only seen
+        # here, when no static group is passed in
+        static = not any(group_name in groups for group_name in self.static_groups)
+        uses = Counter(self.__resolve(*reference, groups) for reference in references)
+        groups = {group_name: {name: value if isinstance(value, str) or static and uses[(group_name, name)] == 1
+                               else ''.join(value)
+                               for name, value in group.items()}
+                  for group_name, group in groups.items()}
+        for chunk, reference in zip(chunks, references):
+            yield chunk
+            reference_key = self.__resolve(*reference, groups)
+            group_name, replacement_name = reference_key
+            if group_name in groups and not isinstance(parts := groups[group_name].get(replacement_name), str):
+                for part in parts:
+                    output = []
+                    self.__render(self.compile(part), output, {key, reference_key}, groups, group_programs)
+                    yield ''.join(output)
+            else:
+                output = []
+                self.__render((['', ''], [reference]), output, {key}, groups, group_programs)
+                yield ''.join(output)
+        yield chunks[-1]
 
-    def fill(self, text: str) -> str:
+    def fill(self, text: str, groups: dict = None) -> str:
         """Replace the variables in the text with desired replacements.
 
+        Replacements are filled in as well, until no variables are left.
+
         :param text: text that may contain the variables surrounded by
                      the delimiter
+        :param groups: template groups used only for this text, in place of
+                       added groups of the same name
         :return: A string with the variables replaced.
         """
-        if len(templates := self.re_delimiters.findall(text)):
-            # Make list of replaced words and non-replaced words
-            templates = [self.get_template_replacement(t) for t in templates]
-            non_templates = self.re_delimiters.split(text)
-            # Join them together
-            filled_text = ''.join(f"{a}{b}" for a, b in zip_longest(non_templates, templates, fillvalue=''))
-            # Repeat the function until all templates are completely filled
-            return self.fill(filled_text)
-        else:
-            return text
+        output = []
+        self.__render(self.compile(text), output, set(), groups or dict(), dict())
+        return ''.join(output)
 
-    def get_template_replacement(self, reference: str) -> str:
-        """Gets replacement from template dict"""
-        if reference == '':
-            return ''
+    def compile(self, text: str) -> (list, list):
+        """Split text into its literal chunks and the variables between them.
+
+        :return: A list of literal chunks, and a list of the variables that
+                 go between each pair of chunks (one fewer than the chunks),
+                 each as its reference, group name, and template name
+        """
+        return self.re_delimiters.split(text), [(reference, *self.get_identifiers(reference))
+                                                 for reference in self.re_delimiters.findall(text)]
+
+    def __get_program(self, key: (str, str), groups: dict, group_programs: dict) -> (list, list):
+        """Get the compiled template, compiling it the first time it is used.
+
+        :param group_programs: compiled templates of the passed in groups,
+                               which are only kept for one fill
+        """
+        group_name, replacement_name = key
+        if group_name in groups:
+            if (program := group_programs.get(key)) is None:
+                template = groups[group_name].get(replacement_name)
+                program = group_programs[key] = self.compile(str(self.__check_found(key, template)))
+            return program
+        programs = self.__programs.setdefault(group_name, dict())
+        if (program := programs.get(replacement_name)) is None:
+            template = self.get_template(group_name, replacement_name)
+            program = programs[replacement_name] = self.compile(str(self.__check_found(key, template)))
+        return program
+
+    @staticmethod
+    def __check_found(key: (str, str), template):
+        """Pass a template through, or raise if there is none (e.g. an
+        unknown structure)."""
+        if template is None:
+            raise Exception(f'Template item not found at \'{".".join(key)}\'.')
+        return template
+
+    def __get_structure_program(self, structure_name: str, groups: dict) -> (list, list):
+        if any(group_name in groups for group_name in self.static_groups):
+            return self.__get_program(('structures', structure_name), groups, dict())
+        return self.__get_static_program(structure_name)
+
+    def __get_static_program(self, structure_name: str) -> (list, list):
+        """Get the compiled structure with its static variables filled in,
+        leaving only the variables of other groups (e.g. the page).
+        """
+        if (program := self.__static_programs.get(structure_name)) is None:
+            key = ('structures', structure_name)
+            chunks, references = [''], []
+            self.__fill_static(self.__get_program(key, dict(), dict()), chunks, references, {key})
+            program = self.__static_programs[structure_name] = (chunks, references)
+        return program
+
+    def __fill_static(self, program: (list, list), chunks: list, references: list, expanding: set):
+        """Fill the static variables of a compiled template into the chunks,
+        and add the rest to the references with an empty chunk after each.
+        """
+        program_chunks, program_references = program
+        for chunk, reference in zip(program_chunks, program_references):
+            chunks[-1] += chunk
+            if reference[1] not in self.static_groups:
+                references.append(reference)
+                chunks.append('')
+                continue
+            key = self.__resolve(*reference, dict())
+            if key in expanding:
+                raise Exception(f'Template cycle found at \'{reference[0]}\'.')
+            expanding.add(key)
+            self.__fill_static(self.__get_program(key, dict(), dict()), chunks, references, expanding)
+            expanding.remove(key)
+        chunks[-1] += program_chunks[-1]
+
+    def __render(self, program: (list, list), output: list, expanding: set, groups: dict, group_programs: dict):
+        """Append the literal chunks and the filled variables of a compiled
+        template to the output, filling nested variables depth first.
+
+        :param expanding: the templates currently being filled, which cannot
+                          be used again inside themselves
+        """
+        chunks, references = program
+        for chunk, (reference, group_name, replacement_name) in zip(chunks, references):
+            output.append(chunk)
+            key = self.__resolve(reference, group_name, replacement_name, groups)
+            if key in expanding:
+                raise Exception(f'Template cycle found at \'{reference}\'.')
+            nested_chunks, nested_references = nested = self.__get_program(key, groups, group_programs)
+            if nested_references:
+                expanding.add(key)
+                self.__render(nested, output, expanding, groups, group_programs)
+                expanding.remove(key)
+            else:
+                output.append(nested_chunks[0])
+        output.append(chunks[-1])
+
+    def find_references(self, text: str) -> set:
+        """Get the templates of the static groups that text refers to, as
+        'group.name' (e.g. 'modules.footer').
+        """
+        return self.__get_static_references([(reference, *self.get_identifiers(reference))
+                                             for reference in self.re_delimiters.findall(text)])
+
+    def get_dependency_graph(self) -> dict:
+        """Get the templates of the static groups that each of them refers to
+        directly, keyed by 'group.name'.
+        """
+        graph = dict()
+        template_sources = self.get_template_sources()
+        for group_name in self.static_groups:
+            for template_name, source in template_sources.get(group_name, dict()).items():
+                graph[f'{group_name}.{template_name}'] = sorted(self.find_references(str(source)))
+        return graph
+
+    def __get_static_references(self, references: list) -> set:
+        static_references = set()
+        for _, group_name, replacement_name in references:
+            if group_name in self.static_groups:
+                static_references.add(f'{group_name}.{replacement_name}')
+            elif group_name == 'page' and replacement_name != '_html':
+                # A page variable falls back to the site variable of the same
+                # name where there is no page (e.g. in an index)
+                static_references.add(f'site.{replacement_name}')
+        return static_references
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_identifiers(reference: str) -> (str, str):
+        """Gets the group and template name written in a reference"""
         if len(identifiers := reference[2:-2].strip().split('.')) == 1:
             # single word reference implies use in a page template
-            group_name, replacement_name = identifiers[0], '_html'
-        else:
-            group_name, replacement_name = identifiers
+            return identifiers[0], '_html'
+        group_name, replacement_name = identifiers
+        return group_name, replacement_name
 
-        group = self.__templates.get(group_name)
+    def __resolve(self, reference: str, group_name: str, replacement_name: str, groups: dict) -> (str, str):
+        """Gets the group and name of the template a reference points to"""
+        if group_name in groups:
+            group = groups[group_name]
+        else:
+            group = self.__templates.get(group_name) or self.__template_files.get(group_name)
         if not group:
             # If there is no page var found in group
             if group_name == 'page':
                 # get the site var instead
-                return self.__templates.get('site').get(replacement_name)
+                return 'site', replacement_name
             else:
                 raise Exception(f'Template group not found at \'{reference}\'.')
-        if not (replacement := group.get(replacement_name)):
+        template = group.get(replacement_name) if group_name in groups else self.get_template(group_name,
+                                                                                               replacement_name)
+        if not template:
             raise Exception(f'Template item not found at \'{reference}\'.')
-        return replacement
+        return group_name, replacement_name
+
+    def get_template_replacement(self, reference: str) -> str:
+        """Gets replacement from template dict"""
+        if reference == '':
+            return ''
+        group_name, replacement_name = self.__resolve(reference, *self.get_identifiers(reference), dict())
+        return self.get_template(group_name, replacement_name)
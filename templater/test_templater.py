@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 from templater import Templater
 from markdown_parser.markdown_parser import MarkdownParser
 from split_fm_md import split_fm_md
@@ -65,6 +68,200 @@ class TestTemplateInsertion(unittest.TestCase):
                          self.templater.fill('Check out my page at [{{test.site}}/thispage/index.html](my website).'))
 
 
+class TestNestedTemplates(unittest.TestCase):
+    def setUp(self):
+        self.templater = Templater()
+
+    def test_fill_deeply_nested(self):
+        self.templater.add_templates({'modules': {f'm{i}': f'<{i}>{{{{ modules.m{i + 1} }}}}</{i}>' for i in range(50)}})
+        self.templater.add_templates({'modules': {'m50': 'center'}})
+        filled = self.templater.fill('{{ modules.m0 }}')
+        self.assertEqual(''.join(f'<{i}>' for i in range(50)) + 'center' + ''.join(f'</{i}>' for i in reversed(range(50))),
+                         filled)
+
+    def test_same_template_used_twice(self):
+        self.templater.add_templates({'modules': {'a': '{{ modules.b }}{{ modules.b }}', 'b': 'dog'}})
+        self.assertEqual('dogdog', self.templater.fill('{{ modules.a }}'))
+
+    def test_throw_on_cycle(self):
+        self.templater.add_templates({'modules': {'a': 'A {{ modules.b }}', 'b': 'B {{ modules.a }}'}})
+        with self.assertRaises(Exception):
+            self.templater.fill('{{ modules.a }}')
+
+    def test_throw_on_structure_including_itself(self):
+        self.templater.add_templates({'structures': {'page': 'Again {{ structures.page }}'}})
+        with self.assertRaises(Exception):
+            self.templater.fill_structure('page')
+
+    def test_changed_template_is_recompiled(self):
+        self.templater.add_templates({'structures': {'page': '{{ page.title }}'},
+                                      'page': {'title': 'First'}})
+        self.assertEqual('First', self.templater.fill_structure('page'))
+        self.templater.add_templates({'page': {'title': 'Second'}})
+        self.assertEqual('Second', self.templater.fill_structure('page'))
+        self.templater.reset_template_group('page')
+        self.templater.add_templates({'page': {'title': 'Third'}})
+        self.assertEqual('Third', self.templater.fill_structure('page'))
+
+    def test_page_falls_back_to_site(self):
+        self.templater.add_templates({'site': {'title': 'My Site'}})
+        self.assertEqual('My Site', self.templater.fill('{{ page.title }}'))
+
+
+class TestTemplateDependencies(unittest.TestCase):
+    def setUp(self):
+        self.templater = Templater()
+        self.templater.add_templates({'site': {'title': 'My Site'},
+                                      'modules': {'head': '<title>{{ page.title }}</title>{{ site.title }}',
+                                                  'header': '<h1>{{ site.title }}</h1>',
+                                                  'footer': 'Footer'},
+                                      'structures': {'page': '{{ modules.head }}{{ modules.header }}{{ page }}'
+                                                             '{{ modules.footer }}',
+                                                     'index': '{{ modules.head }}{{ index }}'}})
+
+    def test_find_references(self):
+        self.assertEqual({'modules.footer', 'site.title', 'site.description'},
+                         self.templater.find_references('{{ modules.footer }}{{ site.title }}{{ page }}'
+                                                        '{{ page.description }}{{ index }}'))
+        self.assertEqual(set(), self.templater.find_references('No references'))
+
+    def test_get_dependency_graph(self):
+        self.assertEqual({'site.title': [],
+                          'modules.head': ['site.title'],
+                          'modules.header': ['site.title'],
+                          'modules.footer': [],
+                          'structures.page': ['modules.footer', 'modules.head', 'modules.header'],
+                          'structures.index': ['modules.head']},
+                         self.templater.get_dependency_graph())
+
+
+class TestTemplateFiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.templater = Templater()
+        self.prepare = mock.Mock(side_effect=lambda text: f'<div>{text}</div>')
+        self.templater.add_templates({'structures': {'page': '{{ modules.header }}{{ page }}'}})
+        self.templater.add_template_file('modules', 'header', self.write('header.md', '<h1>{{ site.title }}</h1>\n'),
+                                         self.prepare)
+        self.templater.add_template_file('modules', 'unused', self.write('unused.html', 'Unused'))
+        self.templater.add_templates({'site': {'title': 'Site'}})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, file: str, text: str) -> str:
+        path = os.path.join(self.temp_dir.name, file)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_template_is_prepared_when_first_used(self):
+        self.prepare.assert_not_called()
+        self.assertEqual('<div><h1>Site</h1></div>Page',
+                         self.templater.fill_structure('page', {'page': {'_html': 'Page'}}))
+        self.assertEqual('<div><h1>{{ site.title }}</h1></div>',
+                         self.templater.get_template_replacement('{{ modules.header }}'))
+        self.prepare.assert_called_once_with('<h1>{{ site.title }}</h1>')
+
+    def test_sources_are_not_prepared(self):
+        self.assertEqual('<h1>{{ site.title }}</h1>', self.templater.get_template_source('modules', 'header'))
+        self.assertEqual(['modules.header'], self.templater.get_dependency_graph()['structures.page'])
+        self.prepare.assert_not_called()
+        self.assertNotIn('modules', self.templater.get_templates())
+
+    def test_changed_file_is_read_again(self):
+        self.templater.fill_structure('page', {'page': {'_html': 'Page'}})
+        self.templater.add_template_file('modules', 'header', self.write('header.html', '<h2>New</h2>'))
+        self.assertEqual('<h2>New</h2>Page', self.templater.fill_structure('page', {'page': {'_html': 'Page'}}))
+
+    def test_added_template_replaces_file(self):
+        self.templater.add_templates({'modules': {'header': 'Added'}})
+        self.assertEqual('Added', self.templater.get_template_source('modules', 'header'))
+        self.assertEqual('AddedPage', self.templater.fill_structure('page', {'page': {'_html': 'Page'}}))
+
+    def test_read_file(self):
+        files = {'header.md': '# Header\n'}
+        templater = Templater(read_file=files.__getitem__)
+        templater.add_templates({'structures': {'page': '{{ modules.header }}'}})
+        templater.add_template_file('modules', 'header', 'header.md', self.prepare)
+        self.assertEqual('<div># Header</div>', templater.fill_structure('page'))
+
+    def test_reset_group(self):
+        self.templater.reset_template_group('modules')
+        self.assertEqual({}, self.templater.get_template_files())
+        with self.assertRaises(Exception):
+            self.templater.fill_structure('page', {'page': {'_html': 'Page'}})
+
+
+class TestFillStructureWithGroups(unittest.TestCase):
+    def setUp(self):
+        self.templater = Templater()
+        self.templater.add_templates({'site': {'title': 'My Site'},
+                                      'modules': {'head': '<title>{{ page.title }} - {{ site.title }}</title>'},
+                                      'structures': {'page': '{{ modules.head }}\n{{ page }}'}})
+
+    def test_fill_page_groups(self):
+        self.assertEqual('<title>First - My Site</title>\n<p>One</p>',
+                         self.templater.fill_structure('page', {'page': {'title': 'First', '_html': '<p>One</p>'}}))
+        self.assertEqual('<title>Second - My Site</title>\n<p>Two</p>',
+                         self.templater.fill_structure('page', {'page': {'title': 'Second', '_html': '<p>Two</p>'}}))
+
+    def test_groups_are_not_added(self):
+        self.templater.fill_structure('page', {'page': {'title': 'First', '_html': '<p>One</p>'}})
+        self.assertNotIn('page', self.templater.get_templates())
+
+    def test_page_variables_are_filled(self):
+        self.assertEqual('<title>First - My Site</title>\n<p>Welcome to My Site</p>',
+                         self.templater.fill_structure('page', {'page': {'title': 'First',
+                                                                         '_html': '<p>Welcome to {{ site.title }}</p>'}}))
+
+    def test_changed_module_is_filled(self):
+        self.templater.fill_structure('page', {'page': {'title': 'First', '_html': '<p>One</p>'}})
+        self.templater.add_templates({'modules': {'head': '<title>{{ page.title }}</title>'}})
+        self.assertEqual('<title>First</title>\n<p>One</p>',
+                         self.templater.fill_structure('page', {'page': {'title': 'First', '_html': '<p>One</p>'}}))
+
+    def test_static_groups_can_be_replaced(self):
+        self.assertEqual('<title>First - Other Site</title>\n<p>One</p>',
+                         self.templater.fill_structure('page', {'page': {'title': 'First', '_html': '<p>One</p>'},
+                                                                'site': {'title': 'Other Site'}}))
+
+    def test_iter_fill_structure(self):
+        page = {'title': 'First', '_html': '<p>One</p>'}
+        self.assertEqual(self.templater.fill_structure('page', {'page': page}),
+                         ''.join(self.templater.iter_fill_structure('page', {'page': page})))
+
+    def test_iter_fill_structure_with_parts(self):
+        parts = iter(['<p>One</p>', '\n<p>{{ site.title }}</p>'])
+        chunks = list(self.templater.iter_fill_structure('page', {'page': {'title': 'First', '_html': parts}}))
+        self.assertEqual('<title>First - My Site</title>\n<p>One</p>\n<p>My Site</p>', ''.join(chunks))
+        self.assertIn('<p>One</p>', chunks)
+
+    def test_iter_fill_structure_with_parts_used_twice(self):
+        self.templater.add_templates({'structures': {'twice': '{{ page }}<aside>{{ page }}</aside>'}})
+        parts = iter(['<p>One</p>', '\n<p>Two</p>'])
+        self.assertEqual('<p>One</p>\n<p>Two</p><aside><p>One</p>\n<p>Two</p></aside>',
+                         ''.join(self.templater.iter_fill_structure('twice', {'page': {'_html': parts}})))
+
+    def test_iter_fill_structure_with_parts_and_replaced_groups(self):
+        parts = iter(['<p>One</p>'])
+        self.assertEqual('<title>First - Other Site</title>\n<p>One</p>',
+                         ''.join(self.templater.iter_fill_structure('page', {'page': {'title': 'First', '_html': parts},
+                                                                           'site': {'title': 'Other Site'}})))
+
+    def test_throw_on_missing_page_variable(self):
+        with self.assertRaises(Exception):
+            self.templater.fill_structure('page', {'page': {'_html': '<p>One</p>'}})
+
+    def test_throw_on_missing_structure(self):
+        with self.assertRaisesRegex(Exception, 'Template item not found'):
+            self.templater.fill_structure('nope', {'page': {'title': 'First', '_html': '<p>One</p>'}})
+        with self.assertRaisesRegex(Exception, 'Template item not found'):
+            self.templater.fill_structure('nope')
+        with self.assertRaisesRegex(Exception, 'Template item not found'):
+            Templater().fill_structure('page')
+
+
 class TestBuildPages(unittest.TestCase):
     md_parser = MarkdownParser()
 
@@ -0,0 +1,733 @@
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+from contextlib import redirect_stdout
+from io import StringIO
+
+import md2html
+from build_daemon.build_daemon import BuildDaemon, DaemonError, send_request
+from build_profile.build_profile import BuildProfile
+from markdown_parser.markdown_parser import MarkdownParser, ParseTimeout
+from preview_server.preview_server import PreviewServer, STATUS_PATH
+from site_watcher.site_watcher import SiteWatcher
+from templater.templater import Templater
+
+TEST_SITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_test')
+EXPECTED_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_output')
+
+
+def build(files_dir: str, output_dir: str, **kwargs) -> str:
+    out = StringIO()
+    with redirect_stdout(out):
+        md2html.main(files_dir, output_dir, **kwargs)
+    return out.getvalue()
+
+
+def assert_same_tree(test_case: unittest.TestCase, expected_dir: str, output_dir: str):
+    for expected_root, _, files in os.walk(expected_dir):
+        output_root = os.path.join(output_dir, os.path.relpath(expected_root, expected_dir))
+        for file in files:
+            test_case.assertTrue(filecmp.cmp(os.path.join(expected_root, file), os.path.join(output_root, file),
+                                             shallow=False), os.path.join(output_root, file))
+
+
+class SiteCopyTestCase(unittest.TestCase):
+    """Test case with a copy of the test site to change, and a folder to build it to."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files_dir = os.path.join(self.temp_dir.name, 'site')
+        self.output_dir = os.path.join(self.temp_dir.name, 'output')
+        shutil.copytree(TEST_SITE, self.files_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, path: str, text: str, mode: str = 'w'):
+        """Write to a file of the site, by its path relative to the site folder."""
+        path = os.path.join(self.files_dir, path)
+        with open(path, mode) as f:
+            f.write(text)
+        # Make sure the modification time changes, even on a coarse clock
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def edit(self, path: str, old: str, new: str):
+        with open(os.path.join(self.files_dir, path), 'r') as f:
+            text = f.read()
+        self.write_file(path, text.replace(old, new))
+
+
+class TestIncrementalBuild(SiteCopyTestCase):
+    def test_full_build_matches_expected_output(self):
+        build(self.files_dir, self.output_dir, full=True)
+        assert_same_tree(self, EXPECTED_OUTPUT, self.output_dir)
+
+    def test_unchanged_build_skips_pages(self):
+        build(self.files_dir, self.output_dir)
+        log = build(self.files_dir, self.output_dir)
+        self.assertNotIn('->', log)
+        assert_same_tree(self, EXPECTED_OUTPUT, self.output_dir)
+
+    def test_unchanged_build_parses_nothing(self):
+        build(self.files_dir, self.output_dir)
+        with mock.patch.object(MarkdownParser, 'parse', autospec=True, side_effect=MarkdownParser.parse) as parse:
+            build(self.files_dir, self.output_dir)
+        parse.assert_not_called()
+
+    def test_build_scans_each_folder_once(self):
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir, \
+                mock.patch('os.listdir', wraps=os.listdir) as listdir, \
+                mock.patch('os.walk', wraps=os.walk) as walk:
+            build(self.files_dir, self.output_dir)
+        scanned = [os.path.relpath(call.args[0], self.files_dir) for call in scandir.call_args_list]
+        self.assertEqual(sorted(set(scanned)), sorted(scanned))
+        self.assertIn(os.path.join('_pages', 'a_new_hope'), scanned)
+        listdir.assert_not_called()
+        walk.assert_not_called()
+
+    def test_changed_page_is_rebuilt(self):
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.files_dir, '_pages', 'page2.md'), 'a') as f:
+            f.write('\n\nAn extra paragraph.')
+        log = build(self.files_dir, self.output_dir)
+        self.assertEqual(1, log.count('->'))
+        with open(os.path.join(self.output_dir, 'page2.html'), 'r') as f:
+            self.assertIn('<p>An extra paragraph.</p>', f.read())
+
+    def test_changed_module_rebuilds_pages(self):
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.files_dir, '_modules', 'footer.md'), 'w') as f:
+            f.write('A new footer.')
+        log = build(self.files_dir, self.output_dir)
+        self.assertEqual(6, log.count('->'))
+
+    def test_full_build_rebuilds_everything(self):
+        build(self.files_dir, self.output_dir)
+        log = build(self.files_dir, self.output_dir, full=True)
+        self.assertEqual(6, log.count('->'))
+
+    def test_full_build_leaves_unchanged_files(self):
+        build(self.files_dir, self.output_dir)
+        page_path = os.path.join(self.output_dir, 'page1.html')
+        os.utime(page_path, ns=(0, 0))
+        log = build(self.files_dir, self.output_dir, full=True)
+        self.assertIn('0 file(s) written, 10 unchanged', log)
+        self.assertEqual(0, os.stat(page_path).st_mtime_ns)
+        with open(os.path.join(self.files_dir, '_pages', 'page1.md'), 'a') as f:
+            f.write('\n\nAn extra paragraph.')
+        self.assertIn('1 file(s) written, 9 unchanged', build(self.files_dir, self.output_dir, full=True))
+
+    def read_changes(self) -> dict:
+        with open(os.path.join(self.output_dir, '.md2html_changes.json'), 'r') as f:
+            return json.load(f)
+
+    def test_change_list(self):
+        build(self.files_dir, self.output_dir)
+        self.assertEqual(10, len(self.read_changes()['added']))
+        with open(os.path.join(self.files_dir, '_pages', 'page1.md'), 'a') as f:
+            f.write('\n\nAn extra paragraph.')
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.output_dir, 'page1.html'), 'rb') as f:
+            page_hash = hashlib.sha256(f.read()).hexdigest()
+        self.assertEqual({'version': 1, 'added': {}, 'modified': {'page1.html': page_hash}, 'removed': []},
+                         self.read_changes())
+
+    def test_prune_removed_pages(self):
+        build(self.files_dir, self.output_dir)
+        shutil.rmtree(os.path.join(self.files_dir, '_pages', 'a_new_hope'))
+        os.remove(os.path.join(self.files_dir, '_pages', 'page3.md'))
+        build(self.files_dir, self.output_dir)
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, 'page3.html')))
+        log = build(self.files_dir, self.output_dir, prune=True)
+        self.assertIn('3 file(s) pruned', log)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'page3.html')))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'a_new_hope')))
+        self.assertEqual([os.path.join('a_new_hope', 'index.html'), os.path.join('a_new_hope', 'test.html'),
+                          'page3.html'], self.read_changes()['removed'])
+
+    def test_unused_templates_skip_pages(self):
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.files_dir, '_modules', 'unused.html'), 'w') as f:
+            f.write('<p>Unused</p>')
+        with open(os.path.join(self.files_dir, '_structures', 'bare.html'), 'w') as f:
+            f.write('{{ page }}')
+        log = build(self.files_dir, self.output_dir)
+        self.assertNotIn('->', log)
+
+    def test_changed_module_rebuilds_only_pages_using_it(self):
+        with open(os.path.join(self.files_dir, '_modules', 'note.html'), 'w') as f:
+            f.write('<p>A note</p>')
+        with open(os.path.join(self.files_dir, '_pages', 'page2.md'), 'a') as f:
+            f.write('\n\n{{ modules.note }}')
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.files_dir, '_modules', 'note.html'), 'w') as f:
+            f.write('<p>A new note</p>')
+        log = build(self.files_dir, self.output_dir)
+        self.assertEqual(1, log.count('->'))
+        with open(os.path.join(self.output_dir, 'page2.html'), 'r') as f:
+            self.assertIn('<p>A new note</p>', f.read())
+
+
+class TestAffectedPages(SiteCopyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_file(os.path.join('_modules', 'note.html'), '<p>A note about {{ site.title }}</p>')
+        self.write_file(os.path.join('_pages', 'cousin_folder', 'faraway.md'), '\n\n{{ modules.note }}', 'a')
+
+    def assert_affected_pages(self):
+        all_pages = ['a_new_hope/test.md', 'cousin_folder/faraway.md', 'cousin_folder/subsub/blah.md',
+                     'page1.md', 'page2.md', 'page3.md']
+        self.assertEqual(['cousin_folder/faraway.md'],
+                         md2html.find_affected_pages(self.files_dir, self.output_dir, ['_modules/note.html']))
+        self.assertEqual(all_pages,
+                         md2html.find_affected_pages(self.files_dir, self.output_dir, ['_modules/footer.md']))
+        self.assertEqual([], md2html.find_affected_pages(self.files_dir, self.output_dir, ['_modules/unused.md']))
+        self.assertEqual(all_pages, md2html.find_affected_pages(self.files_dir, self.output_dir, ['style.css']))
+
+    def test_affected_pages_from_last_build(self):
+        build(self.files_dir, self.output_dir)
+        with mock.patch.object(md2html.SiteBuild, 'load_site') as load_site:
+            self.assert_affected_pages()
+        load_site.assert_not_called()
+
+    def test_affected_pages_without_build(self):
+        self.assert_affected_pages()
+
+
+class TestParseCache(SiteCopyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+
+    def test_cached_build_matches_expected_output(self):
+        build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        assert_same_tree(self, EXPECTED_OUTPUT, self.output_dir)
+
+    def test_cached_build_does_not_parse(self):
+        build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        with mock.patch.object(MarkdownParser, 'iter_parse_tokens') as iter_parse_tokens:
+            log = build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        iter_parse_tokens.assert_not_called()
+        self.assertEqual(6, log.count('->'))
+
+    def test_moved_page_links_are_relative_to_new_folder(self):
+        page = os.path.join(self.files_dir, '_pages', 'page1.md')
+        with open(page, 'a') as f:
+            f.write('\n\n[Home](index.html)')
+        build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        shutil.move(page, os.path.join(self.files_dir, '_pages', 'a_new_hope', 'page1.md'))
+        build(self.files_dir, self.output_dir, full=True, cache_dir=self.cache_dir)
+        with open(os.path.join(self.output_dir, 'a_new_hope', 'page1.html'), 'r') as f:
+            self.assertIn('<a href="../index.html">Home</a>', f.read())
+
+
+class TestPageTimeout(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_pages_over_time_limit_fail(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            failed = md2html.main(TEST_SITE, self.output_dir, page_timeout=0)
+        self.assertEqual(6, len(failed))
+        self.assertEqual(6, out.getvalue().count('failed: Parsing took longer than 0 seconds.'))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'page1.html')))
+        with open(os.path.join(self.output_dir, 'index.html'), 'r') as f:
+            self.assertNotIn('page1.html', f.read())
+
+    def test_failed_pages_are_retried(self):
+        build(TEST_SITE, self.output_dir, page_timeout=0)
+        log = build(TEST_SITE, self.output_dir, page_timeout=60)
+        self.assertEqual(6, log.count('->'))
+        assert_same_tree(self, EXPECTED_OUTPUT, self.output_dir)
+
+
+class TestBuildProfile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_profile_report(self):
+        profile = BuildProfile()
+        build(TEST_SITE, self.output_dir, full=True, profile=profile)
+        report = profile.report(top=2)
+        for stage in ('load_config', 'load_templates', 'walk', 'render_pages', 'create_index', 'save_manifest'):
+            self.assertIn(stage, report['stages'])
+        self.assertEqual(6, report['pages']['count'])
+        self.assertEqual(6, report['counters']['pages_rendered'])
+        self.assertEqual({'split', 'parse', 'write', 'fill'}, set(report['pages']['stages']))
+        self.assertEqual(2, len(report['slowest_pages']))
+        self.assertGreater(report['counters']['bytes_written'], report['counters']['bytes_read'])
+        # Every page and index the build wrote
+        html_sizes = [os.path.getsize(os.path.join(folder, file)) for folder, _, files in os.walk(self.output_dir)
+                      for file in files if file.endswith('.html')]
+        self.assertEqual(10, len(html_sizes))
+        self.assertEqual(sum(html_sizes), report['counters']['bytes_written'])
+
+    def test_metadata_only_build_counts_index_bytes(self):
+        build(TEST_SITE, self.output_dir, full=True)
+        profile = BuildProfile()
+        with redirect_stdout(StringIO()):
+            md2html.build_indexes(TEST_SITE, self.output_dir, full=True, profile=profile)
+        index_sizes = [os.path.getsize(os.path.join(folder, 'index.html')) for folder, _, _ in os.walk(self.output_dir)]
+        self.assertEqual(sum(index_sizes), profile.report()['counters']['bytes_written'])
+
+    def test_unchanged_pages_are_counted(self):
+        build(TEST_SITE, self.output_dir)
+        profile = BuildProfile()
+        build(TEST_SITE, self.output_dir, profile=profile)
+        report = profile.report()
+        self.assertEqual(0, report['pages']['count'])
+        self.assertEqual(6, report['counters']['pages_unchanged'])
+        self.assertNotIn('indexes_written', report['counters'])
+
+    def test_quiet_build_prints_only_stages(self):
+        log = build(TEST_SITE, self.output_dir, full=True, quiet=True)
+        self.assertNotIn('->', log)
+        self.assertEqual(['Site build start...', 'Rendering 6 page(s)...', 'Rendering indexes...',
+                          '10 file(s) written, 0 unchanged', 'Site build complete'],
+                         [line for line in log.split('\n') if line])
+
+
+class TestSiteWatcher(SiteCopyTestCase):
+    def setUp(self):
+        super().setUp()
+        with redirect_stdout(StringIO()):
+            self.watcher = SiteWatcher(md2html.SiteBuild(), self.files_dir, self.output_dir)
+
+    def poll(self) -> list:
+        """Poll the watcher, and get the sources of the pages it rendered."""
+        with mock.patch.object(md2html.SiteBuild, 'try_render_page', autospec=True,
+                               side_effect=md2html.SiteBuild.try_render_page) as render_page, \
+                redirect_stdout(StringIO()):
+            self.watcher.poll()
+        return sorted(os.path.relpath(call.args[1], os.path.join(self.files_dir, '_pages'))
+                      for call in render_page.call_args_list)
+
+    def read_output(self, path: str) -> str:
+        with open(os.path.join(self.output_dir, path), 'r') as f:
+            return f.read()
+
+    def test_nothing_changed(self):
+        self.assertEqual([], self.poll())
+
+    def test_changed_page(self):
+        self.edit(os.path.join('_pages', 'page1.md'), 'Page 1 Title Yeah', 'Page One')
+        self.assertEqual(['page1.md'], self.poll())
+        self.assertIn('<h2>Page One</h2>', self.read_output('page1.html'))
+        self.assertIn('>Page One</a>', self.read_output('index.html'))
+
+    def test_changed_module_renders_pages_using_it(self):
+        self.edit(os.path.join('_modules', 'footer.md'), 'all', 'every one')
+        self.assertEqual(6, len(self.poll()))
+        self.assertIn('<strong>every one</strong>', self.read_output('page1.html'))
+        self.assertNotIn('every one', self.read_output('index.html'))
+
+    def test_changed_module_used_by_indexes(self):
+        self.edit(os.path.join('_modules', 'header.html'), 'Header Module', 'New Header')
+        self.assertEqual(6, len(self.poll()))
+        self.assertIn('New Header', self.read_output(os.path.join('cousin_folder', 'index.html')))
+
+    def test_unused_module(self):
+        with open(os.path.join(self.files_dir, '_modules', 'unused.html'), 'w') as f:
+            f.write('<p>Unused</p>')
+        self.assertEqual([], self.poll())
+
+    def test_changed_config_rebuilds_site(self):
+        self.edit('config.ini', "Milo's Site", 'My Site')
+        with mock.patch.object(md2html.SiteBuild, 'build', autospec=True,
+                               side_effect=md2html.SiteBuild.build) as full_build:
+            self.poll()
+        full_build.assert_called_once()
+        self.assertIn('Welcome to My Site!', self.read_output('page1.html'))
+
+    def test_changed_css_in_template_folder(self):
+        os.mkdir(os.path.join(self.files_dir, '_styles'))
+        os.rename(os.path.join(self.files_dir, 'style.css'), os.path.join(self.files_dir, '_styles', 'site.css'))
+        self.edit('config.ini', '# css: style.css', 'css: _styles/site.css')
+        self.poll()
+        self.edit(os.path.join('_styles', 'site.css'), '#0E74BF', '#0E74BE')
+        self.assertEqual(6, len(self.poll()))
+        self.assertIn('--dark-blue-1: #0E74BE;', self.read_output('page1.html'))
+
+    def test_added_and_removed_pages(self):
+        with open(os.path.join(self.files_dir, '_pages', 'a_new_hope', 'page4.md'), 'w') as f:
+            f.write('---\ntitle: Page 4\ndescription: New.\nstructure: page\n---\n\nNew page.')
+        os.remove(os.path.join(self.files_dir, '_pages', 'a_new_hope', 'test.md'))
+        self.assertEqual([os.path.join('a_new_hope', 'page4.md')], self.poll())
+        index = self.read_output(os.path.join('a_new_hope', 'index.html'))
+        self.assertIn('page4.html', index)
+        self.assertNotIn('test.html', index)
+
+    def test_rebuild_matches_full_build(self):
+        self.edit(os.path.join('_pages', 'page1.md'), 'Lorem', 'Ipsum')
+        self.edit(os.path.join('_modules', 'footer.md'), 'all', 'every one')
+        self.poll()
+        # The manifest is saved once a poll finds nothing changed
+        self.poll()
+        expected_dir = os.path.join(self.temp_dir.name, 'expected')
+        build(self.files_dir, expected_dir, full=True)
+        # The manifest records where each page was built to, and the change list what the last build changed
+        os.remove(os.path.join(expected_dir, '.md2html_manifest.json'))
+        os.remove(os.path.join(expected_dir, '.md2html_changes.json'))
+        assert_same_tree(self, expected_dir, self.output_dir)
+        # The manifest lets the next build skip everything
+        self.assertIn('6 unchanged page(s) skipped', build(self.files_dir, self.output_dir))
+
+
+class TestPaginatedIndex(SiteCopyTestCase):
+    def set_page_size(self, page_size: int):
+        self.write_file('config.ini', f'\nindex_page_size: {page_size}', 'a')
+
+    def read_index(self, page: int) -> str:
+        with open(os.path.join(self.output_dir, md2html.get_index_name(page)), 'r') as f:
+            return f.read()
+
+    def test_index_pages(self):
+        # The root folder has 2 folders and 3 pages
+        self.set_page_size(2)
+        build(self.files_dir, self.output_dir)
+        first, second, third = self.read_index(1), self.read_index(2), self.read_index(3)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'index-4.html')))
+        self.assertIn('a_new_hope/index.html', first)
+        self.assertIn('cousin_folder/index.html', first)
+        self.assertIn('<span class="index__page">Page 1 of 3</span><a href="index-2.html"', first)
+        self.assertIn('page1.html', second)
+        self.assertIn('page2.html', second)
+        self.assertIn('<a href="index.html" class="index__previous">', second)
+        self.assertIn('page3.html', third)
+        self.assertNotIn('index__next', third)
+
+    def test_index_order(self):
+        # The index lists pages in the order of their links
+        self.write_file(os.path.join('_pages', 'page3.b.md'),
+                        '---\ntitle: Page Three B\ndescription: Another page\nstructure: page\n---\n\nText')
+        build(self.files_dir, self.output_dir)
+        index = self.read_index(1)
+        self.assertLess(index.index('"page3.b.html"'), index.index('"page3.html"'))
+
+    def test_fewer_index_pages_removes_the_rest(self):
+        self.set_page_size(2)
+        build(self.files_dir, self.output_dir)
+        self.set_page_size(4)
+        build(self.files_dir, self.output_dir)
+        self.assertIn('page3.html', self.read_index(2))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'index-3.html')))
+
+    def test_unchanged_index_is_skipped(self):
+        self.set_page_size(2)
+        build(self.files_dir, self.output_dir)
+        with mock.patch.object(Templater, 'fill_structure') as fill_structure:
+            build(self.files_dir, self.output_dir)
+        fill_structure.assert_not_called()
+
+    def test_metadata_only_build(self):
+        build(self.files_dir, self.output_dir)
+        with open(os.path.join(self.output_dir, 'page3.html'), 'r') as f:
+            page = f.read()
+        with open(os.path.join(self.files_dir, '_pages', 'page3.md'), 'r+') as f:
+            source = f.read()
+            f.seek(0)
+            f.write(source.replace('title: ', 'title: Renamed ', 1))
+        self.set_page_size(2)
+        with mock.patch.object(MarkdownParser, 'parse') as parse, redirect_stdout(StringIO()):
+            md2html.build_indexes(self.files_dir, self.output_dir)
+        parse.assert_not_called()
+        self.assertIn('class="index__title">Renamed ', self.read_index(3))
+        with open(os.path.join(self.output_dir, 'page3.html'), 'r') as f:
+            self.assertEqual(page, f.read())
+        # The page is still rendered by the next build, since only its index was
+        self.assertEqual(1, build(self.files_dir, self.output_dir).count('->'))
+
+    def test_metadata_only_build_after_module_change(self):
+        build(self.files_dir, self.output_dir)
+        with redirect_stdout(StringIO()):
+            md2html.build_indexes(self.files_dir, self.output_dir)
+        self.write_file(os.path.join('_modules', 'header.html'), '<p>New header</p>', 'a')
+        with redirect_stdout(StringIO()):
+            md2html.build_indexes(self.files_dir, self.output_dir)
+        self.assertIn('<p>New header</p>', self.read_index(1))
+        with open(os.path.join(self.output_dir, 'a_new_hope', 'index.html'), 'r') as f:
+            self.assertIn('<p>New header</p>', f.read())
+
+    def test_page_size_must_be_positive(self):
+        self.set_page_size(0)
+        with self.assertRaises(md2html.BuildError):
+            build(self.files_dir, self.output_dir)
+
+
+def read_site(files_dir: str) -> dict:
+    files = dict()
+    for root, _, names in os.walk(files_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            with open(path, 'r') as f:
+                files[os.path.relpath(path, files_dir).replace(os.sep, '/')] = f.read()
+    return files
+
+
+class TestBuildSite(unittest.TestCase):
+    def setUp(self):
+        self.files = read_site(TEST_SITE)
+
+    def test_matches_expected_output(self):
+        outputs = md2html.build_site(self.files)
+        expected = read_site(EXPECTED_OUTPUT)
+        self.assertEqual(sorted(expected), sorted(outputs))
+        for path, html in expected.items():
+            self.assertEqual(html, outputs[path], path)
+
+    def test_writer(self):
+        written = dict()
+        self.assertIsNone(md2html.build_site(self.files, writer=written.__setitem__))
+        self.assertEqual(md2html.build_site(self.files), written)
+
+    def test_nothing_on_disk(self):
+        with mock.patch('builtins.open') as open_file, mock.patch('os.scandir') as scandir:
+            md2html.build_site(self.files)
+        open_file.assert_not_called()
+        scandir.assert_not_called()
+
+    def test_config(self):
+        outputs = md2html.build_site(self.files, config={'title': 'Other Site', 'description': 'Another site',
+                                                         'ignore': 'page3.md', 'index_page_size': '2'})
+        self.assertIn('Other Site', outputs['page1.html'])
+        self.assertNotIn('page3.html', outputs)
+        self.assertIn('index-2.html', outputs)
+
+    def test_config_numbers(self):
+        outputs = md2html.build_site(self.files, config={'title': 2021, 'description': 2022, 'index_page_size': 2})
+        self.assertIn('2021', outputs['page1.html'])
+        self.assertIn('index-2.html', outputs)
+        for value in (['2'], None, True):
+            with self.assertRaises(md2html.BuildError):
+                md2html.build_site(self.files, config={'index_page_size': value})
+
+    def test_prints_nothing(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            md2html.build_site(self.files)
+            with self.assertRaises(md2html.BuildError):
+                md2html.build_site({**self.files, '_pages/page4.md': 'No front matter'})
+        self.assertEqual('', out.getvalue())
+
+    def test_builds_are_separate(self):
+        md2html.build_site(self.files, config={'title': 'Other Site', 'description': 'Another site'})
+        self.assertNotIn('Other Site', md2html.build_site(self.files)['page1.html'])
+
+    def test_missing_files(self):
+        for path in ('style.css', 'config.ini'):
+            files = {name: text for name, text in self.files.items() if name != path}
+            with self.assertRaises(md2html.BuildError):
+                md2html.build_site(files)
+        files = {name: text for name, text in self.files.items() if not name.startswith('_pages/')}
+        with self.assertRaises(md2html.BuildError):
+            md2html.build_site(files)
+
+
+class TestBuildDaemon(SiteCopyTestCase):
+    def setUp(self):
+        super().setUp()
+        with redirect_stdout(StringIO()):
+            self.daemon = BuildDaemon(SiteWatcher(md2html.SiteBuild(), self.files_dir, self.output_dir))
+
+    def test_first_build(self):
+        assert_same_tree(self, EXPECTED_OUTPUT, self.output_dir)
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, '.md2html_manifest.json')))
+
+    def test_build(self):
+        response = self.daemon.handle({'command': 'build'})
+        self.assertTrue(response['ok'])
+        self.assertFalse(response['rebuilt'])
+        self.write_file(os.path.join('_pages', 'page4.md'),
+                        '---\ntitle: Page Four\ndescription: Another page\nstructure: page\n---\n\nText')
+        response = self.daemon.handle({'command': 'build'})
+        self.assertTrue(response['rebuilt'])
+        self.assertIn('page4.md  ->  ', response['log'])
+        # The build leaves the output as a build without the daemon would
+        self.assertEqual(0, build(self.files_dir, self.output_dir).count('->'))
+
+    def test_full_build(self):
+        response = self.daemon.handle({'command': 'build', 'full': True})
+        self.assertEqual(6, response['log'].count('->'))
+        self.assertEqual([], response['failed'])
+
+    def test_render(self):
+        response = self.daemon.handle({'command': 'render', 'page': 'a_new_hope/test.md'})
+        with open(os.path.join(EXPECTED_OUTPUT, 'a_new_hope', 'test.html'), 'r') as f:
+            self.assertEqual(f.read(), response['html'])
+        self.assertFalse(self.daemon.handle({'command': 'render', 'page': 'missing.md'})['ok'])
+
+    def test_failed_page(self):
+        with mock.patch.object(md2html.SiteBuild, 'render_page', side_effect=ParseTimeout('Too slow.')):
+            self.write_file(os.path.join('_pages', 'page1.md'),
+                            '---\ntitle: Page One\ndescription: Changed\nstructure: page\n---\n\nText')
+            response = self.daemon.handle({'command': 'build'})
+            self.assertEqual([os.path.join('_pages', 'page1.md')], response['failed'])
+            self.assertFalse(self.daemon.handle({'command': 'render', 'page': 'page1.md'})['ok'])
+        self.write_file(os.path.join('_pages', 'page1.md'),
+                        '---\ntitle: Page One\ndescription: Fixed\nstructure: page\n---\n\nText')
+        self.assertEqual([], self.daemon.handle({'command': 'build'})['failed'])
+
+    def test_unknown_command(self):
+        response = self.daemon.handle({'command': 'deploy'})
+        self.assertFalse(response['ok'])
+        self.assertIn('deploy', response['error'])
+
+    def test_socket(self):
+        thread = threading.Thread(target=self.serve)
+        thread.start()
+        try:
+            for _ in range(100):
+                if os.path.exists(self.daemon.socket_path):
+                    break
+                thread.join(0.05)
+            status = send_request(self.daemon.socket_path, {'command': 'status'}, 5)
+            self.assertTrue(status['ok'])
+            self.assertEqual(6, status['pages'])
+            self.assertTrue(send_request(self.daemon.socket_path, {'command': 'build'}, 5)['ok'])
+        finally:
+            send_request(self.daemon.socket_path, {'command': 'stop'}, 5)
+            thread.join(5)
+        self.assertFalse(os.path.exists(self.daemon.socket_path))
+
+    def test_socket_path_taken(self):
+        with open(self.daemon.socket_path, 'w') as f:
+            f.write('Not a socket')
+        with self.assertRaises(DaemonError):
+            self.daemon.serve()
+        self.assertTrue(os.path.isfile(self.daemon.socket_path))
+
+    def serve(self):
+        with redirect_stdout(StringIO()):
+            self.daemon.serve()
+
+
+class TestPreviewServer(SiteCopyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.preview = PreviewServer(md2html.SiteBuild(), self.files_dir, quiet=True)
+
+    def get(self, url: str) -> str:
+        status, _, body = self.preview.get_response(url)
+        self.assertEqual(200, status, body)
+        return body
+
+    def test_matches_expected_output(self):
+        for path, html in read_site(EXPECTED_OUTPUT).items():
+            self.assertEqual(html, self.get(f'/{path}'), path)
+        self.assertEqual(self.get('/index.html'), self.get('/'))
+        self.assertEqual(self.get('/cousin_folder/index.html'), self.get('/cousin_folder/'))
+
+    def test_not_found(self):
+        for url in ('/page4.html', '/style.css', '/../config.ini', '/cousin_folder/../page1.html',
+                    '/nowhere/index.html', '/index-2.html', '/index-0.html'):
+            self.assertEqual(404, self.preview.get_response(url)[0], url)
+
+    def test_cache(self):
+        html = self.get('/page1.html')
+        self.assertEqual(html, self.get('/page1.html?again'))
+        self.assertEqual(1, self.preview.pages_rendered)
+        self.write_file('_pages/page1.md', '\nA new line', 'a')
+        self.assertIn('A new line', self.get('/page1.html'))
+        self.assertEqual(2, self.preview.pages_rendered)
+        status = json.loads(self.get(STATUS_PATH))
+        self.assertEqual(1, status['cache']['hits'])
+        self.assertEqual(2, status['cache']['misses'])
+
+    def test_index_cache(self):
+        self.get('/')
+        self.get('/')
+        self.assertEqual(1, self.preview.indexes_rendered)
+        with open(os.path.join(self.files_dir, '_pages', 'page4.md'), 'w') as f:
+            f.write('---\ntitle: Page Four\ndescription: Another page\nstructure: page\n---\n\nText')
+        self.assertIn('page4.html', self.get('/'))
+        self.assertIn('Text', self.get('/page4.html'))
+
+    def test_template_change(self):
+        self.get('/page1.html')
+        self.write_file('_modules/footer.md', '\nNew footer line', 'a')
+        self.assertIn('New footer line', self.get('/page1.html'))
+        self.assertEqual(2, self.preview.template_version)
+        self.write_file('config.ini', '\nindex_page_size: 2', 'a')
+        self.assertIn('page3.html', self.get('/index-3.html'))
+
+    def test_failed_page(self):
+        with open(os.path.join(self.files_dir, '_pages', 'page4.md'), 'w') as f:
+            f.write('No front matter')
+        with redirect_stdout(StringIO()):
+            self.assertEqual(500, self.preview.get_response('/page4.html')[0])
+
+    def test_http(self):
+        server = self.preview.get_server(port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = f'http://localhost:{server.server_port}'
+            with urllib.request.urlopen(f'{url}/a_new_hope/test.html') as response:
+                self.assertEqual('text/html; charset=utf-8', response.headers['Content-Type'])
+                with open(os.path.join(EXPECTED_OUTPUT, 'a_new_hope', 'test.html'), 'r') as f:
+                    self.assertEqual(f.read(), response.read().decode('utf-8'))
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f'{url}/missing.html')
+            self.assertEqual(404, error.exception.code)
+            error.exception.close()
+            with urllib.request.urlopen(f'{url}{STATUS_PATH}') as response:
+                self.assertEqual(1, json.load(response)['pages_rendered'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class TestParallelBuild(unittest.TestCase):
+    def test_parallel_build_matches_expected_output(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            log = build(TEST_SITE, output_dir, full=True, jobs=2)
+            self.assertEqual(6, log.count('->'))
+            assert_same_tree(self, EXPECTED_OUTPUT, output_dir)
+
+    def test_parallel_parse_matches_expected_output(self):
+        site_build = md2html.SiteBuild(parallel_parse_chars=0)
+        site_build.page_parser.chunk_size = site_build.module_parser.chunk_size = 1
+        with tempfile.TemporaryDirectory() as output_dir, redirect_stdout(StringIO()), \
+                mock.patch.object(MarkdownParser, 'parse_parallel', autospec=True,
+                                  side_effect=MarkdownParser.parse_parallel) as parse_parallel:
+            site_build.build(TEST_SITE, output_dir, full=True)
+            # Every page, and the markdown footer module
+            self.assertEqual(7, parse_parallel.call_count)
+            assert_same_tree(self, EXPECTED_OUTPUT, output_dir)
+
+    def test_parallel_parse_counts_characters(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files_dir = os.path.join(temp_dir, 'site')
+            shutil.copytree(TEST_SITE, files_dir)
+            for name, body in ('narrow.md', 'e' * 1200), ('wide.md', 'é' * 800):
+                with open(os.path.join(files_dir, '_pages', name), 'w', encoding='utf-8') as f:
+                    f.write(f'---\ntitle: {name}\ndescription: Long\nstructure: page\n---\n\n{body}')
+            # The page of 800 characters is still 1600 bytes long
+            with mock.patch.object(MarkdownParser, 'parse_parallel', autospec=True,
+                                   side_effect=MarkdownParser.parse_parallel) as parse_parallel:
+                build(files_dir, os.path.join(temp_dir, 'output'), full=True, parallel_parse_chars=1000)
+            self.assertEqual(['e' * 1200], [call.args[1] for call in parse_parallel.call_args_list])
+
+
+if __name__ == '__main__':
+    unittest.main()